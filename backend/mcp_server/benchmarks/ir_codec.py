@@ -0,0 +1,66 @@
+"""
+Benchmark: IR storage encodings.
+
+Encodes synthetic IRs of 1k, 10k and 100k blocks with every codec available
+in this environment and prints the stored size and the encode and decode
+times (best of `--repeat` runs). The "json (before)" row is the
+pretty-much-raw encoding used before `ir_codec` existed.
+
+Run:
+  uv run python -m mcp_server.benchmarks.ir_codec --blocks 1000 10000 100000
+"""
+
+import argparse
+import json
+import time
+
+from mcp_server.benchmarks.synthetic import make_ir
+from mcp_server.utils import ir_codec
+
+
+def _best(fn, repeat: int) -> tuple[float, object]:
+    best, value = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        value = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, value
+
+
+def codecs() -> list[tuple[str, callable, callable]]:
+    rows = [(
+        "json (before)",
+        lambda ir: json.dumps(ir, ensure_ascii=False).encode("utf-8"),
+        json.loads,
+    )]
+    for name in ("json", "gzip", "zstd"):
+        if ir_codec.resolve_codec(name) != name:
+            continue
+        label = f"{name} ({'orjson' if ir_codec.orjson else 'stdlib'})"
+        rows.append((label, lambda ir, name=name: ir_codec.encode(ir, name), ir_codec.decode))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--blocks", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'blocks':>7} {'codec':<18} {'bytes':>12} {'ratio':>6} {'encode ms':>10} {'decode ms':>10}")
+    for blocks in args.blocks:
+        ir = make_ir(blocks)
+        baseline = None
+        for label, encode, decode in codecs():
+            encode_s, data = _best(lambda: encode(ir), args.repeat)
+            decode_s, decoded = _best(lambda: decode(data), args.repeat)
+            assert decoded == ir, f"{label} did not round-trip"
+            baseline = baseline or len(data)
+            print(
+                f"{blocks:>7} {label:<18} {len(data):>12,} {baseline / len(data):>5.1f}x "
+                f"{encode_s * 1000:>10.1f} {decode_s * 1000:>10.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Benchmark: memory held by a loaded IR, dict blocks vs compact `Block`s.
+
+Writes a synthetic IR as per-page shards (the way snapshots are stored),
+then loads it in a fresh subprocess per mode, decoding one shard at a
+time like `ir_helpers` does, and reports the memory retained by the
+blocks (tracemalloc), the process peak RSS, the load time and the time
+of a Markdown export over the loaded blocks.
+
+Run:
+  uv run python -m mcp_server.benchmarks.ir_memory --blocks 10000 50000 200000
+"""
+
+import argparse
+import gc
+import json
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from mcp_server.benchmarks.synthetic import make_ir
+from mcp_server.utils import ir_codec
+
+
+MODES = ("dict", "compact")
+
+
+def _write_shards(blocks: int, directory: Path) -> None:
+    ir = make_ir(blocks)
+    by_page: dict[int, list] = {}
+    for block in ir["blocks"]:
+        by_page.setdefault(block["page_number"], []).append(block)
+    for page, page_blocks in by_page.items():
+        (directory / f"{page:06d}.bin").write_bytes(ir_codec.encode(page_blocks, "gzip"))
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is in KiB on Linux and bytes on macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _child(mode: str, directory: Path) -> dict:
+    from mcp_server.utils.ir_model import compact_blocks
+    from mcp_server.utils.markdown_export import FragmentCache
+
+    shards = [path.read_bytes() for path in sorted(directory.iterdir())]
+
+    def load() -> list:
+        blocks: list = []
+        for data in shards:
+            page_blocks = ir_codec.decode(data)
+            if mode == "compact":
+                compact_blocks(page_blocks)
+            blocks.extend(page_blocks)
+        return blocks
+
+    gc.collect()
+    tracemalloc.start()
+    blocks = load()
+    gc.collect()
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    # Time a second load without tracemalloc, which slows allocation down.
+    del blocks
+    gc.collect()
+    start = time.perf_counter()
+    blocks = load()
+    load_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    FragmentCache(0).render(blocks)
+    export_s = time.perf_counter() - start
+    return {
+        "retained_mb": retained / 2**20,
+        "peak_rss_mb": _peak_rss_mb(),
+        "load_ms": load_s * 1000,
+        "export_ms": export_s * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--blocks", type=int, nargs="+", default=[10000, 50000, 200000])
+    parser.add_argument("--child", choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument("--shards", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(_child(args.child, Path(args.shards))))
+        return
+
+    print(f"{'blocks':>7} {'mode':<8} {'retained MB':>12} {'peak RSS MB':>12} {'load ms':>9} {'export ms':>10}")
+    for blocks in args.blocks:
+        with tempfile.TemporaryDirectory() as tmp:
+            _write_shards(blocks, Path(tmp))
+            for mode in MODES:
+                out = subprocess.run(
+                    [sys.executable, "-m", "mcp_server.benchmarks.ir_memory", "--child", mode, "--shards", tmp],
+                    check=True, capture_output=True, text=True,
+                ).stdout
+                row = json.loads(out)
+                print(
+                    f"{blocks:>7} {mode:<8} {row['retained_mb']:>12.1f} {row['peak_rss_mb']:>12.1f} "
+                    f"{row['load_ms']:>9.0f} {row['export_ms']:>10.0f}"
+                )
+
+
+if __name__ == "__main__":
+    main()
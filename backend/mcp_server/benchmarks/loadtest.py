@@ -0,0 +1,315 @@
+"""
+Load test: throughput and latency of the MCP server under concurrent sessions.
+
+Starts the storage stand-in (`storage_standin`, the Supabase Storage API
+served from memory), seeds it with `--documents` synthetic IRs of
+`--blocks` blocks, then starts `run_server.py` against it as a separate
+process with `STORAGE_BACKEND=supabase`, so every request crosses the same
+HTTP and storage client code as in production. `--clients` simulated MCP
+sessions then call tools over streamable HTTP for `--duration` seconds,
+each picking its next call from the weighted `--mix`:
+
+  read_ir             one page of a document (a slice)
+  read_ir_full        a whole document, as the viewer loads it
+  edit_ir_block       new content for a random block
+  search_ir           a one-word query on one document
+  export_to_markdown  export with return_mode="url"
+
+Calls made during the first `--warmup` seconds are not counted. The report
+lists, per tool and overall, the calls, errors (exceptions and `error`
+results), error rate, throughput and p50/p90/p99/max latency as seen by the
+clients. `--output` writes it as JSON together with the server's
+`/metrics?format=json` snapshot taken at the end.
+
+Run:
+  uv run python -m mcp_server.benchmarks.loadtest --clients 32 --duration 60
+  uv run python -m mcp_server.benchmarks.loadtest --mix read_ir=1 --storage-latency-ms 20 --output load.json
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+from mcp_server.benchmarks.storage_standin import SERVICE_KEY, StorageStandIn, serve_in_thread
+from mcp_server.benchmarks.synthetic import WORDS, make_ir
+
+
+BACKEND_DIR = Path(__file__).resolve().parents[2]
+DEFAULT_MIX = "read_ir=5,read_ir_full=1,edit_ir_block=3,search_ir=1,export_to_markdown=1"
+
+
+# ── Workload ────────────────────────────────────────────────────────
+
+def _call(op: str, rng: random.Random, document: dict) -> tuple[str, dict]:
+    """The tool name and arguments of one call of `op` on a seeded document."""
+    document_id = document["document_id"]
+    if op == "read_ir":
+        page = rng.randint(1, document["pages"])
+        return "read_ir", {"document_id": document_id, "page_start": page, "page_end": page}
+    if op == "read_ir_full":
+        return "read_ir", {"document_id": document_id}
+    if op == "edit_ir_block":
+        return "edit_ir_block", {
+            "document_id": document_id,
+            "block_id": rng.choice(document["block_ids"]),
+            "new_content": " ".join(rng.choices(WORDS, k=12)).capitalize() + ".",
+        }
+    if op == "search_ir":
+        return "search_ir", {"document_id": document_id, "query": rng.choice(WORDS), "top_k": 10}
+    if op == "export_to_markdown":
+        return "export_to_markdown", {"document_id": document_id, "return_mode": "url"}
+    raise ValueError(f"Unknown operation {op!r}")
+
+
+OPERATIONS = ("read_ir", "read_ir_full", "edit_ir_block", "search_ir", "export_to_markdown")
+
+
+def parse_mix(text: str) -> dict[str, float]:
+    """`read_ir=5,edit_ir_block=3` -> {"read_ir": 5.0, "edit_ir_block": 3.0}."""
+    mix = {}
+    for item in text.split(","):
+        if not item.strip():
+            continue
+        op, _, weight = item.partition("=")
+        op = op.strip()
+        if op not in OPERATIONS:
+            raise ValueError(f"Unknown operation {op!r} in --mix; use {', '.join(OPERATIONS)}")
+        mix[op] = float(weight or 1)
+    if not mix or not any(mix.values()):
+        raise ValueError("--mix needs at least one operation with a positive weight")
+    return mix
+
+
+def seed_documents(storage_url: str, count: int, blocks: int) -> list[dict]:
+    """Write synthetic IRs to the stand-in the way the server stores them."""
+    from mcp_server.utils import ir_helpers, storage
+    from mcp_server.utils.storage_backends import SupabaseBackend
+
+    storage.set_backend(SupabaseBackend(storage_url, SERVICE_KEY))
+    documents = []
+    for i in range(count):
+        document_id = f"doc_load_{i:03d}"
+        ir = make_ir(blocks, seed=i)
+        ir["document_id"] = document_id
+        ir_helpers.save_ir(document_id, ir)
+        ir_helpers.flush_ir(document_id)
+        documents.append({
+            "document_id": document_id,
+            "pages": max(block["page_number"] for block in ir["blocks"]),
+            "block_ids": [block["block_id"] for block in ir["blocks"]],
+        })
+        ir_helpers.discard_ir(document_id)
+    return documents
+
+
+# ── Server ──────────────────────────────────────────────────────────
+
+def start_server(port: int, storage_url: str, log_path: Path, extra_env: dict[str, str]) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "STORAGE_BACKEND": "supabase",
+        "SUPABASE_URL": storage_url,
+        "SUPABASE_SERVICE_KEY": SERVICE_KEY,
+        "SERVER_HOST": "127.0.0.1",
+        "SERVER_PORT": str(port),
+        # Nothing is converted, so skip loading the conversion models.
+        "CONVERSION_WORKERS": "0",
+        **extra_env,
+    }
+    log = open(log_path, "wb")
+    try:
+        return subprocess.Popen(
+            [sys.executable, str(BACKEND_DIR / "run_server.py")],
+            cwd=BACKEND_DIR, env=env, stdout=log, stderr=subprocess.STDOUT,
+        )
+    finally:
+        log.close()
+
+
+def wait_ready(process: subprocess.Popen, base_url: str, log_path: Path, timeout: float = 60.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with status {process.returncode}; see {log_path}")
+        try:
+            if httpx.get(f"{base_url}/metrics", timeout=1.0).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"Server did not become ready within {timeout:.0f}s; see {log_path}")
+
+
+def stop_server(process: subprocess.Popen) -> None:
+    process.terminate()
+    try:
+        process.wait(timeout=15)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+# ── Clients ─────────────────────────────────────────────────────────
+
+async def run_client(
+    index: int, url: str, documents: list[dict], mix: dict[str, float],
+    start: float, measure_from: float, until: float, samples: list[tuple],
+) -> None:
+    """One MCP session calling tools back to back until `until`."""
+    from fastmcp import Client
+
+    rng = random.Random(index)
+    ops, weights = list(mix), list(mix.values())
+    # Stagger session setup a little so the server does not see N handshakes at once.
+    await asyncio.sleep(rng.random() * 0.2)
+    async with Client(url, timeout=120) as client:
+        while time.perf_counter() < until:
+            op = rng.choices(ops, weights)[0]
+            name, arguments = _call(op, rng, rng.choice(documents))
+            began = time.perf_counter()
+            error = None
+            try:
+                result = await client.call_tool(name, arguments, raise_on_error=False)
+                if result.is_error:
+                    error = "tool_error"
+                elif isinstance(result.data, dict) and "error" in result.data:
+                    error = "error_result"
+            except Exception as exc:
+                error = type(exc).__name__
+            ended = time.perf_counter()
+            if began >= measure_from:
+                samples.append((op, ended - began, error, ended - start))
+
+
+def _percentile(values: list[float], q: float) -> float:
+    """Nearest-rank percentile of sorted `values`."""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, max(0, math.ceil(q * len(values)) - 1))]
+
+
+def summarize(samples: list[tuple], seconds: float) -> list[dict]:
+    by_op: dict[str, list[tuple]] = {}
+    for sample in samples:
+        by_op.setdefault(sample[0], []).append(sample)
+    rows = []
+    for op, group in sorted(by_op.items()) + [("all", samples)]:
+        latencies = sorted(sample[1] for sample in group)
+        errors: dict[str, int] = {}
+        for sample in group:
+            if sample[2] is not None:
+                errors[sample[2]] = errors.get(sample[2], 0) + 1
+        error_count = sum(errors.values())
+        rows.append({
+            "tool": op,
+            "calls": len(group),
+            "errors": error_count,
+            "error_rate": round(error_count / len(group), 4) if group else 0.0,
+            "error_kinds": errors,
+            "throughput_per_s": round(len(group) / seconds, 2) if seconds else 0.0,
+            "p50_ms": round(_percentile(latencies, 0.50) * 1000, 2),
+            "p90_ms": round(_percentile(latencies, 0.90) * 1000, 2),
+            "p99_ms": round(_percentile(latencies, 0.99) * 1000, 2),
+            "max_ms": round(latencies[-1] * 1000, 2) if latencies else 0.0,
+        })
+    return rows
+
+
+async def drive(url: str, documents: list[dict], mix: dict[str, float], clients: int,
+                warmup: float, duration: float) -> tuple[list[tuple], float]:
+    start = time.perf_counter()
+    measure_from = start + warmup
+    until = measure_from + duration
+    samples: list[tuple] = []
+    outcomes = await asyncio.gather(*(
+        run_client(i, url, documents, mix, start, measure_from, until, samples) for i in range(clients)
+    ), return_exceptions=True)
+    failed = [outcome for outcome in outcomes if isinstance(outcome, BaseException)]
+    if failed:
+        print(f"{len(failed)} of {clients} sessions failed: {failed[0]!r}", file=sys.stderr)
+    # Measure up to the last completed call: calls in flight at the deadline still count.
+    ended = max([until] + [start + sample[3] for sample in samples])
+    return samples, ended - measure_from
+
+
+# ── Main ────────────────────────────────────────────────────────────
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=16, help="concurrent MCP sessions")
+    parser.add_argument("--duration", type=float, default=30.0, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=5.0, help="seconds of calls not counted")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="weighted operations, e.g. read_ir=5,edit_ir_block=3")
+    parser.add_argument("--documents", type=int, default=8)
+    parser.add_argument("--blocks", type=int, default=2000, help="blocks per document")
+    parser.add_argument("--port", type=int, default=8765, help="port of the MCP server")
+    parser.add_argument("--storage-port", type=int, default=8766, help="port of the storage stand-in")
+    parser.add_argument("--storage-latency-ms", type=float, default=0.0, help="delay added to every storage request")
+    parser.add_argument("--server-env", action="append", default=[], metavar="NAME=VALUE",
+                        help="extra environment for the server, e.g. TOOL_LIGHT_CONCURRENCY=64")
+    parser.add_argument("--output", type=Path, help="write the report as JSON to this file")
+    args = parser.parse_args()
+
+    mix = parse_mix(args.mix)
+    extra_env = dict(item.split("=", 1) for item in args.server_env)
+
+    standin = StorageStandIn(args.storage_latency_ms)
+    storage_server = serve_in_thread(standin, port=args.storage_port)
+    storage_url = f"http://127.0.0.1:{args.storage_port}"
+    base_url = f"http://127.0.0.1:{args.port}"
+
+    print(f"Seeding {args.documents} documents of {args.blocks} blocks...")
+    documents = seed_documents(storage_url, args.documents, args.blocks)
+
+    log_path = Path(tempfile.mkstemp(prefix="layoutir_loadtest_", suffix=".log")[1])
+    process = start_server(args.port, storage_url, log_path, extra_env)
+    try:
+        wait_ready(process, base_url, log_path)
+        print(f"Running {args.clients} sessions for {args.warmup:g}s warmup + {args.duration:g}s (server log: {log_path})")
+        storage_requests = standin.requests
+        samples, seconds = asyncio.run(
+            drive(f"{base_url}/mcp", documents, mix, args.clients, args.warmup, args.duration)
+        )
+        server_metrics = httpx.get(f"{base_url}/metrics", params={"format": "json"}, timeout=10).json()
+    finally:
+        stop_server(process)
+        storage_server.should_exit = True
+
+    rows = summarize(samples, seconds)
+    print(f"\n{'tool':<20} {'calls':>7} {'err %':>6} {'calls/s':>8} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for row in rows:
+        print(
+            f"{row['tool']:<20} {row['calls']:>7} {row['error_rate'] * 100:>6.2f} {row['throughput_per_s']:>8.1f} "
+            f"{row['p50_ms']:>8.1f} {row['p90_ms']:>8.1f} {row['p99_ms']:>8.1f} {row['max_ms']:>8.1f}"
+        )
+    print(f"\nStorage requests during the run: {standin.requests - storage_requests}")
+
+    if args.output:
+        report = {
+            "clients": args.clients,
+            "duration_s": round(seconds, 3),
+            "warmup_s": args.warmup,
+            "mix": mix,
+            "documents": args.documents,
+            "blocks": args.blocks,
+            "storage_latency_ms": args.storage_latency_ms,
+            "storage_requests": standin.requests - storage_requests,
+            "results": rows,
+            "server_metrics": server_metrics,
+        }
+        args.output.write_text(json.dumps(report, indent=2), encoding="utf-8")
+        print(f"Wrote report to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Benchmark: page-parallel vs single-process conversion.
+
+Generates synthetic multi-page PDFs (a heading and a few paragraphs per
+page), converts each one with the single-process path and with page ranges
+split across the worker pool, and prints the wall time of both along with
+the speedup. Models are loaded before timing starts, so the numbers compare
+warm conversions only.
+
+Run:
+  uv run python -m mcp_server.benchmarks.page_parallel --pages 32 128 --workers 4
+"""
+
+import argparse
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+from mcp_server.benchmarks.synthetic import make_pdf
+from mcp_server.utils.workers import ConversionPool
+
+
+def time_conversion(pool: ConversionPool, pdf: Path, pages: int) -> tuple[float, dict]:
+    out_dir = Path(tempfile.mkdtemp(prefix="layoutir_bench_"))
+    try:
+        start = time.perf_counter()
+        result = pool.convert(pdf, out_dir, page_count=pages)
+        return time.perf_counter() - start, result
+    finally:
+        shutil.rmtree(out_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, nargs="+", default=[32, 128])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--range-pages", type=int, default=16)
+    parser.add_argument("--repeat", type=int, default=1)
+    args = parser.parse_args()
+
+    single = ConversionPool(workers=args.workers, max_queue=1, job_timeout=3600)
+    split = ConversionPool(
+        workers=args.workers, max_queue=1, job_timeout=3600,
+        split_min_pages=1, split_range_pages=args.range_pages,
+    )
+    tmp = Path(tempfile.mkdtemp(prefix="layoutir_bench_pdf_"))
+    try:
+        # Warm every worker in both pools so model loading is not timed.
+        warmup = tmp / "warmup.pdf"
+        make_pdf(warmup, args.workers * args.range_pages)
+        for pool in (single, split):
+            pool.start()
+            time_conversion(pool, warmup, args.workers * args.range_pages)
+
+        print(f"{'pages':>6} {'single (s)':>11} {'split (s)':>10} {'ranges':>7} {'speedup':>8}")
+        for pages in args.pages:
+            pdf = tmp / f"synthetic_{pages}.pdf"
+            make_pdf(pdf, pages)
+            single_s = min(time_conversion(single, pdf, pages)[0] for _ in range(args.repeat))
+            runs = [time_conversion(split, pdf, pages) for _ in range(args.repeat)]
+            split_s = min(seconds for seconds, _ in runs)
+            ranges = runs[0][1].get("ranges", 1)
+            print(f"{pages:>6} {single_s:>11.2f} {split_s:>10.2f} {ranges:>7} {single_s / split_s:>7.2f}x")
+    finally:
+        single.shutdown()
+        split.shutdown()
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
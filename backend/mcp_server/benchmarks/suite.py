@@ -0,0 +1,315 @@
+"""
+Benchmark suite: latency and memory of the server's hot paths.
+
+Runs every case against synthetic IRs of each `--blocks` size on the
+in-process memory storage backend, so no Supabase project is needed:
+
+  load_ir            cold load (cache discarded) and cached load
+  save_ir            full snapshot write, including block store and search index
+  edit_ir_block, add_ir_block, delete_ir_block, apply_ir_operations
+                     the edit tools as a client sees them (writes deferred)
+  flush_ir           persisting one pending edit (journal, block store, index)
+  export_to_markdown cold (empty fragment cache) and unchanged re-export
+  rewrite_asset_paths
+  upload_directory   first upload and unchanged re-upload of an output folder
+  convert            `_run_conversion` on small generated PDFs (`--pdf-pages`;
+                     skipped when the pipeline is not installed)
+
+Each case reports the median and minimum wall time over `--repeat` runs and
+the peak Python memory of one extra run under tracemalloc. Results are
+written as JSON (`--output`); `--compare` prints the change against an
+earlier results file and exits with status 1 when any case got slower than
+`--threshold`.
+
+Run:
+  uv run python -m mcp_server.benchmarks.suite --blocks 100 1000 10000 100000 --output bench.json
+  uv run python -m mcp_server.benchmarks.suite --output new.json --compare bench.json
+"""
+
+import argparse
+import asyncio
+import copy
+import gc
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+# Settings are read once, so the benchmark environment is set before any import reads it.
+os.environ.setdefault("STORAGE_BACKEND", "memory")
+# Persistence is measured on its own (flush_ir); the background flusher must not run mid-case.
+os.environ.setdefault("IR_WRITE_BEHIND_DELAY", "3600")
+os.environ.setdefault("CONVERSION_WORKERS", "0")
+
+from mcp_server.benchmarks.synthetic import make_ir, make_pdf  # noqa: E402
+from mcp_server.utils import ir_helpers, markdown_export, storage  # noqa: E402
+from mcp_server.utils.storage_backends import MemoryBackend  # noqa: E402
+
+
+FORMAT = 1
+
+
+def measure(fn, setup=None, repeat: int = 5) -> dict:
+    """Median/min wall time of `fn` over `repeat` runs plus its peak traced memory.
+
+    `setup` runs before every call, untimed; its return value is passed to `fn`.
+    """
+    times = []
+    for _ in range(repeat):
+        state = setup() if setup else None
+        gc.collect()
+        start = time.perf_counter()
+        fn(state)
+        times.append(time.perf_counter() - start)
+
+    state = setup() if setup else None
+    gc.collect()
+    tracemalloc.start()
+    fn(state)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "median_ms": round(statistics.median(times) * 1000, 3),
+        "min_ms": round(min(times) * 1000, 3),
+        "peak_mb": round(peak / 2**20, 3),
+        "runs": repeat,
+    }
+
+
+# ── Cases ───────────────────────────────────────────────────────────
+
+def _with_assets(ir: dict) -> dict:
+    """Give every 8th block an image and every table a table_id, as conversions do."""
+    for i, block in enumerate(ir["blocks"]):
+        if i % 8 == 4:
+            block["type"] = "figure"
+            block["image_data"] = {"extracted_path": f"assets/images/img_{i:06d}.png", "format": "png"}
+        if block["type"] == "table":
+            block["metadata"] = {"label": "table", "table_id": f"tbl_{i:06d}"}
+    return ir
+
+
+def _tool_runner():
+    """Call MCP tools the way FastMCP does (through their async wrappers) on one event loop."""
+    from mcp_server import main
+
+    loop = asyncio.new_event_loop()
+
+    def call(name: str, **kwargs):
+        result = loop.run_until_complete(getattr(main, name).fn(**kwargs))
+        if isinstance(result, dict) and "error" in result:
+            raise RuntimeError(f"{name} failed: {result['error']}")
+        return result
+
+    return call, loop
+
+
+def ir_cases(blocks: int, repeat: int) -> list[dict]:
+    call, loop = _tool_runner()
+    document_id = f"doc_bench_{blocks}"
+    base = _with_assets(make_ir(blocks))
+    base["document_id"] = document_id
+    ids = [block["block_id"] for block in base["blocks"]]
+    results = []
+
+    def case(name: str, fn, setup=None, runs: int = repeat):
+        results.append({"case": name, "blocks": blocks, **measure(fn, setup, runs)})
+
+    def fresh_ir():
+        return copy.deepcopy(base)
+
+    def save(ir):
+        ir_helpers.save_ir(document_id, ir)
+        ir_helpers.flush_ir(document_id)
+
+    case("save_ir", save, fresh_ir)
+    save(fresh_ir())
+
+    def cold():
+        ir_helpers.discard_ir(document_id)
+
+    case("load_ir", lambda _: ir_helpers.load_ir(document_id), cold)
+    case("load_ir_cached", lambda _: ir_helpers.load_ir(document_id))
+
+    target = ids[len(ids) // 2]
+    counter = iter(range(10**9))
+    case("edit_ir_block", lambda _: call(
+        "edit_ir_block", document_id=document_id, block_id=target, new_content=f"Edited text {next(counter)}.",
+    ))
+    added = []
+    case("add_ir_block", lambda _: added.append(call(
+        "add_ir_block", document_id=document_id, after_block_id=target, content="A new paragraph.",
+    )["new_block_id"]))
+    case("delete_ir_block", lambda block_id: call(
+        "delete_ir_block", document_id=document_id, block_id=block_id,
+    ), lambda: added.pop() if added else ids.pop())
+
+    def operations():
+        picks = ids[::max(len(ids) // 10, 1)][:10]
+        return [{"op": "edit", "block_id": block_id, "content": f"Batch edit {next(counter)}."} for block_id in picks]
+
+    case("apply_ir_operations", lambda ops: call(
+        "apply_ir_operations", document_id=document_id, operations=ops,
+    ), operations)
+    ir_helpers.flush_ir(document_id)
+
+    def pending_edit():
+        call("edit_ir_block", document_id=document_id, block_id=target, new_content=f"Edited text {next(counter)}.")
+
+    case("flush_ir", lambda _: ir_helpers.flush_ir(document_id), pending_edit)
+
+    def cold_fragments():
+        markdown_export._cache = None
+
+    case("export_to_markdown", lambda _: call(
+        "export_to_markdown", document_id=document_id, return_mode="url",
+    ), cold_fragments)
+    case("export_to_markdown_unchanged", lambda _: call(
+        "export_to_markdown", document_id=document_id, return_mode="url",
+    ))
+
+    url_map = {
+        path: f"https://example.invalid/{document_id}/{path}"
+        for block in base["blocks"]
+        for path in [(block.get("image_data") or {}).get("extracted_path")]
+        if path
+    }
+    case("rewrite_asset_paths", lambda ir: ir_helpers.rewrite_asset_paths(ir, url_map), fresh_ir)
+
+    loop.close()
+    ir_helpers.discard_ir(document_id)
+    return results
+
+
+def upload_cases(blocks: int, repeat: int) -> list[dict]:
+    """upload_directory on an output folder with one image per 50 blocks."""
+    files = min(max(blocks // 50, 2), 2000)
+    root = Path(tempfile.mkdtemp(prefix="layoutir_bench_upload_"))
+    try:
+        for i in range(files):
+            path = root / "assets" / "images" / f"img_{i:06d}.png"
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(os.urandom(16 * 1024))
+        (root / "ir.json").write_text(json.dumps(make_ir(blocks)), encoding="utf-8")
+
+        counter = iter(range(10**9))
+        first = measure(lambda document_id: storage.upload_directory(document_id, root),
+                        lambda: f"doc_bench_upload_{next(counter)}", repeat)
+        storage.upload_directory("doc_bench_upload_same", root)
+        again = measure(lambda _: storage.upload_directory("doc_bench_upload_same", root), repeat=repeat)
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+    return [
+        {"case": "upload_directory", "blocks": blocks, "files": files + 1, **first},
+        {"case": "upload_directory_unchanged", "blocks": blocks, "files": files + 1, **again},
+    ]
+
+
+def conversion_cases(pages: list[int], repeat: int) -> list[dict]:
+    from mcp_server import main
+    from mcp_server.utils.workers import get_pool
+
+    try:
+        get_pool().start()
+    except ImportError as exc:
+        print(f"Skipping conversion cases: {exc}", file=sys.stderr)
+        return []
+
+    results = []
+    root = Path(tempfile.mkdtemp(prefix="layoutir_bench_pdf_"))
+    try:
+        for count in pages:
+            pdf = root / f"synthetic_{count}.pdf"
+            make_pdf(pdf, count)
+            main._run_conversion(pdf, f"https://example.invalid/{pdf.name}", f"warmup-{count}")
+            timing = measure(lambda _: main._run_conversion(pdf, f"https://example.invalid/{pdf.name}", "bench"),
+                             repeat=repeat)
+            results.append({"case": "convert", "pages": count, **timing})
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+    return results
+
+
+# ── Reporting ───────────────────────────────────────────────────────
+
+def _case_key(result: dict) -> str:
+    size = f"pages={result['pages']}" if "pages" in result else f"blocks={result['blocks']}"
+    return f"{result['case']}[{size}]"
+
+
+def _revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=Path(__file__).resolve().parent,
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def compare(results: list[dict], baseline_path: Path, threshold: float) -> bool:
+    """Print the change of every case against a baseline. Returns False on a regression."""
+    baseline = {_case_key(r): r for r in json.loads(baseline_path.read_text(encoding="utf-8"))["results"]}
+    ok = True
+    print(f"\n{'case':<44} {'before ms':>10} {'after ms':>10} {'change':>8}")
+    for result in results:
+        before = baseline.get(_case_key(result))
+        if before is None or not before["median_ms"]:
+            continue
+        ratio = result["median_ms"] / before["median_ms"]
+        flag = ""
+        if ratio > threshold:
+            flag, ok = "  REGRESSION", False
+        print(f"{_case_key(result):<44} {before['median_ms']:>10.2f} {result['median_ms']:>10.2f} {ratio:>7.2f}x{flag}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--blocks", type=int, nargs="+", default=[100, 1000, 10000, 100000])
+    parser.add_argument("--pdf-pages", type=int, nargs="*", default=[1, 4], help="PDF sizes to convert; none to skip")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", type=Path, help="write results as JSON to this file")
+    parser.add_argument("--compare", type=Path, help="earlier results file to compare against")
+    parser.add_argument("--threshold", type=float, default=1.25, help="slowdown ratio reported as a regression")
+    args = parser.parse_args()
+
+    storage.set_backend(MemoryBackend())
+    results = []
+    print(f"{'case':<44} {'median ms':>10} {'min ms':>10} {'peak MB':>9}")
+    for blocks in args.blocks:
+        # Fewer runs for the largest documents keep the suite within minutes.
+        repeat = args.repeat if blocks <= 10000 else max(args.repeat // 2, 1)
+        for result in ir_cases(blocks, repeat) + upload_cases(blocks, repeat):
+            results.append(result)
+            print(f"{_case_key(result):<44} {result['median_ms']:>10.2f} {result['min_ms']:>10.2f} {result['peak_mb']:>9.2f}")
+    if args.pdf_pages:
+        for result in conversion_cases(args.pdf_pages, max(args.repeat // 2, 1)):
+            results.append(result)
+            print(f"{_case_key(result):<44} {result['median_ms']:>10.2f} {result['min_ms']:>10.2f} {result['peak_mb']:>9.2f}")
+
+    report = {
+        "format": FORMAT,
+        "revision": _revision(),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "storage_backend": storage.get_backend().name,
+        "results": results,
+    }
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2), encoding="utf-8")
+        print(f"\nWrote {len(results)} results to {args.output}")
+    if args.compare and not compare(results, args.compare, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Synthetic LayoutIR documents for benchmarks.
+
+`make_ir` builds an IR dictionary shaped like a real conversion (headings
+with paragraphs, lists and tables under them, bboxes and metadata on every
+block) without running the pipeline. `make_pdf` writes a minimal text-only
+PDF for benchmarks that do run it.
+"""
+
+import random
+from pathlib import Path
+
+
+# ── IRs ─────────────────────────────────────────────────────────────
+
+WORDS = (
+    "layout analysis page block heading paragraph table figure caption revenue "
+    "quarter growth margin contract clause liability section appendix summary "
+    "method result dataset model training evaluation baseline error sample"
+).split()
+
+
+def _text(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+def make_block(rng: random.Random, index: int, page: int, parent_id: str | None) -> dict:
+    kind = "heading" if index % 12 == 0 else rng.choice(("paragraph", "paragraph", "paragraph", "list", "table"))
+    y = 72 + (index % 24) * 28
+    block = {
+        "block_id": f"blk_{index:016x}",
+        "type": kind,
+        "parent_id": None if kind == "heading" else parent_id,
+        "page_number": page,
+        "bbox": {"x0": 72.0, "y0": float(y), "x1": 540.0, "y1": float(y + 24), "page_width": 612.0, "page_height": 792.0},
+        "content": _text(rng, 6 if kind == "heading" else rng.randint(20, 80)),
+        "metadata": {"label": {"heading": "section_header", "list": "list_item"}.get(kind, "text")},
+        "table_data": None,
+        "image_data": None,
+        "level": 1 if kind == "heading" else None,
+        "list_level": 0 if kind == "list" else None,
+        "order": index * 1024,
+    }
+    if kind == "table":
+        rows = [[_text(rng, 2) for _ in range(4)] for _ in range(5)]
+        block["table_data"] = {"headers": rows[0], "rows": rows[1:], "num_rows": 4, "num_cols": 4}
+    return block
+
+
+def make_ir(blocks: int, blocks_per_page: int = 24, seed: int = 0) -> dict:
+    """A synthetic IR with `blocks` blocks."""
+    rng = random.Random(seed)
+    items = []
+    heading = None
+    for index in range(blocks):
+        block = make_block(rng, index, index // blocks_per_page + 1, heading)
+        if block["type"] == "heading":
+            heading = block["block_id"]
+        items.append(block)
+    pages = (blocks - 1) // blocks_per_page + 1 if blocks else 0
+    return {
+        "document_id": f"doc_synthetic_{blocks}",
+        "schema_version": "1.0.0",
+        "parser_version": "synthetic",
+        "metadata": {"page_count": pages, "source_format": "pdf"},
+        "blocks": items,
+        "relationships": [],
+        "stats": {"block_count": blocks, "page_count": pages, "table_count": 0, "image_count": 0},
+        "ir_version": 1,
+    }
+
+
+# ── PDFs ────────────────────────────────────────────────────────────
+
+LOREM = (
+    "Layout analysis turns scanned and digital pages into structured blocks. "
+    "Each paragraph on this synthetic page exists to give the parser some text "
+    "to recognise, order and group under the heading above it."
+)
+
+
+def make_pdf(path: Path, pages: int, paragraphs: int = 4) -> None:
+    """Write a minimal text-only PDF with `pages` pages."""
+    objects: list[bytes] = []
+
+    def add(body: str) -> int:
+        objects.append(body.encode("latin-1"))
+        return len(objects)
+
+    font = add("<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    pages_id = len(objects) + 1 + 2 * pages  # reserved after the page objects
+    kids = []
+    for number in range(1, pages + 1):
+        lines = [f"BT /F1 20 Tf 72 740 Td (Section {number}) Tj ET"]
+        y = 700
+        for p in range(paragraphs):
+            text = f"{number}.{p + 1} {LOREM}"
+            for start in range(0, len(text), 90):
+                lines.append(f"BT /F1 10 Tf 72 {y} Td ({text[start:start + 90]}) Tj ET")
+                y -= 14
+            y -= 10
+        stream = "\n".join(lines)
+        content = add(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        kids.append(add(
+            f"<< /Type /Page /Parent {pages_id} 0 R /MediaBox [0 0 612 792] "
+            f"/Contents {content} 0 R /Resources << /Font << /F1 {font} 0 R >> >> >>"
+        ))
+    add(f"<< /Type /Pages /Kids [{' '.join(f'{k} 0 R' for k in kids)}] /Count {pages} >>")
+    catalog = add(f"<< /Type /Catalog /Pages {pages_id} 0 R >>")
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    out += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root {catalog} 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    path.write_bytes(bytes(out))
@@ -3,19 +3,31 @@ LayoutIR MCP Server — Stateless FastMCP server exposing LayoutIR tools.
 
 Converts documents to IR, reads/edits/exports IR, all via MCP protocol.
 Input documents are fetched from URLs (any object store).
-All output is persisted to Supabase Storage with public URLs.
+All output is persisted to the configured storage backend (Supabase
+Storage by default) with public URLs.
 """
 
 import json
 import shutil
 import tempfile
+import time
 from pathlib import Path
 from typing import Optional
 
 from fastmcp import FastMCP
+from starlette.requests import Request
+from starlette.responses import FileResponse, JSONResponse, PlainTextResponse, Response
 
-from mcp_server.utils import storage, ir_helpers
-from mcp_server.utils.download import download_to_temp
+from mcp_server.utils import block_store, image_assets, storage, ir_helpers, ir_ops, metrics, reconvert, search_index, tracing
+from mcp_server.utils.concurrency import CONVERT, IO, LIGHT, offload
+from mcp_server.utils.config import get_settings
+from mcp_server.utils.conversion_cache import SingleFlight, cache_key, get_cache
+from mcp_server.utils.download import fetch_to_temp
+from mcp_server.utils.jobs import Job, QueueFullError, get_jobs
+from mcp_server.utils.markdown_export import EXPORT_PATH as MARKDOWN_EXPORT_PATH, get_fragment_cache
+from mcp_server.utils.page_ranges import count_pages, group_pages, page_fingerprints
+from mcp_server.utils.storage_backends import LocalBackend
+from mcp_server.utils.workers import PoolBusyError, get_pool
 
 
 mcp = FastMCP("LayoutIR", instructions="""
@@ -23,9 +35,17 @@ You have access to LayoutIR tools for document processing.
 
 Workflow:
 1. Use `convert_document` with a **public URL** to a document to convert it into IR — returns a `document_id`
+   (for long documents use `submit_conversion` and poll `get_conversion_status` until it reports the `document_id`;
+   for a revised version of a converted file use `reconvert_document`, which only re-runs changed pages)
 2. Use `read_ir` with the `document_id` to get the full document structure and JSON
+   (pass `page_start`/`page_end`, `block_types`, `fields` or `max_blocks` to read only a slice,
+   and `cursor` to continue from `next_cursor`; use `query_blocks` for filtered block queries across many documents)
+   To find where a topic is discussed, use `search_ir` instead of reading the whole IR
 3. Use `edit_ir_block`, `add_ir_block`, or `delete_ir_block` with the `document_id` to modify blocks
+   (use `apply_ir_operations` to apply many edits in one call)
 4. Use `export_to_markdown` with the `document_id` to export the final document
+   (pass `return_mode="url"` or `"preview"` to get the URL or a short preview instead of the full text)
+   (use `export_ir_json` to write the edited IR as a single ir.json file)
 
 IMPORTANT:
 - All tools use `document_id` to reference the document.
@@ -36,48 +56,49 @@ IMPORTANT:
 
 # ── Convert ─────────────────────────────────────────────────────────
 
-@mcp.tool
-def convert_document(file_url: str) -> dict:
-    """Convert a document (PDF) from a URL to LayoutIR intermediate representation.
+_conversions = SingleFlight()
 
-    The document is downloaded from the URL, processed locally, and all output
-    files are uploaded to cloud storage. Asset paths in the IR are rewritten
-    to public URLs.
 
-    Args:
-        file_url: HTTP(S) URL to the document file (PDF)
+def _no_progress(stage: str, **fields) -> None:
+    pass
 
-    Returns:
-        Dictionary with document_id, block count, and public URLs
-    """
-    from layoutir import Pipeline
-    from layoutir.adapters import DoclingAdapter
-    from layoutir.chunking import SemanticSectionChunker
 
-    # 1. Download file from URL to temp dir
-    local_file = download_to_temp(file_url)
+def _run_conversion(local_file: Path, file_url: str, source_sha256: str, progress=_no_progress) -> dict:
+    """Run the pipeline on a downloaded file and upload every output."""
     tmp_output = Path(tempfile.mkdtemp(prefix="layoutir_out_"))
+    pages_total = count_pages(local_file)
+
+    def on_stage(stage: str, pages_done: int | None = None) -> None:
+        # A single-process conversion reports no per-page progress; its
+        # pages count as done once parsed.
+        if pages_done is None:
+            pages_done = 0 if stage == "parsing" else pages_total or 0
+        progress(stage, pages_done=pages_done)
 
     try:
-        # 2. Run the pipeline locally
-        pipeline = Pipeline(
-            adapter=DoclingAdapter(use_gpu=False),
-            chunk_strategy=SemanticSectionChunker(max_heading_level=2),
-        )
-        document = pipeline.process(
-            input_path=local_file,
-            output_dir=tmp_output,
-        )
-
-        doc_id = document.document_id
-        doc_dir = tmp_output / doc_id
+        # Run the pipeline on warm workers (page ranges in parallel for large PDFs)
+        progress("parsing", pages_total=pages_total)
+        with tracing.span("parse"):
+            result = get_pool().convert(local_file, tmp_output, on_stage=on_stage, page_count=pages_total)
 
-        # 3. Upload all output files to Supabase Storage
-        url_map = storage.upload_directory(doc_id, doc_dir)
+        doc_id = result["document_id"]
+        doc_dir = tmp_output / doc_id
 
-        # 4. Rewrite local asset paths in IR to public URLs, then re-upload IR
-        ir = json.loads((doc_dir / "ir.json").read_text(encoding="utf-8"))
-        ir = ir_helpers.rewrite_asset_paths(ir, url_map)
+        # Upload all output files to storage
+        progress("uploading", document_id=doc_id)
+        with tracing.span("publish_images"):
+            images = image_assets.publish_images(doc_dir)
+        with tracing.span("upload_directory"):
+            url_map = storage.upload_directory(doc_id, doc_dir)
+
+        # Rewrite local asset paths in IR to public URLs, then re-upload IR
+        with tracing.span("rewrite_asset_paths"):
+            ir = json.loads((doc_dir / "ir.json").read_text(encoding="utf-8"))
+            ir = ir_helpers.rewrite_asset_paths(ir, url_map, images)
+        block_count = len(ir.get("blocks", []))
+        metrics.observe("conversion_blocks", block_count)
+        metrics.observe("conversion_pages", pages_total or 0)
+        tracing.add("blocks", block_count)
         
         # Store the source URL to allow the frontend to preview the document
         if "metadata" not in ir:
@@ -85,39 +106,490 @@ def convert_document(file_url: str) -> dict:
         ir["metadata"]["source_url"] = file_url
         ir["source_url"] = file_url
         
-        ir_helpers.save_ir(doc_id, ir)
+        with ir_helpers.document_lock(doc_id):
+            ir_helpers.save_ir(doc_id, ir)
+            ir_helpers.flush_ir(doc_id)
+            ir_url = ir_helpers.write_ir_json(doc_id)
+
+        # Page fingerprints let reconvert_document skip unchanged pages later
+        with tracing.span("fingerprints"):
+            fingerprints = page_fingerprints(local_file)
+            if fingerprints is not None:
+                reconvert.save_fingerprints(doc_id, source_sha256, fingerprints)
 
         return {
             "document_id": doc_id,
-            "block_count": len(ir.get("blocks", [])),
-            "ir_url": url_map.get("ir.json"),
+            "block_count": block_count,
+            "ir_url": ir_url,
             "manifest_url": url_map.get("manifest.json"),
-            "message": f"Document converted and uploaded. Use read_ir(document_id='{doc_id}') to see the structure.",
         }
     finally:
-        # 5. Clean up temp directories
+        shutil.rmtree(tmp_output, ignore_errors=True)
+
+
+def _convert(file_url: str, progress=_no_progress) -> tuple[dict, bool]:
+    """Download, convert (or reuse a cached conversion) and upload a document.
+
+    Returns (result, cached). `progress(stage, **fields)` is called as the
+    conversion moves through its stages.
+    """
+    # 1. Stream the file from the URL to a temp dir, hashing it on the way
+    progress("downloading")
+    with tracing.span("download"):
+        downloaded = fetch_to_temp(file_url)
+    local_file = downloaded.path
+    tracing.add("download_bytes", downloaded.size)
+
+    try:
+        # 2. Look the content up in the conversion cache
+        key = cache_key(downloaded.sha256)
+        cache = get_cache()
+
+        result = cache.get(key)
+        cached = result is not None
+
+        if not cached:
+            # 3. Convert, sharing the job with identical in-flight requests
+            hit = False
+
+            def convert_and_cache() -> dict:
+                nonlocal hit
+                # An identical conversion may have finished since the lookup above.
+                stored = cache.get(key)
+                if stored is not None:
+                    hit = True
+                    return stored
+                converted = _run_conversion(local_file, file_url, downloaded.sha256, progress)
+                cache.put(key, converted)
+                return converted
+
+            result, shared = _conversions.do(key, convert_and_cache)
+            cached = shared or hit
+        return result, cached
+    finally:
+        # 4. Clean up the downloaded file
         shutil.rmtree(local_file.parent, ignore_errors=True)
+
+
+def _run_job(job: Job, progress) -> dict:
+    """Job handler: convert, waiting for room when the worker pool is full."""
+    with tracing.trace("conversion_job", queue_seconds=round(time.time() - job.created_at, 6)):
+        while True:
+            try:
+                result, cached = _convert(job.file_url, progress)
+                return dict(result, cached=cached)
+            except PoolBusyError:
+                progress("queued")
+                time.sleep(1.0)
+
+
+def _jobs():
+    return get_jobs(_run_job)
+
+
+def start_jobs() -> None:
+    """Resume persisted jobs and start the job runners (call once at server startup)."""
+    _jobs().start()
+
+
+@mcp.tool
+@offload(CONVERT)
+def convert_document(file_url: str) -> dict:
+    """Convert a document (PDF) from a URL to LayoutIR intermediate representation.
+
+    The document is downloaded from the URL, processed locally, and all output
+    files are uploaded to cloud storage. Asset paths in the IR are rewritten
+    to public URLs. A file that was already converted with the same pipeline
+    settings is served from the conversion cache without running the pipeline.
+
+    For long documents prefer `submit_conversion`, which returns immediately.
+
+    Args:
+        file_url: HTTP(S) URL to the document file (PDF)
+
+    Returns:
+        Dictionary with document_id, block count, and public URLs
+    """
+    result, cached = _convert(file_url)
+    doc_id = result["document_id"]
+    return {
+        "document_id": doc_id,
+        "block_count": result["block_count"],
+        "ir_url": result["ir_url"],
+        "manifest_url": result["manifest_url"],
+        "cached": cached,
+        "message": f"Document converted and uploaded. Use read_ir(document_id='{doc_id}') to see the structure.",
+    }
+
+
+@mcp.tool
+@offload(CONVERT)
+def reconvert_document(document_id: str, file_url: str) -> dict:
+    """Update a converted document from a revised version of its file.
+
+    Each page of the new file is compared with the pages of the file the
+    document was last converted from; only changed or new pages are run
+    through the pipeline. Blocks on unchanged pages keep their block_ids,
+    and blocks changed with the edit tools are kept where their page still
+    exists.
+
+    Args:
+        document_id: The document ID returned by convert_document
+        file_url: HTTP(S) URL to the revised document file (PDF)
+
+    Returns:
+        Dictionary with page and block counts for the update
+    """
+    with tracing.span("download"):
+        downloaded = fetch_to_temp(file_url)
+    local_file = downloaded.path
+    tmp_output = Path(tempfile.mkdtemp(prefix="layoutir_out_"))
+    try:
+        with tracing.span("fingerprints"):
+            new_pages = page_fingerprints(local_file)
+        if new_pages is None:
+            return {"error": "Could not read the pages of the revised file; only PDFs can be re-converted."}
+
+        stored = reconvert.load_fingerprints(document_id)
+        with ir_helpers.document_lock(document_id):
+            ir = ir_helpers.load_ir(document_id)
+            old_count = ir.get("stats", {}).get("page_count") or ir.get("metadata", {}).get("page_count") or 0
+        # Without stored fingerprints every page counts as changed.
+        old_pages = stored["pages"] if stored else [None] * old_count
+        plan = reconvert.plan_pages(old_pages, new_pages)
+
+        # Convert changed pages, grouped into runs of consecutive pages
+        fresh: dict[int, list[dict]] = {page: [] for page in plan.convert}
+        if plan.convert:
+            with tracing.span("parse"):
+                results = get_pool().convert_pages(local_file, tmp_output, group_pages(plan.convert))
+            with tracing.span("publish_images"):
+                images = image_assets.publish_images(tmp_output)
+            with tracing.span("upload_directory"):
+                url_map = storage.upload_directory(document_id, tmp_output)
+            blocks = [block for result in results for block in result["blocks"]]
+            with tracing.span("rewrite_asset_paths"):
+                ir_helpers.rewrite_asset_paths({"blocks": blocks}, url_map, images)
+            for block in blocks:
+                fresh.setdefault(block.get("page_number"), []).append(block)
+
+        with ir_helpers.document_lock(document_id):
+            ir = ir_helpers.load_ir(document_id)
+            with tracing.span("splice"):
+                summary = reconvert.splice(ir, plan, fresh, len(new_pages))
+            ir.setdefault("metadata", {})["source_url"] = file_url
+            ir["source_url"] = file_url
+            ir_helpers.save_ir(document_id, ir)
+            ir_helpers.flush_ir(document_id)
+            ir_url = ir_helpers.write_ir_json(document_id)
+            block_count = len(ir["blocks"])
+
+        reconvert.save_fingerprints(document_id, downloaded.sha256, new_pages)
+
+        # The document now holds the revised file's conversion.
+        cache = get_cache()
+        if stored and stored.get("sha256"):
+            cache.invalidate(cache_key(stored["sha256"]))
+        cache.put(cache_key(downloaded.sha256), {
+            "document_id": document_id,
+            "block_count": block_count,
+            "ir_url": ir_url,
+            "manifest_url": storage.get_public_url(f"{document_id}/manifest.json"),
+        })
+    finally:
         shutil.rmtree(tmp_output, ignore_errors=True)
+        shutil.rmtree(local_file.parent, ignore_errors=True)
+
+    metrics.inc("reconversions_total")
+    metrics.observe("reconversion_pages_converted", len(plan.convert))
+    return {
+        "document_id": document_id,
+        "pages_total": len(new_pages),
+        "pages_converted": len(plan.convert),
+        "pages_unchanged": len(plan.unchanged),
+        "pages_removed": len(plan.removed),
+        "block_count": block_count,
+        "blocks_kept": summary.kept_blocks,
+        "blocks_converted": summary.fresh_blocks,
+        "edits_kept": summary.kept_edits,
+        "edits_dropped": summary.dropped_edits,
+        "ir_url": ir_url,
+        "message": f"Document {document_id} updated: {len(plan.convert)} of {len(new_pages)} pages re-converted.",
+    }
+
+
+@mcp.tool
+@offload(LIGHT)
+def submit_conversion(file_url: str, priority: int = 0) -> dict:
+    """Queue a document (PDF) for conversion in the background and return at once.
+
+    Poll `get_conversion_status` with the returned job_id until its status
+    is "done", then use the reported document_id with the other tools.
+
+    Args:
+        file_url: HTTP(S) URL to the document file (PDF)
+        priority: Jobs with a higher priority run first (default 0)
+
+    Returns:
+        Dictionary with the job_id and its place in the queue, or an error
+        when the queue is full
+    """
+    jobs = _jobs()
+    jobs.start()
+    try:
+        job = jobs.submit(file_url, priority)
+    except QueueFullError as exc:
+        return {"error": str(exc)}
+    return {
+        "job_id": job.job_id,
+        "status": job.status,
+        "queue_position": jobs.position(job.job_id),
+        "message": f"Conversion queued. Use get_conversion_status(job_id='{job.job_id}') to follow it.",
+    }
+
+
+@mcp.tool
+@offload(LIGHT)
+def get_conversion_status(job_id: str) -> dict:
+    """Report the progress of a conversion started with `submit_conversion`.
+
+    Args:
+        job_id: The job ID returned by submit_conversion
+
+    Returns:
+        Status (queued, running, done, failed), stage (queued, downloading,
+        parsing, chunking, writing, uploading, done), pages done out of total,
+        and the document_id and URLs once the job is done
+    """
+    job = _jobs().status(job_id)
+    if job is None:
+        return {"error": f"Job {job_id} not found"}
+    if job["status"] == "queued":
+        job["queue_position"] = _jobs().position(job_id)
+    return job
 
 
 # ── Read ─────────────────────────────────────────────────────────────
 
 @mcp.tool
-def read_ir(document_id: str) -> dict:
-    """Read the full IR for a document, returning the structured JSON.
+@offload(LIGHT)
+def read_ir(
+    document_id: str,
+    page_start: Optional[int] = None,
+    page_end: Optional[int] = None,
+    block_types: Optional[list[str]] = None,
+    fields: Optional[list[str]] = None,
+    cursor: Optional[str] = None,
+    max_blocks: Optional[int] = None,
+    max_bytes: Optional[int] = None,
+) -> dict:
+    """Read the IR for a document, returning the structured JSON.
+
+    Called with only `document_id`, returns the full IR (this is what the
+    document viewer uses). Any other argument switches to a slice: only the
+    matching blocks are returned, in document order, with `next_cursor` set
+    when more remain.
 
     Args:
         document_id: The document ID returned by convert_document
+        page_start: First page to include (optional)
+        page_end: Last page to include (optional)
+        block_types: Only include these block types, e.g. ['heading', 'table'] (optional)
+        fields: Only return these block fields, e.g. ['type', 'content']; block_id is always included (optional)
+        cursor: `next_cursor` from a previous call, to continue reading; it is only valid until the document is edited (optional)
+        max_blocks: Maximum number of blocks to return, at least 1 (optional)
+        max_bytes: Approximate maximum size of the returned blocks in bytes (optional)
+
+    Returns:
+        The full IR JSON as a dictionary, or the requested slice of blocks.
+    """
+    if all(arg is None for arg in (page_start, page_end, block_types, fields, cursor, max_blocks, max_bytes)):
+        with ir_helpers.document_lock(document_id):
+            ir = ir_helpers.load_ir(document_id)
+            # Copy the blocks: the result is serialized after the lock is released
+            with tracing.span("copy_blocks"):
+                return {**ir, "blocks": [dict(block) for block in ir.get("blocks", [])]}
+
+    partial = page_start is not None or page_end is not None
+    with ir_helpers.document_lock(document_id):
+        if partial:
+            # Only the page shards in range are fetched unless the IR is already cached.
+            ir = ir_helpers.load_ir_pages(document_id, page_start, page_end)
+        else:
+            ir = ir_helpers.load_ir(document_id)
+
+        start = time.perf_counter()
+        index = ir_helpers.get_block_index(document_id, ir)
+        try:
+            result = ir_ops.read_slice(
+                index,
+                page_start=page_start,
+                page_end=page_end,
+                block_types=block_types,
+                fields=fields,
+                cursor=cursor,
+                max_blocks=max_blocks,
+                max_bytes=max_bytes,
+            )
+        except ValueError as exc:
+            return {"error": str(exc)}
+        elapsed_ms = (time.perf_counter() - start) * 1000
+    metrics.observe("read_ir_payload_bytes", result["payload_bytes"])
+    metrics.observe("read_ir_blocks", len(result["blocks"]))
+
+    entry = ir_helpers.cache_entry(document_id)
+    return {
+        "document_id": ir.get("document_id", document_id),
+        "metadata": ir.get("metadata", {}),
+        "ir_version": ir.get("ir_version", 0),
+        "total_blocks": ir.get("stats", {}).get("block_count", len(index.blocks)) if partial else len(index.blocks),
+        "returned_blocks": len(result["blocks"]),
+        "blocks": result["blocks"],
+        "next_cursor": result["next_cursor"],
+        "payload": {
+            "bytes": result["payload_bytes"],
+            "full_ir_bytes": entry.size if entry is not None else None,
+            "serialize_ms": round(elapsed_ms, 3),
+        },
+    }
+
+
+def _search_index(document_id: str) -> search_index.DocumentIndex:
+    """A document's search index, built from its IR if none is stored yet."""
+    index = search_index.load_index(document_id)
+    if index is None:
+        with ir_helpers.document_lock(document_id):
+            ir = ir_helpers.load_ir(document_id)
+            index = search_index.get_registry().put(document_id, search_index.DocumentIndex.build(ir))
+            search_index.write_index(document_id, ir)
+    return index
+
+
+@mcp.tool
+@offload(IO)
+def search_ir(
+    query: str,
+    document_id: Optional[str] = None,
+    top_k: int = 10,
+    filters: Optional[dict] = None,
+    document_ids: Optional[list[str]] = None,
+) -> dict:
+    """Full-text search over block content, returning the best-matching blocks.
+
+    Use this instead of `read_ir` to find where a topic is discussed. Omit
+    `document_id` to search across documents: the ones listed in
+    `document_ids`, or every converted document.
+
+    Args:
+        query: Words to search for
+        document_id: The document to search (optional, default a cross-document search)
+        top_k: Maximum number of results
+        filters: Optional {"block_types": [...], "page_start": n, "page_end": n}
+        document_ids: Documents for a cross-document search (optional, default all)
+
+    Returns:
+        Ranked results with document_id, block_id, score, page_number, type, bbox and a snippet
+    """
+    filters = filters or {}
+    unknown = set(filters) - {"block_types", "page_start", "page_end"}
+    if unknown:
+        return {"error": f"Unknown filters {sorted(unknown)}; use block_types, page_start, page_end"}
+
+    missing: list[str] = []
+    if document_id is not None:
+        indexes = {document_id: _search_index(document_id)}
+    else:
+        indexes, missing = search_index.load_indexes(document_ids or storage.list_documents())
+        if document_ids:
+            # Documents converted before search existed get an index built now.
+            for doc_id in list(missing):
+                try:
+                    indexes[doc_id] = _search_index(doc_id)
+                    missing.remove(doc_id)
+                except Exception:
+                    continue
+
+    start = time.perf_counter()
+    results = search_index.search(indexes, query, top_k, filters)
+    metrics.observe("search_ir_seconds", time.perf_counter() - start)
+    return {
+        "query": query,
+        "results": results,
+        "documents_searched": len(indexes),
+        "missing_documents": missing,
+    }
+
+
+@mcp.tool
+@offload(IO)
+def query_blocks(
+    document_ids: Optional[list[str]] = None,
+    columns: Optional[list[str]] = None,
+    block_types: Optional[list[str]] = None,
+    page_start: Optional[int] = None,
+    page_end: Optional[int] = None,
+    group_by: Optional[list[str]] = None,
+    limit: int = 1000,
+) -> dict:
+    """Query blocks across many documents from their columnar block stores.
+
+    Rows are filtered and projected while the per-document Parquet files are
+    decoded, without loading any IR JSON. With `group_by`, returns the number
+    of matching blocks per group instead of the rows (e.g. group_by=
+    ['document_id', 'type'] for the block-type distribution per document).
+
+    Available columns: document_id, block_id, order, page_number, type, label,
+    level, parent_id, x0, y0, x1, y1, content, manual.
+
+    Args:
+        document_ids: Documents to scan (optional, default every document)
+        columns: Columns to return (optional, default all)
+        block_types: Only include these block types, e.g. ['table'] (optional)
+        page_start: First page to include (optional)
+        page_end: Last page to include (optional)
+        group_by: Count matching blocks per distinct value of these columns (optional)
+        limit: Maximum number of rows (or groups) to return
 
     Returns:
-        The full IR JSON as a dictionary.
+        Column-oriented results: {"columns": {name: [values...]}, "row_count", ...}
     """
-    return ir_helpers.load_ir(document_id)
+    wanted = columns
+    if group_by:
+        wanted = list(group_by)
+    try:
+        table, missing = block_store.scan(document_ids, wanted, block_types, page_start, page_end)
+        # Documents converted before the block store existed get one built from their IR.
+        rebuilt = []
+        for document_id in missing if document_ids is not None else []:
+            try:
+                with ir_helpers.document_lock(document_id):
+                    block_store.write_blocks(document_id, ir_helpers.load_ir(document_id))
+                rebuilt.append(document_id)
+            except Exception:
+                continue
+        if rebuilt:
+            extra, _ = block_store.scan(rebuilt, wanted, block_types, page_start, page_end)
+            table = block_store.concat([table, extra])
+            missing = [document_id for document_id in missing if document_id not in rebuilt]
+    except (block_store.BlockStoreUnavailable, ValueError) as exc:
+        return {"error": str(exc)}
+
+    if group_by:
+        table = table.group_by(list(group_by)).aggregate([([], "count_all")])
+        table = table.rename_columns(["count" if name == "count_all" else name for name in table.column_names])
+    row_count = table.num_rows
+    return {
+        "columns": table.slice(0, max(limit, 0)).to_pydict(),
+        "row_count": row_count,
+        "truncated": row_count > limit,
+        "missing_documents": missing,
+    }
 
 
 # ── Edit ─────────────────────────────────────────────────────────────
 
 @mcp.tool
+@offload(LIGHT)
 def edit_ir_block(
     document_id: str,
     block_id: str,
@@ -137,32 +609,26 @@ def edit_ir_block(
     Returns:
         Confirmation of the edit
     """
-    ir = ir_helpers.load_ir(document_id)
-    found = False
-
-    for block in ir.get("blocks", []):
-        if block["block_id"] == block_id:
-            if new_content is not None:
-                block["content"] = new_content
-            if new_type is not None:
-                block["type"] = new_type
-            if new_metadata is not None:
-                block["metadata"] = json.loads(new_metadata)
-            found = True
-            break
-
-    if not found:
-        return {"error": f"Block {block_id} not found"}
-
-    ir_helpers.save_ir(document_id, ir)
-    return {
-        "success": True,
-        "block_id": block_id,
-        "message": f"Block {block_id} updated successfully.",
-    }
+    metadata = json.loads(new_metadata) if new_metadata is not None else None
+    with ir_helpers.document_lock(document_id):
+        ir = ir_helpers.load_ir(document_id)
+        index = ir_helpers.get_block_index(document_id, ir)
+
+        try:
+            ir_ops.edit_block(index, block_id, content=new_content, block_type=new_type, metadata=metadata)
+        except KeyError:
+            return {"error": f"Block {block_id} not found"}
+
+        ir_helpers.save_ir(document_id, ir, index.drain_changes())
+        return {
+            "success": True,
+            "block_id": block_id,
+            "message": f"Block {block_id} updated successfully.",
+        }
 
 
 @mcp.tool
+@offload(LIGHT)
 def add_ir_block(
     document_id: str,
     after_block_id: str,
@@ -182,56 +648,25 @@ def add_ir_block(
     Returns:
         Confirmation with the new block's ID
     """
-    ir = ir_helpers.load_ir(document_id)
-    blocks = ir.get("blocks", [])
-
-    insert_idx = None
-    ref_block = None
-    for i, block in enumerate(blocks):
-        if block["block_id"] == after_block_id:
-            insert_idx = i + 1
-            ref_block = block
-            break
-
-    if insert_idx is None:
-        return {"error": f"Block {after_block_id} not found"}
-
-    new_order = ref_block["order"] + 1
-
-    # Shift orders of subsequent blocks
-    for block in blocks[insert_idx:]:
-        block["order"] += 1
-
-    new_block = {
-        "block_id": ir_helpers.generate_block_id(content, block_type, new_order),
-        "type": block_type,
-        "parent_id": None,
-        "page_number": ref_block.get("page_number", 1),
-        "bbox": ref_block.get("bbox", {"x0": 0, "y0": 0, "x1": 0, "y1": 0, "page_width": None, "page_height": None}),
-        "content": content,
-        "metadata": {"label": label},
-        "table_data": None,
-        "image_data": None,
-        "level": None,
-        "list_level": None,
-        "order": new_order,
-    }
+    with ir_helpers.document_lock(document_id):
+        ir = ir_helpers.load_ir(document_id)
+        index = ir_helpers.get_block_index(document_id, ir)
 
-    blocks.insert(insert_idx, new_block)
-    ir["blocks"] = blocks
+        try:
+            new_block = ir_ops.insert_block_after(index, after_block_id, content, block_type, label)
+        except KeyError:
+            return {"error": f"Block {after_block_id} not found"}
 
-    if "stats" in ir:
-        ir["stats"]["block_count"] = len(blocks)
-
-    ir_helpers.save_ir(document_id, ir)
-    return {
-        "success": True,
-        "new_block_id": new_block["block_id"],
-        "message": f"New {block_type} block added after {after_block_id}.",
-    }
+        ir_helpers.save_ir(document_id, ir, index.drain_changes())
+        return {
+            "success": True,
+            "new_block_id": new_block["block_id"],
+            "message": f"New {block_type} block added after {after_block_id}.",
+        }
 
 
 @mcp.tool
+@offload(LIGHT)
 def delete_ir_block(document_id: str, block_id: str) -> dict:
     """Delete a block from the IR by its block_id.
 
@@ -242,82 +677,190 @@ def delete_ir_block(document_id: str, block_id: str) -> dict:
     Returns:
         Confirmation of the deletion
     """
-    ir = ir_helpers.load_ir(document_id)
-    blocks = ir.get("blocks", [])
-    original_len = len(blocks)
+    with ir_helpers.document_lock(document_id):
+        ir = ir_helpers.load_ir(document_id)
+        index = ir_helpers.get_block_index(document_id, ir)
 
-    ir["blocks"] = [b for b in blocks if b["block_id"] != block_id]
+        try:
+            ir_ops.delete_block(index, block_id)
+        except KeyError:
+            return {"error": f"Block {block_id} not found"}
 
-    if len(ir["blocks"]) == original_len:
-        return {"error": f"Block {block_id} not found"}
+        ir_helpers.save_ir(document_id, ir, index.drain_changes())
+        return {
+            "success": True,
+            "block_id": block_id,
+            "message": f"Block {block_id} deleted successfully.",
+        }
 
-    # Re-order blocks
-    for i, block in enumerate(ir["blocks"]):
-        block["order"] = i
 
-    if "stats" in ir:
-        ir["stats"]["block_count"] = len(ir["blocks"])
+@mcp.tool
+@offload(LIGHT)
+def apply_ir_operations(document_id: str, operations: list[dict]) -> dict:
+    """Apply a batch of block operations to the IR in one atomic write.
 
-    ir_helpers.save_ir(document_id, ir)
-    return {
-        "success": True,
-        "block_id": block_id,
-        "message": f"Block {block_id} deleted successfully.",
-    }
+    All operations are validated against the current IR first; if any is
+    invalid nothing is changed. Operations run in order and later ones may
+    refer to a block added earlier in the batch as "$N" (N = position of
+    the add operation in the list).
+
+    Supported operations:
+        {"op": "edit", "block_id": ..., "content"?: ..., "type"?: ..., "metadata"?: {...}}
+        {"op": "add", "after_block_id": ..., "content": ..., "block_type"?: ..., "label"?: ...}
+        {"op": "delete", "block_id": ...}
+        {"op": "move", "block_id": ..., "after_block_id": ...}
+
+    Args:
+        document_id: The document ID
+        operations: Ordered list of operations
+
+    Returns:
+        Per-operation results and the new IR version
+    """
+    with ir_helpers.document_lock(document_id):
+        ir = ir_helpers.load_ir(document_id)
+        index = ir_helpers.get_block_index(document_id, ir)
+
+        try:
+            operations = ir_ops.validate_operations(index, operations)
+        except ir_ops.OperationError as exc:
+            return {"error": str(exc), "operation_index": exc.position}
+
+        # Persist earlier edits first so a failure below can fall back to storage
+        ir_helpers.flush_ir(document_id)
+        try:
+            results = ir_ops.apply_operations(index, operations)
+        except Exception:
+            ir_helpers.discard_ir(document_id)
+            raise
+
+        ir_helpers.save_ir(document_id, ir, index.drain_changes())
+        return {
+            "success": True,
+            "results": results,
+            "ir_version": ir["ir_version"],
+            "message": f"Applied {len(results)} operations to document {document_id}.",
+        }
 
 
 # ── Export ───────────────────────────────────────────────────────────
 
 @mcp.tool
-def export_to_markdown(document_id: str) -> dict:
+@offload(IO)
+def export_to_markdown(document_id: str, return_mode: str = "full", preview_chars: int = 2000) -> dict:
     """Export IR to Markdown format and upload to cloud storage.
 
+    Blocks that have not changed since an earlier export are not rendered
+    again, and the upload is skipped when the Markdown is unchanged.
+
     Args:
         document_id: The document ID
+        return_mode: "full" returns the whole Markdown, "url" only its public URL,
+            "preview" the first `preview_chars` characters
+        preview_chars: Length of the preview for return_mode="preview"
 
     Returns:
-        Dictionary with the markdown content and its public URL
+        Dictionary with the public URL and the Markdown (or a preview of it)
     """
-    ir = ir_helpers.load_ir(document_id)
-    blocks = sorted(ir.get("blocks", []), key=lambda b: b.get("order", 0))
-
-    lines = []
-    for block in blocks:
-        content = block.get("content", "").strip()
-        if not content:
-            continue
-
-        block_type = block.get("type", "paragraph")
-        label = block.get("metadata", {}).get("label", "text")
-
-        if block_type == "heading" or label == "section_header":
-            level = block.get("level") or 1
-            prefix = "#" * min(level, 6)
-            lines.append(f"{prefix} {content}")
-            lines.append("")
-        elif block_type == "list" or label == "list_item":
-            lines.append(f"- {content}")
-        elif block_type == "table":
-            lines.append(content)
-            lines.append("")
-        else:
-            lines.append(content)
-            lines.append("")
+    if return_mode not in ("full", "url", "preview"):
+        return {"error": f"Unknown return_mode {return_mode!r}; use 'full', 'url' or 'preview'"}
+
+    # Make sure the stored IR matches what is exported
+    ir_helpers.flush_ir(document_id)
+    fragments = get_fragment_cache()
+    with ir_helpers.document_lock(document_id):
+        ir = ir_helpers.load_ir(document_id)
+        # The index keeps blocks in document order; no sort needed
+        blocks = ir_helpers.get_block_index(document_id, ir).blocks
+        with tracing.span("render_markdown"):
+            export = fragments.render(blocks)
+
+    # Upload to storage unless this exact output is already there
+    export_path = f"{document_id}/{MARKDOWN_EXPORT_PATH}"
+    uploaded = not fragments.is_uploaded(document_id, export.sha256)
+    if uploaded:
+        with tracing.span("upload_export"):
+            public_url = storage.upload_text(export_path, export.markdown, content_type="text/markdown")
+        fragments.mark_uploaded(document_id, export.sha256)
+    else:
+        public_url = storage.get_public_url(export_path)
+    metrics.inc("markdown_exports_total", uploaded="yes" if uploaded else "no")
+
+    result = {
+        "url": public_url,
+        "sha256": export.sha256,
+        "chars": len(export.markdown),
+        "uploaded": uploaded,
+        "rendered_blocks": export.rendered_blocks,
+        "cached_blocks": export.cached_blocks,
+        "message": f"Markdown exported {'and uploaded ' if uploaded else '(unchanged, upload skipped) '}for document {document_id}.",
+    }
+    if return_mode == "full":
+        result["markdown"] = export.markdown
+    elif return_mode == "preview":
+        result["preview"] = export.markdown[:max(preview_chars, 0)]
+        result["truncated"] = len(export.markdown) > max(preview_chars, 0)
+    return result
+
+
+@mcp.tool
+@offload(IO)
+def export_ir_json(document_id: str) -> dict:
+    """Write the current IR, including all edits, as a single ir.json file in cloud storage.
 
-    markdown = "\n".join(lines)
+    The IR is stored page by page; use this when a client needs one JSON file.
 
-    # Upload to Supabase Storage
-    export_path = f"{document_id}/exports/markdown/full_document.md"
-    public_url = storage.upload_text(export_path, markdown, content_type="text/markdown")
+    Args:
+        document_id: The document ID
 
+    Returns:
+        Dictionary with the public URL of ir.json
+    """
+    ir_helpers.flush_ir(document_id)
+    url = ir_helpers.write_ir_json(document_id)
     return {
-        "markdown": markdown,
-        "url": public_url,
-        "message": f"Markdown exported and uploaded for document {document_id}.",
+        "url": url,
+        "message": f"IR JSON exported and uploaded for document {document_id}.",
     }
 
 
+# ── Metrics ──────────────────────────────────────────────────────────
+
+@mcp.custom_route("/metrics", methods=["GET"])
+async def metrics_endpoint(request: Request) -> Response:
+    """Expose in-process server metrics in the Prometheus text format.
+
+    `?format=json` returns the same metrics as a JSON snapshot.
+    """
+    ir_helpers.ir_cache_stats()
+    if request.query_params.get("format") == "json":
+        return JSONResponse(metrics.snapshot())
+    return PlainTextResponse(metrics.render_prometheus(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+# ── Local storage files ──────────────────────────────────────────────
+
+@mcp.custom_route("/files/{path:path}", methods=["GET"])
+async def storage_file(request: Request) -> Response:
+    """Serve stored objects when `STORAGE_BACKEND=local` (the targets of its public URLs)."""
+    backend = storage.get_backend()
+    if not isinstance(backend, LocalBackend):
+        return JSONResponse({"error": "Not found"}, status_code=404)
+    try:
+        target = backend.file_path(request.path_params["path"])
+    except ValueError:
+        return JSONResponse({"error": "Not found"}, status_code=404)
+    if not target.is_file():
+        return JSONResponse({"error": "Not found"}, status_code=404)
+    return FileResponse(target)
+
+
 # ── Entry point ──────────────────────────────────────────────────────
 
 if __name__ == "__main__":
-    mcp.run(transport="http", host="0.0.0.0", port=8000)
\ No newline at end of file
+    from mcp_server.utils.workers import start_pool
+
+    start_pool()
+    start_jobs()
+    settings = get_settings()
+    mcp.run(transport="http", host=settings.server_host, port=settings.server_port)
\ No newline at end of file
@@ -0,0 +1,83 @@
+"""
+Encoding tests for `ir_codec`.
+
+Run:
+  uv run pytest mcp_server/tests/test_ir_codec.py
+"""
+
+import gzip
+
+import pytest
+
+from mcp_server.utils import ir_codec
+from mcp_server.utils.ir_model import Block
+
+
+VALUE = {
+    "document_id": "doc",
+    "blocks": [{"block_id": f"blk_{i}", "content": "é ✓ text", "bbox": {"x0": 0.5, "y0": i}} for i in range(20)],
+}
+
+
+@pytest.mark.parametrize("codec", ["gzip", "zstd"])
+def test_header_round_trip(codec):
+    if codec == "zstd" and ir_codec.zstandard is None:
+        pytest.skip("zstandard is not installed")
+    data = ir_codec.encode(VALUE, codec)
+
+    assert data[:3] == ir_codec.MAGIC
+    assert data[3] == ir_codec.FORMAT_VERSION
+    assert ir_codec.CODECS[data[4]] == codec
+    assert ir_codec.decode(data) == VALUE
+    assert ir_codec.decode(memoryview(data)) == VALUE
+    assert ir_codec.content_type(codec) == "application/octet-stream"
+
+
+def test_json_has_no_header():
+    data = ir_codec.encode(VALUE, "json")
+
+    assert not data.startswith(ir_codec.MAGIC)
+    assert ir_codec.decode(data) == VALUE
+    assert ir_codec.decode(data.decode("utf-8")) == VALUE
+    assert ir_codec.content_type("json") == "application/json"
+
+
+def test_blocks_encode_as_dicts():
+    assert ir_codec.decode(ir_codec.encode([Block(VALUE["blocks"][0])], "gzip")) == VALUE["blocks"][:1]
+
+
+def test_gzip_payload_is_standard_gzip():
+    data = ir_codec.encode(VALUE, "gzip")
+    assert ir_codec.loads_json(gzip.decompress(data[ir_codec.HEADER_SIZE:])) == VALUE
+
+
+def test_zstd_falls_back_to_gzip_without_zstandard(monkeypatch):
+    monkeypatch.setattr(ir_codec, "zstandard", None)
+
+    assert ir_codec.resolve_codec("zstd") == "gzip"
+    data = ir_codec.encode(VALUE, "zstd")
+    assert ir_codec.CODECS[data[4]] == "gzip"
+    assert ir_codec.decode(data) == VALUE
+
+
+def test_zstd_object_without_zstandard_is_an_error(monkeypatch):
+    if ir_codec.zstandard is None:
+        pytest.skip("zstandard is not installed")
+    data = ir_codec.encode(VALUE, "zstd")
+    monkeypatch.setattr(ir_codec, "zstandard", None)
+
+    with pytest.raises(ir_codec.CodecError, match="zstandard"):
+        ir_codec.decode(data)
+
+
+def test_unknown_header_fields_are_rejected():
+    payload = ir_codec.encode(VALUE, "gzip")[ir_codec.HEADER_SIZE:]
+    with pytest.raises(ir_codec.CodecError, match="format version"):
+        ir_codec.decode(ir_codec.MAGIC + bytes((ir_codec.FORMAT_VERSION + 1, 1)) + payload)
+    with pytest.raises(ir_codec.CodecError, match="codec id"):
+        ir_codec.decode(ir_codec.MAGIC + bytes((ir_codec.FORMAT_VERSION, 99)) + payload)
+
+
+def test_unknown_codec_name_is_rejected():
+    with pytest.raises(ir_codec.CodecError):
+        ir_codec.encode(VALUE, "brotli")
@@ -0,0 +1,194 @@
+"""
+Edit journal tests for `ir_helpers`, against an in-memory storage backend.
+
+Run:
+  uv run pytest mcp_server/tests/test_ir_journal.py
+"""
+
+import copy
+
+import pytest
+
+from mcp_server.utils import ir_cache, ir_helpers, search_index, storage
+from mcp_server.utils.config import get_settings
+from mcp_server.utils.ir_model import plain
+from mcp_server.utils.ir_ops import ORDER_GAP, BlockIndex
+from mcp_server.utils.storage_backends import MemoryBackend
+
+
+DOC = "doc-journal"
+
+
+def make_ir(pages: int = 3, per_page: int = 4) -> dict:
+    blocks = [
+        {
+            "block_id": f"blk_{page}_{i}",
+            "type": "paragraph",
+            "content": f"page {page} block {i}",
+            "page_number": page,
+            "order": ((page - 1) * per_page + i) * ORDER_GAP,
+        }
+        for page in range(1, pages + 1)
+        for i in range(per_page)
+    ]
+    return {"document_id": DOC, "blocks": blocks, "stats": {"block_count": len(blocks)}}
+
+
+def snapshot(ir: dict) -> dict:
+    """The comparable content of an IR: plain blocks plus the other top-level fields."""
+    view = {key: copy.deepcopy(value) for key, value in ir.items() if key not in ("blocks", "journal_seq")}
+    view["blocks"] = [plain(block) for block in ir["blocks"]]
+    return view
+
+
+def journal_seqs() -> list[int]:
+    return ir_helpers._list_journal(DOC)
+
+
+def edit(ir: dict, step: int) -> list[dict]:
+    """One save's worth of edits: change a block, add one after it, delete another."""
+    index = BlockIndex(ir)
+    target = ir["blocks"][step % len(ir["blocks"])]
+    index.update(target, {"content": f"edited {step}", "manual": "edited"})
+    index.insert({
+        "block_id": f"blk_new_{step}",
+        "type": "paragraph",
+        "content": f"added {step}",
+        "page_number": target["page_number"],
+        "order": index.order_after(target),
+        "manual": "added",
+    })
+    index.remove(ir["blocks"][-1])
+    return index.drain_changes()
+
+
+@pytest.fixture
+def backend(monkeypatch):
+    monkeypatch.setenv("IR_CODEC", "json")
+    monkeypatch.setenv("IR_WRITE_BEHIND_DELAY", "0")
+    monkeypatch.setenv("IR_JOURNAL_MAX_ENTRIES", "1000")
+    monkeypatch.setenv("IR_JOURNAL_MAX_BYTES", str(1 << 30))
+    get_settings.cache_clear()
+    monkeypatch.setattr(ir_cache, "_cache", None)
+    monkeypatch.setattr(search_index, "_registry", None)
+    memory = MemoryBackend()
+    storage.set_backend(memory)
+    yield memory
+    storage.set_backend(None)
+    get_settings.cache_clear()
+
+
+@pytest.fixture(params=["cached", "uncached"])
+def cache_mode(request, monkeypatch):
+    monkeypatch.setenv("IR_CACHE_MAX_BYTES", str(64 << 20) if request.param == "cached" else "0")
+    get_settings.cache_clear()
+    return request.param
+
+
+def test_edits_are_journaled_and_replayed(backend, cache_mode):
+    ir_helpers.save_ir(DOC, make_ir())
+    manifest = backend.objects[ir_helpers.get_manifest_path(DOC)]
+
+    ir = ir_helpers.load_ir(DOC)
+    for step in range(3):
+        ir_helpers.save_ir(DOC, ir, edit(ir, step))
+
+    assert journal_seqs() == [2, 3, 4]
+    assert backend.objects[ir_helpers.get_manifest_path(DOC)] == manifest
+
+    reloaded, _, state = ir_helpers._fetch_ir(DOC)
+    assert snapshot(reloaded) == snapshot(ir)
+    assert reloaded["ir_version"] == ir["ir_version"]
+    assert state.seq == 4 and state.snapshot_seq == 1
+
+
+def test_replay_of_a_respace(backend, cache_mode):
+    ir_helpers.save_ir(DOC, make_ir(pages=1, per_page=2))
+    ir = ir_helpers.load_ir(DOC)
+    index = BlockIndex(ir)
+    first = ir["blocks"][0]
+    # Filling the gap after the first block forces a respace.
+    for i in range(12):
+        index.insert({"block_id": f"blk_fill_{i}", "type": "paragraph", "content": "", "page_number": 1,
+                      "order": index.order_after(first)})
+    changes = index.drain_changes()
+    assert {"op": "respace"} in changes
+    ir_helpers.save_ir(DOC, ir, changes)
+
+    assert snapshot(ir_helpers._fetch_ir(DOC)[0]) == snapshot(ir)
+
+
+def test_blocks_sharing_an_order_keep_their_order_across_a_reload(backend, cache_mode):
+    # LayoutIR numbers text, tables and images separately; its list order breaks the ties.
+    ir = {"document_id": DOC, "stats": {"block_count": 4}, "blocks": [
+        {"block_id": "text_0", "type": "paragraph", "content": "Intro", "page_number": 1, "order": 0},
+        {"block_id": "table_0", "type": "table", "content": "Table", "page_number": 3, "order": 0},
+        {"block_id": "image_0", "type": "image", "content": "Image", "page_number": 1, "order": 0},
+        {"block_id": "text_1", "type": "paragraph", "content": "Body", "page_number": 2, "order": 1},
+    ]}
+    expected = ["text_0", "table_0", "image_0", "text_1"]
+
+    ir_helpers.save_ir(DOC, ir)
+
+    assert [b["block_id"] for b in ir["blocks"]] == expected
+    assert [b["order"] for b in ir["blocks"]] == [i * ORDER_GAP for i in range(4)]
+    reloaded = ir_helpers._fetch_ir(DOC)[0]
+    assert [b["block_id"] for b in reloaded["blocks"]] == expected
+    assert snapshot(reloaded) == snapshot(ir)
+
+
+def test_compaction_yields_the_same_ir(backend, cache_mode, monkeypatch):
+    monkeypatch.setenv("IR_JOURNAL_MAX_ENTRIES", "3")
+    get_settings.cache_clear()
+
+    ir_helpers.save_ir(DOC, make_ir())
+    ir = ir_helpers.load_ir(DOC)
+    for step in range(2):
+        ir_helpers.save_ir(DOC, ir, edit(ir, step))
+    before_compaction = snapshot(ir_helpers._fetch_ir(DOC)[0])
+    assert before_compaction == snapshot(ir)
+    assert journal_seqs() == [2, 3]
+
+    ir_helpers.save_ir(DOC, ir, edit(ir, 2))
+
+    # The third entry folded the journal into a new snapshot.
+    assert journal_seqs() == []
+    compacted, _, state = ir_helpers._fetch_ir(DOC)
+    assert state.snapshot_seq == state.seq == 4
+    assert snapshot(compacted) == snapshot(ir)
+
+    # Superseded shards were deleted; the manifest points only at live objects.
+    manifest = ir_helpers._stored_manifest(DOC)
+    shard_paths = {f"{DOC}/{shard['path']}" for shard in manifest["shards"].values()}
+    stored_shards = {path for path in backend.objects if path.startswith(f"{DOC}/ir/pages/")}
+    assert stored_shards == shard_paths
+
+
+def test_uncached_save_without_changes_writes_a_snapshot(backend, monkeypatch):
+    monkeypatch.setenv("IR_CACHE_MAX_BYTES", "0")
+    get_settings.cache_clear()
+    ir_helpers.save_ir(DOC, make_ir())
+    ir = ir_helpers.load_ir(DOC)
+    ir_helpers.save_ir(DOC, ir, edit(ir, 0))
+    assert journal_seqs() == [2]
+
+    ir_helpers.save_ir(DOC, ir)
+
+    assert journal_seqs() == []
+    assert snapshot(ir_helpers._fetch_ir(DOC)[0]) == snapshot(ir)
+
+
+@pytest.mark.parametrize("codec, content_type", [("json", "application/json"), ("gzip", "application/octet-stream")])
+def test_objects_are_uploaded_with_the_codec_content_type(backend, monkeypatch, codec, content_type):
+    monkeypatch.setenv("IR_CODEC", codec)
+    monkeypatch.setenv("IR_CACHE_MAX_BYTES", "0")
+    get_settings.cache_clear()
+    ir_helpers.save_ir(DOC, make_ir())
+    ir = ir_helpers.load_ir(DOC)
+    ir_helpers.save_ir(DOC, ir, edit(ir, 0))
+    ir_helpers.write_ir_json(DOC)
+
+    for path in backend.objects:
+        if path.startswith((f"{DOC}/ir/", f"{DOC}/journal/")):
+            assert backend.content_types[path] == content_type, path
+    assert backend.content_types[ir_helpers.get_ir_storage_path(DOC)] == "application/json"
@@ -0,0 +1,82 @@
+"""
+Pagination tests for `ir_ops.read_slice`.
+
+Run:
+  uv run pytest mcp_server/tests/test_read_slice.py
+"""
+
+import pytest
+
+from mcp_server.utils.ir_ops import ORDER_GAP, BlockIndex, read_slice
+
+
+def make_index(count: int = 10, ir_version: int = 3) -> BlockIndex:
+    blocks = [
+        {"block_id": f"blk_{i}", "type": "heading" if i % 3 == 0 else "paragraph",
+         "content": f"block {i}", "page_number": i // 4 + 1, "order": i * ORDER_GAP}
+        for i in range(count)
+    ]
+    return BlockIndex({"ir_version": ir_version, "blocks": blocks})
+
+
+def read_all(index: BlockIndex, **kwargs) -> list[str]:
+    ids, cursor = [], None
+    while True:
+        result = read_slice(index, cursor=cursor, **kwargs)
+        ids += [block["block_id"] for block in result["blocks"]]
+        cursor = result["next_cursor"]
+        if cursor is None:
+            return ids
+
+
+def test_pages_through_every_block_once():
+    index = make_index()
+    assert read_all(index, max_blocks=3) == [f"blk_{i}" for i in range(10)]
+    assert read_all(index, max_blocks=2, block_types=["heading"]) == ["blk_0", "blk_3", "blk_6", "blk_9"]
+
+
+def test_blocks_sharing_an_order_are_not_skipped():
+    # LayoutIR numbers text, tables and images separately, each from 0.
+    blocks = [
+        {"block_id": "text_0", "type": "paragraph", "page_number": 1, "order": 0},
+        {"block_id": "text_1", "type": "paragraph", "page_number": 1, "order": 1},
+        {"block_id": "table_0", "type": "table", "page_number": 1, "order": 0},
+        {"block_id": "image_0", "type": "image", "page_number": 2, "order": 0},
+        {"block_id": "image_1", "type": "image", "page_number": 2, "order": 1},
+    ]
+    index = BlockIndex({"ir_version": 1, "blocks": blocks})
+    expected = [block["block_id"] for block in index.blocks]
+
+    for max_blocks in (1, 2, 3):
+        assert read_all(index, max_blocks=max_blocks) == expected
+    assert read_all(index, max_bytes=1) == expected
+    assert read_all(index, max_blocks=1, block_types=["table", "image"]) == ["table_0", "image_0", "image_1"]
+
+
+def test_cursor_outside_the_loaded_pages_resumes_by_order():
+    cursor = read_slice(make_index(), max_blocks=5)["next_cursor"]
+    later_pages = BlockIndex({"ir_version": 3, "blocks": [b for b in make_index().blocks if b["page_number"] >= 2]})
+    assert [b["block_id"] for b in read_slice(later_pages, cursor=cursor)["blocks"]] == [f"blk_{i}" for i in range(5, 10)]
+
+
+def test_cursor_carries_the_ir_version():
+    result = read_slice(make_index(ir_version=7), max_blocks=2)
+    assert result["next_cursor"] == f"7:{ORDER_GAP}:blk_1"
+
+
+def test_cursor_from_another_version_is_rejected():
+    cursor = read_slice(make_index(ir_version=3), max_blocks=2)["next_cursor"]
+    with pytest.raises(ValueError, match="version 3"):
+        read_slice(make_index(ir_version=4), cursor=cursor, max_blocks=2)
+
+
+@pytest.mark.parametrize("cursor", ["abc", "1024", "3:1024", "3:x:blk_1"])
+def test_malformed_cursor_is_rejected(cursor):
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        read_slice(make_index(), cursor=cursor)
+
+
+@pytest.mark.parametrize("max_blocks", [0, -1])
+def test_max_blocks_below_one_is_rejected(max_blocks):
+    with pytest.raises(ValueError, match="max_blocks"):
+        read_slice(make_index(), max_blocks=max_blocks)
@@ -0,0 +1,176 @@
+"""
+Page plan and splice tests for `reconvert`.
+
+Run:
+  uv run pytest mcp_server/tests/test_reconvert.py
+"""
+
+from mcp_server.utils.ir_ops import ORDER_GAP
+from mcp_server.utils.reconvert import PagePlan, plan_pages, splice
+
+
+def bbox(x0: float, y0: float, x1: float, y1: float) -> dict:
+    return {"x0": x0, "y0": y0, "x1": x1, "y1": y1}
+
+
+def block(block_id: str, page: int, order: int, content: str = "", **fields) -> dict:
+    return {"block_id": block_id, "type": "paragraph", "content": content or block_id,
+            "page_number": page, "order": order, **fields}
+
+
+# ── plan_pages ──────────────────────────────────────────────────────
+
+def test_plan_identical_files():
+    plan = plan_pages(["a", "b", "c"], ["a", "b", "c"])
+    assert plan == PagePlan(unchanged={1: 1, 2: 2, 3: 3})
+
+
+def test_plan_inserted_page_does_not_shift_the_rest():
+    plan = plan_pages(["a", "b", "c"], ["a", "x", "b", "c"])
+    assert plan.unchanged == {1: 1, 2: 3, 3: 4}
+    assert plan.convert == [2]
+    assert plan.replaced == {} and plan.removed == []
+
+
+def test_plan_removed_and_replaced_pages():
+    plan = plan_pages(["a", "b", "c", "d"], ["a", "B", "d"])
+    assert plan.unchanged == {1: 1, 4: 3}
+    assert plan.convert == [2]
+    # Both old pages of the shrunken run hand their edits to the one new page.
+    assert plan.replaced == {2: 2, 3: 2}
+
+
+def test_plan_unknown_fingerprints_never_match():
+    plan = plan_pages([None, "b"], ["a", "b"])
+    assert plan.unchanged == {2: 2}
+    assert plan.convert == [1]
+    assert plan.replaced == {1: 1}
+
+
+def test_plan_pure_deletion():
+    plan = plan_pages(["a", "b", "c"], ["a", "c"])
+    assert plan.unchanged == {1: 1, 3: 2}
+    assert plan.removed == [2]
+    assert plan.convert == []
+
+
+# ── splice ──────────────────────────────────────────────────────────
+
+def test_splice_keeps_unchanged_pages_and_respaces_orders():
+    ir = {"blocks": [
+        block("p1a", 1, 5),
+        block("p1b", 1, 7),
+        block("p2a", 2, 100),
+        block("p3a", 3, 2000, manual="edited"),
+    ]}
+    plan = plan_pages(["a", "b", "c"], ["a", "x", "b", "c"])
+    fresh = {2: [block("tmp_1", 0, 0, "inserted page")]}
+
+    result = splice(ir, plan, fresh, page_count=4)
+
+    blocks = ir["blocks"]
+    assert [b["order"] for b in blocks] == [i * ORDER_GAP for i in range(len(blocks))]
+    assert [(b["block_id"], b["page_number"]) for b in blocks if b["block_id"] != blocks[2]["block_id"]] == [
+        ("p1a", 1), ("p1b", 1), ("p2a", 3), ("p3a", 4),
+    ]
+    assert blocks[2]["page_number"] == 2 and blocks[2]["content"] == "inserted page"
+    # Fresh blocks get IDs derived from their final position, not the worker's.
+    assert blocks[2]["block_id"] != "tmp_1"
+    assert (result.kept_blocks, result.fresh_blocks, result.kept_edits, result.dropped_edits) == (4, 1, 0, 0)
+    assert ir["stats"]["page_count"] == ir["metadata"]["page_count"] == 4
+    assert ir["stats"]["block_count"] == 5
+
+
+def test_splice_carries_an_edited_block_over_the_fresh_block_it_overlaps():
+    ir = {"blocks": [
+        block("old_title", 1, 0, "Title"),
+        block("old_body", 1, ORDER_GAP, "My edit", bbox=bbox(0, 100, 100, 200), manual="edited"),
+    ]}
+    plan = plan_pages(["a"], ["A"])
+    fresh = {1: [
+        block("f0", 1, 0, "Title", bbox=bbox(0, 0, 100, 50)),
+        block("f1", 1, 1, "Body", bbox=bbox(0, 105, 100, 205)),
+        block("f2", 1, 2, "Footer", bbox=bbox(0, 300, 100, 320)),
+    ]}
+
+    result = splice(ir, plan, fresh, page_count=1)
+
+    contents = [b["content"] for b in ir["blocks"]]
+    assert contents == ["Title", "My edit", "Footer"]
+    assert ir["blocks"][1]["block_id"] == "old_body"
+    assert result.kept_edits == 1 and result.fresh_blocks == 3
+
+
+def test_splice_appends_an_edited_block_below_the_iou_threshold():
+    ir = {"blocks": [block("edited", 1, 0, "Moved", bbox=bbox(0, 0, 100, 100), manual="edited")]}
+    plan = plan_pages(["a"], ["A"])
+    # Overlap 25/175 of the union: well under MATCH_IOU.
+    fresh = {1: [block("f0", 1, 0, "Fresh", bbox=bbox(50, 50, 150, 150))]}
+
+    splice(ir, plan, fresh, page_count=1)
+
+    assert [b["content"] for b in ir["blocks"]] == ["Fresh", "Moved"]
+
+
+def test_splice_places_added_blocks_after_their_predecessor():
+    ir = {"blocks": [
+        block("old0", 1, 0, "Intro"),
+        block("edited", 1, ORDER_GAP, "Edited", bbox=bbox(0, 100, 100, 200), manual="edited"),
+        block("added", 1, ORDER_GAP + 1, "Added note", manual="added"),
+        block("old2", 1, 2 * ORDER_GAP, "Outro"),
+    ]}
+    plan = plan_pages(["a"], ["A"])
+    fresh = {1: [
+        block("f0", 1, 0, "Intro", bbox=bbox(0, 0, 100, 50)),
+        block("f1", 1, 1, "Body", bbox=bbox(0, 100, 100, 200)),
+        block("f2", 1, 2, "Outro", bbox=bbox(0, 300, 100, 350)),
+    ]}
+
+    result = splice(ir, plan, fresh, page_count=1)
+
+    assert [b["content"] for b in ir["blocks"]] == ["Intro", "Edited", "Added note", "Outro"]
+    assert result.kept_edits == 2
+
+
+def test_splice_keeps_an_orphaned_added_block_at_its_relative_position():
+    ir = {"blocks": [block(f"old{i}", 1, i * ORDER_GAP, f"old {i}") for i in range(3)]}
+    ir["blocks"].append(block("added", 1, 3 * ORDER_GAP, "Note", manual="added"))
+    # Half way down the page: the added block's predecessor is not carried over.
+    ir["blocks"].insert(2, ir["blocks"].pop())
+    for i, b in enumerate(ir["blocks"]):
+        b["order"] = i * ORDER_GAP
+    plan = plan_pages(["a"], ["A"])
+    fresh = {1: [block(f"f{i}", 1, i, f"fresh {i}") for i in range(4)]}
+
+    splice(ir, plan, fresh, page_count=1)
+
+    assert [b["content"] for b in ir["blocks"]] == ["fresh 0", "fresh 1", "Note", "fresh 2", "fresh 3"]
+
+
+def test_splice_drops_edits_on_removed_pages():
+    ir = {"blocks": [
+        block("p1", 1, 0),
+        block("p2", 2, ORDER_GAP, manual="edited"),
+        block("p3", 3, 2 * ORDER_GAP),
+    ]}
+    plan = plan_pages(["a", "b", "c"], ["a", "c"])
+
+    result = splice(ir, plan, {}, page_count=2)
+
+    assert [(b["block_id"], b["page_number"]) for b in ir["blocks"]] == [("p1", 1), ("p3", 2)]
+    assert result.dropped_edits == 1
+
+
+def test_splice_links_headings_across_pages():
+    ir = {"blocks": [
+        block("h1", 1, 0, "Chapter", type="heading", level=1),
+        block("body", 2, ORDER_GAP, "Text"),
+    ]}
+    plan = plan_pages(["a", "b"], ["a", "b"])
+
+    splice(ir, plan, {}, page_count=2)
+
+    assert ir["blocks"][1]["parent_id"] == "h1"
+    assert ir["relationships"] == [
+        {"source_block_id": "h1", "target_block_id": "body", "relation_type": "parent_child", "metadata": {}},
+    ]
@@ -1,5 +1,7 @@
 from . import storage
 from . import ir_helpers
-from .download import download_to_temp
+from . import ir_ops
+from . import metrics
+from .download import download_to_temp, fetch_to_temp
 
-__all__ = ["storage", "ir_helpers", "download_to_temp"]
+__all__ = ["storage", "ir_helpers", "ir_ops", "metrics", "download_to_temp", "fetch_to_temp"]
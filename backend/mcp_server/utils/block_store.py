@@ -0,0 +1,261 @@
+"""
+Columnar block store for LayoutIR MCP Server.
+
+Next to its IR, every document keeps `{document_id}/blocks.parquet`: one
+row per block with its type, page, bounding box, label, level, order and
+content. The file is rewritten with every IR snapshot and records the IR
+version it holds; readers apply the journal entries written since on top
+(see `ir_helpers.journal_since`), and read documents cached in this process
+straight from their IR.
+
+`scan` reads these files for many documents at once, fetching them in
+parallel and letting Parquet apply the column projection and the filters
+while decoding, so no IR JSON is parsed and no per-block dictionaries are
+built. Requires pyarrow (installed with LayoutIR); without it the store is
+not written and scans raise `BlockStoreUnavailable`.
+"""
+
+import io
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from mcp_server.utils import metrics, storage
+from mcp_server.utils.config import get_settings
+from mcp_server.utils.ir_ops import ORDER_GAP
+
+
+logger = logging.getLogger(__name__)
+
+
+BLOCKS_FILE = "blocks.parquet"
+
+COLUMNS = (
+    "document_id", "block_id", "order", "page_number", "type", "label", "level",
+    "parent_id", "x0", "y0", "x1", "y1", "content", "manual",
+)
+
+# Block field each column is derived from.
+SOURCES = {
+    "block_id": "block_id", "order": "order", "page_number": "page_number", "type": "type",
+    "label": "metadata", "level": "level", "parent_id": "parent_id",
+    "x0": "bbox", "y0": "bbox", "x1": "bbox", "y1": "bbox", "content": "content", "manual": "manual",
+}
+
+
+class BlockStoreUnavailable(RuntimeError):
+    """Raised when pyarrow is not installed."""
+
+
+def get_blocks_path(document_id: str) -> str:
+    return f"{document_id}/{BLOCKS_FILE}"
+
+
+def _arrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        return None
+    return pyarrow
+
+
+def _schema(pa):
+    return pa.schema([
+        ("document_id", pa.string()),
+        ("block_id", pa.string()),
+        ("order", pa.int64()),
+        ("page_number", pa.int32()),
+        ("type", pa.string()),
+        ("label", pa.string()),
+        ("level", pa.int32()),
+        ("parent_id", pa.string()),
+        ("x0", pa.float64()),
+        ("y0", pa.float64()),
+        ("x1", pa.float64()),
+        ("y1", pa.float64()),
+        ("content", pa.string()),
+        ("manual", pa.string()),
+    ])
+
+
+def _row(document_id: str, block: dict) -> dict:
+    bbox = block.get("bbox") or {}
+    return {
+        "document_id": document_id,
+        "block_id": block.get("block_id"),
+        "order": block.get("order"),
+        "page_number": block.get("page_number"),
+        "type": block.get("type"),
+        "label": (block.get("metadata") or {}).get("label"),
+        "level": block.get("level"),
+        "parent_id": block.get("parent_id"),
+        "x0": bbox.get("x0"),
+        "y0": bbox.get("y0"),
+        "x1": bbox.get("x1"),
+        "y1": bbox.get("y1"),
+        "content": block.get("content"),
+        "manual": block.get("manual"),
+    }
+
+
+def blocks_to_table(document_id: str, ir: dict):
+    """An IR's blocks as an Arrow table tagged with its `ir_version`."""
+    pa = _arrow()
+    columns: dict[str, list] = {name: [] for name in COLUMNS}
+    for block in ir.get("blocks", []):
+        for name, value in _row(document_id, block).items():
+            columns[name].append(value)
+    return pa.Table.from_pydict(columns, schema=_schema(pa)).replace_schema_metadata(
+        {"ir_version": str(ir.get("ir_version", 0))}
+    )
+
+
+def blocks_to_parquet(document_id: str, ir: dict) -> bytes | None:
+    """Encode an IR's blocks as a Parquet file, or None without pyarrow."""
+    pa = _arrow()
+    if pa is None:
+        return None
+    sink = io.BytesIO()
+    # Row groups of a few thousand blocks let page filters skip whole groups.
+    pa.parquet.write_table(blocks_to_table(document_id, ir), sink, compression="zstd", row_group_size=4096)
+    return sink.getvalue()
+
+
+def apply_changes(document_id: str, table, changes: list[dict]):
+    """Apply `ir_ops` change records to a stored block table (see `ir_ops.replay`)."""
+    pa = _arrow()
+    rows = {row["block_id"]: row for row in table.to_pylist()}
+    for change in changes:
+        kind = change["op"]
+        if kind == "add":
+            row = _row(document_id, change["block"])
+            rows.pop(row["block_id"], None)
+            rows[row["block_id"]] = row
+        elif kind == "delete":
+            rows.pop(change["block_id"], None)
+        elif kind == "edit":
+            row = rows.get(change["block_id"])
+            if row is None:
+                continue
+            fields = change["fields"]
+            values = _row(document_id, fields)
+            row.update({name: values[name] for name, source in SOURCES.items() if source in fields})
+        elif kind == "respace":
+            for i, row in enumerate(sorted(rows.values(), key=lambda r: r["order"] or 0)):
+                row["order"] = i * ORDER_GAP
+    ordered = sorted(rows.values(), key=lambda r: r["order"] or 0)
+    return pa.Table.from_pylist(ordered, schema=_schema(pa))
+
+
+def write_blocks(document_id: str, ir: dict) -> None:
+    """Rewrite a document's block store (called by `ir_helpers` with each snapshot).
+
+    Failures are logged, not raised: the IR has already been saved and
+    remains the source of truth.
+    """
+    try:
+        data = blocks_to_parquet(document_id, ir)
+        if data is None:
+            return
+        storage.upload_bytes(get_blocks_path(document_id), data, content_type="application/vnd.apache.parquet")
+        metrics.inc("block_store_writes_total")
+    except Exception:
+        logger.warning("Could not update the block store of %s", document_id, exc_info=True)
+
+
+def _filter(block_types, page_start, page_end):
+    import pyarrow.compute as pc
+
+    expression = None
+
+    def both(left, right):
+        return right if left is None else left & right
+
+    if block_types:
+        expression = both(expression, pc.field("type").isin(list(block_types)))
+    if page_start is not None:
+        expression = both(expression, pc.field("page_number") >= page_start)
+    if page_end is not None:
+        expression = both(expression, pc.field("page_number") <= page_end)
+    return expression
+
+
+def _select(table, projection, expression):
+    if expression is not None:
+        table = table.filter(expression)
+    return table.select(projection) if projection else table
+
+
+def concat(tables: list):
+    """Concatenate scan results."""
+    return _arrow().concat_tables(tables)
+
+
+def scan(
+    document_ids: list[str] | None = None,
+    columns: list[str] | None = None,
+    block_types: list[str] | None = None,
+    page_start: int | None = None,
+    page_end: int | None = None,
+):
+    """Read the matching blocks of many documents into one Arrow table.
+
+    Documents without a block store are skipped. Returns `(table, missing)`
+    where `missing` lists the skipped document IDs.
+    """
+    pa = _arrow()
+    if pa is None:
+        raise BlockStoreUnavailable("The block store needs pyarrow; install it with `pip install pyarrow`.")
+    unknown = [name for name in columns or () if name not in COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown columns {unknown}; available: {list(COLUMNS)}")
+
+    if document_ids is None:
+        document_ids = storage.list_documents()
+    expression = _filter(block_types, page_start, page_end)
+    projection = list(columns) if columns else None
+
+    def read_one(document_id: str):
+        # ir_helpers imports this module.
+        from mcp_server.utils import ir_helpers
+
+        entry = ir_helpers.cache_entry(document_id)
+        if entry is not None:
+            # The cached IR may hold changes not yet in storage.
+            with entry.lock:
+                return document_id, _select(blocks_to_table(document_id, entry.ir), projection, expression)
+        try:
+            data = storage.download_buffer(get_blocks_path(document_id))
+        except Exception:
+            return document_id, None
+        table = pa.parquet.read_table(pa.BufferReader(pa.py_buffer(data)), columns=projection, filters=expression)
+        version = int((table.schema.metadata or {}).get(b"ir_version", 0))
+        missed = ir_helpers.journal_since(document_id, version)
+        if missed is None:
+            # Older than the current snapshot: rebuild it from the IR.
+            with ir_helpers.document_lock(document_id):
+                ir = ir_helpers.load_ir(document_id)
+                write_blocks(document_id, ir)
+                return document_id, _select(blocks_to_table(document_id, ir), projection, expression)
+        changes, _ = missed
+        if changes:
+            table = apply_changes(document_id, pa.parquet.read_table(pa.BufferReader(pa.py_buffer(data))), changes)
+            table = _select(table, projection, expression)
+        return document_id, table
+
+    tables, missing = [], []
+    with ThreadPoolExecutor(max_workers=max(get_settings().block_store_scan_concurrency, 1)) as pool:
+        for document_id, table in pool.map(read_one, document_ids):
+            if table is None:
+                missing.append(document_id)
+            else:
+                tables.append(table.replace_schema_metadata(None))
+
+    metrics.inc("block_store_scans_total")
+    metrics.observe("block_store_scan_documents", len(document_ids))
+    if not tables:
+        schema = _schema(pa)
+        if projection:
+            schema = pa.schema([schema.field(name) for name in projection])
+        return schema.empty_table(), missing
+    return pa.concat_tables(tables), missing
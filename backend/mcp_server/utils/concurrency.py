@@ -0,0 +1,89 @@
+"""
+Tool concurrency for LayoutIR MCP Server.
+
+FastMCP runs synchronous tools directly on the event loop, so one slow
+conversion would stall every other session. Tools are instead written as
+plain functions and wrapped with `offload(kind)`, which turns them into
+async tools that run in worker threads. Each kind of work has its own
+capacity limiter, so heavy conversions cannot use up the threads that
+cheap reads and edits need.
+
+    light    read_ir and block edits (mostly served from the IR cache)
+    io       exports that read and upload whole documents
+    convert  downloads and waits on the conversion worker pool
+"""
+
+import functools
+import threading
+import time
+from typing import Callable
+
+import anyio
+import anyio.to_thread
+
+from mcp_server.utils import metrics, tracing
+from mcp_server.utils.config import get_settings
+
+
+LIGHT = "light"
+IO = "io"
+CONVERT = "convert"
+
+
+_limiters: dict[str, anyio.CapacityLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def _limits() -> dict[str, int]:
+    settings = get_settings()
+    return {
+        LIGHT: settings.tool_light_concurrency,
+        IO: settings.tool_io_concurrency,
+        CONVERT: settings.tool_convert_concurrency,
+    }
+
+
+def limiter(kind: str) -> anyio.CapacityLimiter:
+    """The capacity limiter for a kind of work. Must be called from the event loop."""
+    with _limiters_lock:
+        if kind not in _limiters:
+            _limiters[kind] = anyio.CapacityLimiter(_limits()[kind])
+        return _limiters[kind]
+
+
+async def run_sync(kind: str, fn: Callable, *args, **kwargs):
+    """Run a blocking function in a worker thread under the `kind` limiter.
+
+    The call runs inside a `tracing.trace` named after the function.
+    """
+    queued = time.perf_counter()
+
+    def call():
+        wait = time.perf_counter() - queued
+        metrics.observe("tool_queue_seconds", wait, kind=kind)
+        with tracing.trace(fn.__name__, queue_seconds=round(wait, 6)):
+            return fn(*args, **kwargs)
+
+    return await anyio.to_thread.run_sync(call, limiter=limiter(kind))
+
+
+def offload(kind: str):
+    """Decorator turning a blocking tool function into an async one run via `run_sync`.
+
+    The wrapper keeps the original signature and docstring, which FastMCP
+    uses for the tool schema.
+    """
+
+    def decorator(fn: Callable):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            try:
+                with metrics.timed("tool_seconds", tool=fn.__name__):
+                    return await run_sync(kind, fn, *args, **kwargs)
+            except Exception:
+                metrics.inc("tool_errors_total", tool=fn.__name__)
+                raise
+
+        return wrapper
+
+    return decorator
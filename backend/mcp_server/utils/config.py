@@ -0,0 +1,185 @@
+"""
+Runtime configuration for LayoutIR MCP Server.
+
+All tunables are read from environment variables (a `.env` file is loaded
+first if present) so deployments can size the server without code changes.
+"""
+
+import os
+from dataclasses import dataclass
+from functools import lru_cache
+
+from dotenv import load_dotenv
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.environ.get(name)
+    return int(value) if value not in (None, "") else default
+
+
+def _env_list(name: str, default: tuple[str, ...]) -> tuple[str, ...]:
+    value = os.environ.get(name)
+    if value in (None, ""):
+        return default
+    return tuple(item.strip().lower() for item in value.split(",") if item.strip())
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.environ.get(name)
+    if value in (None, ""):
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.environ.get(name)
+    return float(value) if value not in (None, "") else default
+
+
+@dataclass(frozen=True)
+class Settings:
+    """Server tunables. See `.env.example` for the matching variable names."""
+
+    # HTTP listener of `run_server.py`
+    server_host: str = "0.0.0.0"
+    server_port: int = 8000
+
+    # Conversion worker pool
+    conversion_workers: int = 1
+    conversion_max_queue: int = 8
+    conversion_job_timeout: float = 900.0
+
+    # Conversion memory: per-job RSS limit, and worker recycling after N jobs
+    # or above an RSS threshold between jobs (0 disables each)
+    conversion_job_max_rss_bytes: int = 0
+    conversion_worker_max_jobs: int = 100
+    conversion_worker_max_rss_bytes: int = 4 * 1024 * 1024 * 1024
+
+    # Page-parallel conversion of large PDFs (0 pages disables splitting;
+    # 0 parallel ranges means every worker)
+    split_min_pages: int = 64
+    split_range_pages: int = 16
+    split_max_parallel: int = 0
+
+    # Content-addressed conversion cache
+    conversion_cache_max_entries: int = 1024
+    conversion_cache_max_age: float = 7 * 24 * 3600.0
+    conversion_cache_sweep_interval: float = 3600.0
+
+    # Document downloads
+    download_max_bytes: int = 512 * 1024 * 1024
+    download_allowed_types: tuple[str, ...] = (
+        "application/pdf",
+        "application/x-pdf",
+        "application/octet-stream",
+        "binary/octet-stream",
+    )
+    download_resume_attempts: int = 3
+    download_max_connections: int = 20
+
+    # Storage backend (supabase, local or memory; see `storage_backends`)
+    storage_backend: str = "supabase"
+    local_storage_root: str = ".layoutir/storage"
+    local_storage_public_url: str = "http://localhost:8000/files"
+    storage_mmap_min_bytes: int = 1024 * 1024
+
+    # Shared image assets: WebP derivatives, thumbnails of at most this many
+    # pixels per side (0 disables them) and images processed in parallel
+    image_derivatives: bool = True
+    image_webp_quality: int = 80
+    image_thumbnail_size: int = 256
+    image_concurrency: int = 4
+
+    # Storage uploads
+    upload_concurrency: int = 8
+    upload_max_attempts: int = 4
+    upload_backoff_base: float = 0.5
+
+    # In-process IR cache (0 bytes disables it; 0s delay writes through)
+    ir_cache_max_bytes: int = 512 * 1024 * 1024
+    ir_write_behind_delay: float = 2.0
+
+    # Encoding of stored IR shards, manifests and journal entries (json, gzip, zstd)
+    ir_codec: str = "zstd"
+
+    # Edit journal compaction thresholds
+    ir_journal_max_entries: int = 32
+    ir_journal_max_bytes: int = 1024 * 1024
+
+    # Worker threads per class of tool (see `concurrency`)
+    tool_light_concurrency: int = 32
+    tool_io_concurrency: int = 8
+    tool_convert_concurrency: int = 16
+
+    # Background conversion jobs
+    jobs_dir: str = ".layoutir/jobs"
+    jobs_max_queued: int = 64
+    jobs_runners: int = 1
+    jobs_retention: float = 24 * 3600.0
+
+    # Rendered Markdown fragments kept for exports (0 disables the cache)
+    markdown_fragment_cache_entries: int = 100_000
+
+    # Parallel downloads per cross-document block store scan or search
+    block_store_scan_concurrency: int = 16
+
+    # Document search indexes kept in memory
+    search_index_cache_documents: int = 256
+
+    # Structured per-request timing logs (see `tracing`)
+    timing_log: bool = False
+    timing_log_min_seconds: float = 0.0
+
+
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """Return the process-wide settings, read once from the environment."""
+    load_dotenv()
+    return Settings(
+        server_host=os.environ.get("SERVER_HOST") or Settings.server_host,
+        server_port=_env_int("SERVER_PORT", Settings.server_port),
+        conversion_workers=_env_int("CONVERSION_WORKERS", Settings.conversion_workers),
+        conversion_max_queue=_env_int("CONVERSION_MAX_QUEUE", Settings.conversion_max_queue),
+        conversion_job_timeout=_env_float("CONVERSION_JOB_TIMEOUT", Settings.conversion_job_timeout),
+        conversion_job_max_rss_bytes=_env_int("CONVERSION_JOB_MAX_RSS_BYTES", Settings.conversion_job_max_rss_bytes),
+        conversion_worker_max_jobs=_env_int("CONVERSION_WORKER_MAX_JOBS", Settings.conversion_worker_max_jobs),
+        conversion_worker_max_rss_bytes=_env_int("CONVERSION_WORKER_MAX_RSS_BYTES", Settings.conversion_worker_max_rss_bytes),
+        split_min_pages=_env_int("SPLIT_MIN_PAGES", Settings.split_min_pages),
+        split_range_pages=_env_int("SPLIT_RANGE_PAGES", Settings.split_range_pages),
+        split_max_parallel=_env_int("SPLIT_MAX_PARALLEL", Settings.split_max_parallel),
+        conversion_cache_max_entries=_env_int("CONVERSION_CACHE_MAX_ENTRIES", Settings.conversion_cache_max_entries),
+        conversion_cache_max_age=_env_float("CONVERSION_CACHE_MAX_AGE", Settings.conversion_cache_max_age),
+        conversion_cache_sweep_interval=_env_float("CONVERSION_CACHE_SWEEP_INTERVAL", Settings.conversion_cache_sweep_interval),
+        download_max_bytes=_env_int("DOWNLOAD_MAX_BYTES", Settings.download_max_bytes),
+        download_allowed_types=_env_list("DOWNLOAD_ALLOWED_TYPES", Settings.download_allowed_types),
+        download_resume_attempts=_env_int("DOWNLOAD_RESUME_ATTEMPTS", Settings.download_resume_attempts),
+        download_max_connections=_env_int("DOWNLOAD_MAX_CONNECTIONS", Settings.download_max_connections),
+        storage_backend=(os.environ.get("STORAGE_BACKEND") or Settings.storage_backend).lower(),
+        local_storage_root=os.environ.get("LOCAL_STORAGE_ROOT") or Settings.local_storage_root,
+        local_storage_public_url=os.environ.get("LOCAL_STORAGE_PUBLIC_URL", Settings.local_storage_public_url),
+        storage_mmap_min_bytes=_env_int("STORAGE_MMAP_MIN_BYTES", Settings.storage_mmap_min_bytes),
+        image_derivatives=_env_bool("IMAGE_DERIVATIVES", Settings.image_derivatives),
+        image_webp_quality=_env_int("IMAGE_WEBP_QUALITY", Settings.image_webp_quality),
+        image_thumbnail_size=_env_int("IMAGE_THUMBNAIL_SIZE", Settings.image_thumbnail_size),
+        image_concurrency=_env_int("IMAGE_CONCURRENCY", Settings.image_concurrency),
+        upload_concurrency=_env_int("UPLOAD_CONCURRENCY", Settings.upload_concurrency),
+        upload_max_attempts=_env_int("UPLOAD_MAX_ATTEMPTS", Settings.upload_max_attempts),
+        upload_backoff_base=_env_float("UPLOAD_BACKOFF_BASE", Settings.upload_backoff_base),
+        ir_cache_max_bytes=_env_int("IR_CACHE_MAX_BYTES", Settings.ir_cache_max_bytes),
+        ir_write_behind_delay=_env_float("IR_WRITE_BEHIND_DELAY", Settings.ir_write_behind_delay),
+        ir_codec=os.environ.get("IR_CODEC") or Settings.ir_codec,
+        ir_journal_max_entries=_env_int("IR_JOURNAL_MAX_ENTRIES", Settings.ir_journal_max_entries),
+        ir_journal_max_bytes=_env_int("IR_JOURNAL_MAX_BYTES", Settings.ir_journal_max_bytes),
+        tool_light_concurrency=_env_int("TOOL_LIGHT_CONCURRENCY", Settings.tool_light_concurrency),
+        tool_io_concurrency=_env_int("TOOL_IO_CONCURRENCY", Settings.tool_io_concurrency),
+        tool_convert_concurrency=_env_int("TOOL_CONVERT_CONCURRENCY", Settings.tool_convert_concurrency),
+        jobs_dir=os.environ.get("JOBS_DIR") or Settings.jobs_dir,
+        jobs_max_queued=_env_int("JOBS_MAX_QUEUED", Settings.jobs_max_queued),
+        jobs_runners=_env_int("JOBS_RUNNERS", Settings.jobs_runners),
+        jobs_retention=_env_float("JOBS_RETENTION", Settings.jobs_retention),
+        markdown_fragment_cache_entries=_env_int("MARKDOWN_FRAGMENT_CACHE_ENTRIES", Settings.markdown_fragment_cache_entries),
+        block_store_scan_concurrency=_env_int("BLOCK_STORE_SCAN_CONCURRENCY", Settings.block_store_scan_concurrency),
+        search_index_cache_documents=_env_int("SEARCH_INDEX_CACHE_DOCUMENTS", Settings.search_index_cache_documents),
+        timing_log=_env_bool("TIMING_LOG", Settings.timing_log),
+        timing_log_min_seconds=_env_float("TIMING_LOG_MIN_SECONDS", Settings.timing_log_min_seconds),
+    )
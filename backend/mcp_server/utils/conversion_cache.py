@@ -0,0 +1,241 @@
+"""
+Content-addressed conversion cache for LayoutIR MCP Server.
+
+A conversion is keyed by the SHA-256 of the downloaded bytes together with
+the pipeline settings and the layoutir version, so the same PDF served from
+different URLs maps to the same entry. Entries are small JSON markers stored
+under `_cache/conversions/` that point at an already-converted document.
+
+Identical conversions that arrive at the same time share one in-flight job
+through `SingleFlight`.
+
+A hit is only served while the document's IR still exists. Markers are
+shared by every server process, so the age and size limits are also applied
+to the stored markers by a periodic `sweep`, not only to the ones this
+process has seen.
+"""
+
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from importlib import metadata
+from typing import Callable
+
+from mcp_server.utils import ir_helpers, metrics, storage
+from mcp_server.utils.config import get_settings
+from mcp_server.utils.workers import PIPELINE_SETTINGS
+
+
+logger = logging.getLogger(__name__)
+
+
+CACHE_PREFIX = "_cache/conversions"
+
+
+def _layoutir_version() -> str:
+    try:
+        return metadata.version("layoutir")
+    except metadata.PackageNotFoundError:
+        return "unknown"
+
+
+def cache_key(content_hash: str) -> str:
+    """Derive the cache key for a file hash under the current pipeline settings."""
+    settings = dict(PIPELINE_SETTINGS, layoutir_version=_layoutir_version())
+    raw = f"{content_hash}:{json.dumps(settings, sort_keys=True)}"
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def _marker_path(key: str) -> str:
+    return f"{CACHE_PREFIX}/{key}.json"
+
+
+class ConversionCache:
+    """LRU of conversion results, backed by markers in storage.
+
+    Entries older than `max_age` seconds (0 disables the age limit), or
+    whose document no longer has an IR, are treated as misses and removed.
+    When more than `max_entries` are held, the least recently used entry is
+    evicted along with its stored marker; `sweep` applies both limits to
+    every stored marker.
+    """
+
+    def __init__(self, max_entries: int, max_age: float, sweep_interval: float = 0.0):
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.sweep_interval = sweep_interval
+        self._entries: OrderedDict[str, dict] = OrderedDict()
+        self._lock = threading.Lock()
+        self._sweeper: threading.Thread | None = None
+
+    def _expired(self, entry: dict) -> bool:
+        return bool(self.max_age) and time.time() - entry.get("created_at", 0) > self.max_age
+
+    def get(self, key: str) -> dict | None:
+        """Return the cached conversion result for `key`, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+
+        if entry is None:
+            try:
+                entry = json.loads(storage.download_bytes(_marker_path(key)))
+            except Exception:
+                entry = None
+
+        if entry is not None and (self._expired(entry) or not self._ir_exists(entry)):
+            self._evict(key)
+            entry = None
+
+        if entry is None:
+            metrics.inc("conversion_cache_total", result="miss")
+            return None
+
+        self._remember(key, entry)
+        metrics.inc("conversion_cache_total", result="hit")
+        return entry
+
+    def put(self, key: str, result: dict) -> None:
+        """Record a finished conversion under `key`."""
+        entry = dict(result, created_at=time.time())
+        storage.upload_text(_marker_path(key), json.dumps(entry), content_type="application/json")
+        self._remember(key, entry)
+
+    def _ir_exists(self, entry: dict) -> bool:
+        try:
+            return ir_helpers.ir_exists(entry["document_id"])
+        except Exception:
+            # Storage could not be listed; keep the entry rather than reconvert.
+            return True
+
+    def invalidate(self, key: str) -> None:
+        """Forget the conversion recorded under `key`."""
+        self._evict(key)
+
+    def _remember(self, key: str, entry: dict) -> None:
+        evicted = []
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                old_key, _ = self._entries.popitem(last=False)
+                evicted.append(old_key)
+        for old_key in evicted:
+            self._evict(old_key)
+
+    def _evict(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+        try:
+            storage.delete_paths([_marker_path(key)])
+        except Exception:
+            pass
+        metrics.inc("conversion_cache_evictions_total")
+
+    # ── Stored markers ──
+
+    def _load_marker(self, key: str) -> dict | None:
+        try:
+            return json.loads(storage.download_bytes(_marker_path(key)))
+        except Exception:
+            return None
+
+    def sweep(self) -> int:
+        """Remove expired stored markers and the oldest beyond `max_entries`.
+
+        Covers markers written by any process. Entries this process has used
+        recently are kept first, then the newest. Returns the number removed.
+        """
+        try:
+            names = storage.list_names(CACHE_PREFIX)
+        except Exception:
+            return 0
+        keys = [name[:-len(".json")] for name in names if name.endswith(".json")]
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            markers = {key: marker for key, marker in zip(keys, pool.map(self._load_marker, keys)) if marker is not None}
+
+        expired = [key for key, marker in markers.items() if self._expired(marker)]
+        with self._lock:
+            recent = {key: position for position, key in enumerate(reversed(self._entries))}
+        live = sorted(
+            (key for key in markers if key not in expired),
+            key=lambda key: (recent.get(key, len(recent)), -markers[key].get("created_at", 0)),
+        )
+        removed = expired + live[max(self.max_entries, 0):]
+        for key in removed:
+            self._evict(key)
+        metrics.set_gauge("conversion_cache_entries", len(markers) - len(removed))
+        return len(removed)
+
+    def start_sweeper(self) -> None:
+        """Sweep now and then every `sweep_interval` seconds in a background thread."""
+        if self.sweep_interval <= 0 or self._sweeper is not None:
+            return
+        self._sweeper = threading.Thread(target=self._sweep_loop, name="conversion-cache-sweeper", daemon=True)
+        self._sweeper.start()
+
+    def _sweep_loop(self) -> None:
+        while True:
+            try:
+                removed = self.sweep()
+                if removed:
+                    logger.info("Removed %d stale conversion cache markers", removed)
+            except Exception:
+                logger.exception("Conversion cache sweep failed")
+            time.sleep(self.sweep_interval)
+
+
+class SingleFlight:
+    """Collapse concurrent calls with the same key into one execution."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: dict[str, Future] = {}
+
+    def do(self, key: str, fn: Callable[[], dict]) -> tuple[dict, bool]:
+        """Run `fn` once per key at a time. Returns (result, shared)."""
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+
+        if not leader:
+            metrics.inc("conversion_singleflight_shared_total")
+            return future.result(), True
+
+        try:
+            result = fn()
+            future.set_result(result)
+            return result, False
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+
+_cache: ConversionCache | None = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> ConversionCache:
+    """Singleton conversion cache configured from settings."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            settings = get_settings()
+            _cache = ConversionCache(
+                max_entries=settings.conversion_cache_max_entries,
+                max_age=settings.conversion_cache_max_age,
+                sweep_interval=settings.conversion_cache_sweep_interval,
+            )
+            _cache.start_sweeper()
+        return _cache
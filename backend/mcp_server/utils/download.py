@@ -3,31 +3,150 @@ HTTP download helper for LayoutIR MCP Server.
 
 Downloads files from any public URL to a temporary directory
 so the LayoutIR pipeline can process them locally.
+
+The body is streamed straight to disk and hashed on the way, so large
+scans never sit in memory. Downloads share one pooled HTTP client and an
+interrupted transfer is resumed with a Range request when the server
+supports it.
 """
 
+import hashlib
+import shutil
 import tempfile
+import threading
+from dataclasses import dataclass
 from pathlib import Path
 from urllib.parse import urlparse, unquote
 
 import httpx
 
+from mcp_server.utils import metrics
+from mcp_server.utils.config import get_settings
 
-def download_to_temp(url: str, timeout: float = 120.0) -> Path:
+
+CHUNK_SIZE = 1024 * 1024
+
+
+@dataclass(frozen=True)
+class DownloadedFile:
+    """A file fetched into its own temporary directory."""
+
+    path: Path
+    sha256: str
+    size: int
+    content_type: str
+
+
+_http: httpx.Client | None = None
+_http_lock = threading.Lock()
+
+
+def _client() -> httpx.Client:
+    """Shared, connection-pooled HTTP client for downloads."""
+    global _http
+    with _http_lock:
+        if _http is None:
+            settings = get_settings()
+            _http = httpx.Client(
+                follow_redirects=True,
+                limits=httpx.Limits(max_connections=settings.download_max_connections),
+            )
+        return _http
+
+
+def _check_headers(response: httpx.Response, max_bytes: int, allowed_types: tuple[str, ...]) -> str:
+    """Reject responses that are the wrong type or announce an oversized body."""
+    content_type = response.headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type and allowed_types and content_type not in allowed_types:
+        raise ValueError(f"Unsupported content type '{content_type}' for {response.url}")
+
+    length = response.headers.get("content-length")
+    if max_bytes and length is not None and length.isdigit():
+        total = int(length)
+        if response.status_code == 206:
+            # Content-Range: bytes start-end/total
+            total = int(response.headers.get("content-range", "/0").rsplit("/", 1)[-1] or 0) or total
+        if total > max_bytes:
+            raise ValueError(f"File is {total} bytes, larger than the {max_bytes}-byte limit")
+    return content_type
+
+
+def fetch_to_temp(
+    url: str,
+    timeout: float = 120.0,
+    max_bytes: int | None = None,
+    allowed_types: tuple[str, ...] | None = None,
+) -> DownloadedFile:
     """
-    Download a file from a URL into a temporary directory.
+    Stream a file from a URL into a temporary directory, hashing it as it goes.
 
-    Returns the path to the downloaded file. The caller is responsible
-    for cleaning up the temp dir when done (use `shutil.rmtree`).
+    `max_bytes` and `allowed_types` default to the configured limits. Raises
+    `ValueError` when either is violated. The caller is responsible for
+    cleaning up `result.path.parent` (use `shutil.rmtree`).
     """
+    settings = get_settings()
+    max_bytes = settings.download_max_bytes if max_bytes is None else max_bytes
+    allowed_types = settings.download_allowed_types if allowed_types is None else allowed_types
+
     parsed = urlparse(url)
     filename = unquote(Path(parsed.path).name) or "document.pdf"
 
     tmp_dir = Path(tempfile.mkdtemp(prefix="layoutir_"))
     dest = tmp_dir / filename
 
-    with httpx.Client(timeout=timeout, follow_redirects=True) as client:
-        response = client.get(url)
-        response.raise_for_status()
-        dest.write_bytes(response.content)
+    hasher = hashlib.sha256()
+    written = 0
+    content_type = ""
+    resumable = False
+    validator = None
+    attempts = 0
+
+    try:
+        with metrics.timed("download_seconds"), open(dest, "wb") as out:
+            while True:
+                headers = {}
+                if written:
+                    headers["Range"] = f"bytes={written}-"
+                    if validator:
+                        headers["If-Range"] = validator
+                try:
+                    with _client().stream("GET", url, headers=headers, timeout=timeout) as response:
+                        response.raise_for_status()
+                        if written and response.status_code != 206:
+                            # The server ignored the Range header: start over.
+                            out.seek(0)
+                            out.truncate()
+                            hasher = hashlib.sha256()
+                            written = 0
+                        content_type = _check_headers(response, max_bytes, allowed_types) or content_type
+                        resumable = response.headers.get("accept-ranges") == "bytes" or response.status_code == 206
+                        validator = response.headers.get("etag") or response.headers.get("last-modified")
+
+                        for chunk in response.iter_bytes(CHUNK_SIZE):
+                            written += len(chunk)
+                            if max_bytes and written > max_bytes:
+                                raise ValueError(f"File exceeds the {max_bytes}-byte limit")
+                            out.write(chunk)
+                            hasher.update(chunk)
+                    break
+                except httpx.TransportError:
+                    attempts += 1
+                    if not resumable or attempts > settings.download_resume_attempts:
+                        raise
+                    metrics.inc("download_resumes_total")
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    metrics.inc("download_bytes_total", written)
+    return DownloadedFile(path=dest, sha256=hasher.hexdigest(), size=written, content_type=content_type)
+
 
-    return dest
+def download_to_temp(url: str, timeout: float = 120.0) -> Path:
+    """
+    Download a file from a URL into a temporary directory.
+
+    Returns the path to the downloaded file. The caller is responsible
+    for cleaning up the temp dir when done (use `shutil.rmtree`).
+    """
+    return fetch_to_temp(url, timeout=timeout).path
@@ -0,0 +1,217 @@
+"""
+Shared, content-addressed image assets for LayoutIR.
+
+Images extracted by a conversion are stored once per content hash under
+`assets/images/{sha[:2]}/{sha}.{ext}`, outside any document folder, so a
+logo or figure that repeats across pages and documents is uploaded once
+and served from one URL. Next to each original two derivatives are
+generated, in parallel across images, when a new image is first stored:
+
+- `webp`: the whole image re-encoded as WebP (`IMAGE_WEBP_QUALITY`)
+- `thumbnail`: a WebP at most `IMAGE_THUMBNAIL_SIZE` pixels on its longer
+  side, only for images larger than that
+
+A `{sha}.json` record of every variant (path, format, bytes, dimensions)
+is written last, so its presence means the asset is complete; later
+conversions that extract the same image only read the record.
+`publish_images` returns the fields `rewrite_asset_paths` puts into each
+block's `image_data`, so clients can fetch the cheapest variant that fits.
+
+Derivatives are made with Pillow, a dependency of this server. Should it
+be missing (`Image` is None), and for images it cannot decode, only the
+original is stored.
+"""
+
+import hashlib
+import io
+import json
+import logging
+import mimetypes
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from mcp_server.utils import metrics, storage, tracing
+from mcp_server.utils.config import get_settings
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+
+logger = logging.getLogger(__name__)
+
+
+# Storage prefix of shared images, and the folder LayoutIR writes them to locally.
+IMAGES_DIR = "assets/images"
+
+# Content-addressed objects never change, so caches may keep them for a year.
+IMMUTABLE_CACHE_CONTROL = "31536000"
+
+# Records of recently published images, to skip the storage round trip.
+_RECORDS_MAX = 4096
+_records: OrderedDict[str, dict] = OrderedDict()
+_records_lock = threading.Lock()
+
+
+def asset_path(digest: str, suffix: str) -> str:
+    """Storage path of one file of the image with SHA-256 `digest`."""
+    return f"{IMAGES_DIR}/{digest[:2]}/{digest}{suffix}"
+
+
+def _remember(digest: str, record: dict) -> None:
+    with _records_lock:
+        _records[digest] = record
+        _records.move_to_end(digest)
+        while len(_records) > _RECORDS_MAX:
+            _records.popitem(last=False)
+
+
+def _recall(digest: str) -> dict | None:
+    with _records_lock:
+        record = _records.get(digest)
+        if record is not None:
+            _records.move_to_end(digest)
+        return record
+
+
+def _load_record(digest: str) -> dict | None:
+    """The stored record of an image, or None if it is not published (or cannot be read)."""
+    try:
+        return json.loads(storage.download_bytes(asset_path(digest, ".json")))
+    except Exception:
+        return None
+
+
+# ── Derivatives ─────────────────────────────────────────────────────
+
+def _derive(data: bytes) -> tuple[tuple[int, int] | None, list[tuple[str, bytes, tuple[int, int]]]]:
+    """Decode an image and encode its derivatives.
+
+    Returns `(size, [(name, encoded, size), ...])`; the size is None when
+    the image cannot be decoded or Pillow is not installed.
+    """
+    if Image is None:
+        return None, []
+
+    settings = get_settings()
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            image.load()
+            size = image.size
+            if not settings.image_derivatives:
+                return size, []
+            if image.mode not in ("RGB", "RGBA"):
+                keep_alpha = image.mode in ("LA", "PA", "P") or "transparency" in image.info
+                image = image.convert("RGBA" if keep_alpha else "RGB")
+
+            def webp(img) -> bytes:
+                out = io.BytesIO()
+                img.save(out, "WEBP", quality=settings.image_webp_quality, method=4)
+                return out.getvalue()
+
+            derivatives = [("webp", webp(image), size)]
+            limit = settings.image_thumbnail_size
+            if limit and max(size) > limit:
+                thumbnail = image.copy()
+                thumbnail.thumbnail((limit, limit), Image.Resampling.LANCZOS)
+                derivatives.append(("thumbnail", webp(thumbnail), thumbnail.size))
+            return size, derivatives
+    except Exception as exc:
+        logger.warning("Could not decode an extracted image (%s); storing only the original", exc)
+        return None, []
+
+
+def _variant(path: str, fmt: str, size: tuple[int, int] | None, nbytes: int) -> dict:
+    variant = {"path": path, "format": fmt, "bytes": nbytes}
+    if size is not None:
+        variant["width"], variant["height"] = size
+    return variant
+
+
+# ── Publishing ──────────────────────────────────────────────────────
+
+def publish_image(local_path: Path, digest: str) -> dict:
+    """Store one image and its derivatives unless already stored. Returns its record."""
+    record = _recall(digest)
+    if record is not None:
+        metrics.inc("image_assets_total", result="shared")
+        return record
+    record = _load_record(digest)
+    if record is not None:
+        metrics.inc("image_assets_total", result="shared")
+        _remember(digest, record)
+        return record
+
+    data = Path(local_path).read_bytes()
+    suffix = Path(local_path).suffix.lower() or ".bin"
+    start = time.perf_counter()
+    size, derivatives = _derive(data)
+    metrics.observe("image_derivative_seconds", time.perf_counter() - start)
+
+    variants = {"original": _variant(asset_path(digest, suffix), suffix.lstrip("."), size, len(data))}
+    uploads = [(variants["original"]["path"], data, mimetypes.guess_type(f"x{suffix}")[0] or "application/octet-stream")]
+    for name, encoded, derived_size in derivatives:
+        path = asset_path(digest, ".webp" if name == "webp" else f".{name}.webp")
+        variants[name] = _variant(path, "webp", derived_size, len(encoded))
+        uploads.append((path, encoded, "image/webp"))
+    for path, payload, content_type in uploads:
+        storage.with_retries(storage.upload_bytes, path, payload, content_type, IMMUTABLE_CACHE_CONTROL)
+
+    record = {"sha256": digest, "variants": variants}
+    storage.with_retries(
+        storage.upload_text, asset_path(digest, ".json"), json.dumps(record),
+        content_type="application/json", cache_control=IMMUTABLE_CACHE_CONTROL,
+    )
+    metrics.inc("image_assets_total", result="uploaded")
+    _remember(digest, record)
+    return record
+
+
+def image_data_fields(record: dict) -> dict:
+    """The `image_data` fields for a published image: URLs of the original and every variant."""
+    variants = {}
+    for name, variant in record["variants"].items():
+        fields = {key: value for key, value in variant.items() if key != "path"}
+        variants[name] = {"url": storage.get_public_url(variant["path"]), **fields}
+    return {
+        "extracted_path": variants["original"]["url"],
+        "sha256": record["sha256"],
+        "variants": variants,
+    }
+
+
+def publish_images(local_dir: Path) -> dict[str, dict]:
+    """Move every image under `local_dir/assets/images` to the shared store.
+
+    Identical images are stored once. The local files are removed, so a
+    following `upload_directory` does not copy them into the document
+    folder. Returns `{relative_path: image_data_fields}`.
+    """
+    images_dir = Path(local_dir) / IMAGES_DIR
+    if not images_dir.is_dir():
+        return {}
+    files = sorted(path for path in images_dir.rglob("*") if path.is_file())
+    if not files:
+        return {}
+
+    digests = {}
+    for path in files:
+        with open(path, "rb") as f:
+            digests[path] = hashlib.file_digest(f, "sha256").hexdigest()
+    unique = {digest: path for path, digest in reversed(digests.items())}
+
+    workers = max(min(get_settings().image_concurrency, len(unique)), 1)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        records = dict(zip(unique, pool.map(lambda item: publish_image(item[1], item[0]), unique.items())))
+
+    fields = {}
+    for path, digest in digests.items():
+        fields[path.relative_to(local_dir).as_posix()] = image_data_fields(records[digest])
+        path.unlink()
+    tracing.add("images", len(files))
+    tracing.add("images_unique", len(unique))
+    return fields
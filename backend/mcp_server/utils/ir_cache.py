@@ -0,0 +1,271 @@
+"""
+In-process IR cache with write-behind for LayoutIR MCP Server.
+
+Parsed IR documents are kept in a memory-bounded LRU keyed by document_id,
+each with a version number that increases on every save. Saves only mark the
+cached copy dirty; a background flusher persists dirty documents after a
+short delay, so a burst of edits becomes a single upload. Documents are also
+flushed on demand (before exports) and before they are evicted.
+"""
+
+import atexit
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable
+
+from mcp_server.utils import metrics
+from mcp_server.utils.config import get_settings
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CachedIR:
+    """One cached IR document."""
+
+    ir: dict
+    version: int
+    size: int
+    dirty: bool = False
+    dirty_since: float = 0.0
+    lock: threading.RLock = field(default_factory=threading.RLock)
+    # Change records not yet persisted, or a full rewrite when `rewrite` is set.
+    pending: list = field(default_factory=list)
+    rewrite: bool = False
+    # Persistence bookkeeping and derived lookup structures kept alongside the IR.
+    journal: Any = None
+    index: Any = None
+
+
+class IRCache:
+    """LRU of parsed IRs bounded by their approximate serialized size.
+
+    `persist(document_id, entry)` writes one dirty entry to storage and
+    returns its approximate size in bytes. With `flush_delay` set to 0 every
+    save is written through.
+    """
+
+    def __init__(self, max_bytes: int, flush_delay: float, persist: Callable[[str, CachedIR], int]):
+        self.max_bytes = max_bytes
+        self.flush_delay = flush_delay
+        self._persist = persist
+        self._entries: OrderedDict[str, CachedIR] = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._flusher: threading.Thread | None = None
+        self._document_locks: dict[str, threading.RLock] = {}
+
+    def lock_for(self, document_id: str) -> threading.RLock:
+        """The lock guarding a document, shared by tools and the flusher.
+
+        It outlives cache entries, so a document evicted and reloaded keeps
+        the same lock.
+        """
+        with self._lock:
+            return self._document_locks.setdefault(document_id, threading.RLock())
+
+    # ── Reads ──
+
+    def get(self, document_id: str) -> CachedIR | None:
+        with self._lock:
+            entry = self._entries.get(document_id)
+            if entry is None:
+                self._misses += 1
+            else:
+                self._hits += 1
+                self._entries.move_to_end(document_id)
+        metrics.inc("ir_cache_total", result="miss" if entry is None else "hit")
+        return entry
+
+    def peek(self, document_id: str) -> CachedIR | None:
+        """Return an entry without counting a lookup or touching LRU order."""
+        with self._lock:
+            return self._entries.get(document_id)
+
+    def put(self, document_id: str, ir: dict, size: int) -> CachedIR:
+        """Cache a freshly loaded IR."""
+        entry = CachedIR(ir=ir, version=ir.get("ir_version", 0), size=size, lock=self.lock_for(document_id))
+        with self._lock:
+            old = self._entries.pop(document_id, None)
+            if old is not None:
+                self._bytes -= old.size
+            self._entries[document_id] = entry
+            self._bytes += size
+        self._evict_over_budget()
+        return entry
+
+    # ── Writes ──
+
+    def mark_dirty(self, document_id: str, ir: dict, changes: list[dict] | None = None) -> CachedIR:
+        """Record a new version of a document, to be persisted by the flusher.
+
+        `changes` describe the edit incrementally; None (or a different IR
+        object than the cached one) requires a full rewrite.
+        """
+        with self._lock:
+            entry = self._entries.get(document_id)
+        if entry is None:
+            entry = self.put(document_id, ir, 0)
+        with entry.lock:
+            if changes is None or entry.ir is not ir:
+                entry.rewrite = True
+                entry.pending = []
+            elif not entry.rewrite:
+                entry.pending.extend(changes)
+            entry.ir = ir
+            entry.version += 1
+            ir["ir_version"] = entry.version
+            if not entry.dirty:
+                entry.dirty = True
+                entry.dirty_since = time.monotonic()
+
+        if self.flush_delay <= 0:
+            self.flush(document_id)
+        else:
+            self._ensure_flusher()
+        return entry
+
+    def flush(self, document_id: str) -> None:
+        """Persist a document now if it has unsaved changes."""
+        with self._lock:
+            entry = self._entries.get(document_id)
+        if entry is not None:
+            self._flush_entry(document_id, entry)
+
+    def discard(self, document_id: str) -> None:
+        """Drop a cached document without persisting it."""
+        with self._lock:
+            entry = self._entries.pop(document_id, None)
+            if entry is not None:
+                self._bytes -= entry.size
+
+    def flush_all(self) -> None:
+        with self._lock:
+            items = list(self._entries.items())
+        for document_id, entry in items:
+            try:
+                self._flush_entry(document_id, entry)
+            except Exception:
+                logger.exception("Failed to flush IR for %s", document_id)
+
+    def _flush_entry(self, document_id: str, entry: CachedIR) -> None:
+        self._write(document_id, entry)
+        self._evict_over_budget()
+
+    def _write(self, document_id: str, entry: CachedIR) -> None:
+        with entry.lock:
+            if not entry.dirty:
+                return
+            start = time.perf_counter()
+            try:
+                size = self._persist(document_id, entry)
+            except Exception:
+                metrics.inc("ir_cache_flush_errors_total")
+                raise
+            entry.dirty = False
+            entry.rewrite = False
+            entry.pending = []
+            metrics.observe("ir_cache_flush_seconds", time.perf_counter() - start)
+        with self._lock:
+            if self._entries.get(document_id) is entry:
+                self._bytes += size - entry.size
+            entry.size = size
+
+    def _ensure_flusher(self) -> None:
+        with self._lock:
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._flush_loop, name="ir-flusher", daemon=True)
+                self._flusher.start()
+
+    def _flush_loop(self) -> None:
+        while True:
+            time.sleep(self.flush_delay / 2)
+            now = time.monotonic()
+            with self._lock:
+                due = [
+                    (document_id, entry) for document_id, entry in self._entries.items()
+                    if entry.dirty and now - entry.dirty_since >= self.flush_delay
+                ]
+            for document_id, entry in due:
+                try:
+                    self._flush_entry(document_id, entry)
+                except Exception:
+                    logger.exception("Write-behind flush failed for %s; will retry", document_id)
+
+    # ── Eviction ──
+
+    def _evict_over_budget(self) -> None:
+        """Flush and drop least recently used entries until the cache fits its budget.
+
+        Entries locked by another thread are skipped, not waited for: the
+        caller may hold a document lock itself, and two threads evicting each
+        other's documents would deadlock.
+        """
+        with self._lock:
+            candidates = list(self._entries.items())
+        for document_id, entry in candidates:
+            with self._lock:
+                if self._bytes <= self.max_bytes or len(self._entries) <= 1:
+                    return
+                if self._entries.get(document_id) is not entry:
+                    continue
+            if not entry.lock.acquire(blocking=False):
+                metrics.inc("ir_cache_eviction_skips_total")
+                continue
+            try:
+                self._write(document_id, entry)
+                with self._lock:
+                    if self._entries.get(document_id) is entry and not entry.dirty:
+                        del self._entries[document_id]
+                        self._bytes -= entry.size
+                        metrics.inc("ir_cache_evictions_total")
+            except Exception:
+                # Keep unsaved edits in memory rather than dropping them.
+                logger.exception("Could not flush %s before eviction", document_id)
+                return
+            finally:
+                entry.lock.release()
+
+    # ── Observability ──
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._hits + self._misses
+            stats = {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "dirty": sum(1 for entry in self._entries.values() if entry.dirty),
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": self._hits / lookups if lookups else 0.0,
+            }
+        metrics.set_gauge("ir_cache_bytes", stats["bytes"])
+        metrics.set_gauge("ir_cache_entries", stats["entries"])
+        metrics.set_gauge("ir_cache_hit_rate", stats["hit_rate"])
+        return stats
+
+
+_cache: IRCache | None = None
+_cache_lock = threading.Lock()
+
+
+def get_cache(persist: Callable[[str, CachedIR], int]) -> IRCache:
+    """Singleton IR cache. `persist` is only used when the cache is first created."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            settings = get_settings()
+            _cache = IRCache(
+                max_bytes=settings.ir_cache_max_bytes,
+                flush_delay=settings.ir_write_behind_delay,
+                persist=persist,
+            )
+            atexit.register(_cache.flush_all)
+        return _cache
@@ -0,0 +1,119 @@
+"""
+Storage encoding for IR objects (page shards, manifests, journal entries).
+
+Encoded objects start with a 5-byte header: the magic `LIR`, a format
+version and a codec byte, followed by the compressed JSON text. Objects
+without the header are plain JSON, so everything stored before the header
+existed (and anything written with `IR_CODEC=json`) still loads.
+
+Compression removes most of the weight of the keys repeated in every
+block (bbox, metadata, ...). zstd needs the optional `zstandard` package
+and falls back to gzip without it; JSON is encoded and parsed with
+`orjson` when it is installed and with the standard library otherwise.
+"""
+
+import gzip
+import json
+import logging
+
+
+logger = logging.getLogger(__name__)
+
+
+MAGIC = b"LIR"
+FORMAT_VERSION = 1
+HEADER_SIZE = len(MAGIC) + 2
+
+# Codec byte → name. "json" objects are written without a header.
+CODECS = {1: "gzip", 2: "zstd"}
+CODEC_IDS = {name: codec_id for codec_id, name in CODECS.items()}
+
+GZIP_LEVEL = 1
+ZSTD_LEVEL = 3
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+class CodecError(ValueError):
+    """Raised for objects with an unknown format version or codec."""
+
+
+# ── JSON ────────────────────────────────────────────────────────────
+
+def _default(value):
+    # Compact `ir_model.Block`s serialize as the dicts they stand for.
+    if hasattr(value, "to_dict"):
+        return value.to_dict()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps_json(value) -> bytes:
+    """Compact UTF-8 JSON."""
+    if orjson is not None:
+        return orjson.dumps(value, default=_default)
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"), default=_default).encode("utf-8")
+
+
+def loads_json(data: bytes | memoryview | str):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(bytes(data) if isinstance(data, memoryview) else data)
+
+
+# ── Envelope ────────────────────────────────────────────────────────
+
+def resolve_codec(name: str) -> str:
+    """The codec actually used for `name` in this environment."""
+    if name == "zstd" and zstandard is None:
+        return "gzip"
+    if name not in ("json", *CODEC_IDS):
+        raise CodecError(f"Unknown IR codec {name!r}; use json, gzip or zstd")
+    return name
+
+
+def encode(value, codec: str = "zstd") -> bytes:
+    """Serialize `value` with a codec; "json" produces plain JSON without a header."""
+    codec = resolve_codec(codec)
+    text = dumps_json(value)
+    if codec == "json":
+        return text
+    if codec == "zstd":
+        payload = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(text)
+    else:
+        payload = gzip.compress(text, compresslevel=GZIP_LEVEL, mtime=0)
+    return MAGIC + bytes((FORMAT_VERSION, CODEC_IDS[codec])) + payload
+
+
+def decode(data: bytes | memoryview | str):
+    """Parse an object written by `encode`, or a plain JSON document.
+
+    Accepts any bytes-like object, e.g. a view of a memory-mapped file.
+    """
+    if isinstance(data, str) or bytes(data[:len(MAGIC)]) != MAGIC:
+        return loads_json(data)
+    version, codec_id = data[len(MAGIC)], data[len(MAGIC) + 1]
+    if version != FORMAT_VERSION:
+        raise CodecError(f"Unsupported IR format version {version}")
+    codec = CODECS.get(codec_id)
+    payload = memoryview(data)[HEADER_SIZE:]
+    if codec == "gzip":
+        text = gzip.decompress(payload)
+    elif codec == "zstd":
+        if zstandard is None:
+            raise CodecError("This IR object is zstd-compressed; install the zstandard package to read it")
+        text = zstandard.ZstdDecompressor().decompress(payload)
+    else:
+        raise CodecError(f"Unknown IR codec id {codec_id}")
+    return loads_json(text)
+
+
+def content_type(codec: str) -> str:
+    return "application/json" if resolve_codec(codec) == "json" else "application/octet-stream"
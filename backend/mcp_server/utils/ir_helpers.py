@@ -3,14 +3,46 @@ IR persistence helpers for LayoutIR MCP Server.
 
 Handles loading and saving IR JSON documents via Supabase Storage,
 plus block ID generation and asset path rewriting.
-"""
 
-import json
-import hashlib
+Loaded IRs are kept in an in-process cache (see `ir_cache`), with their
+blocks stored as compact `ir_model.Block`s: `load_ir` returns the cached
+dictionary, and `save_ir` marks it dirty for the
+write-behind flusher. Tools mutate the loaded IR in place and then call
+`save_ir`; call `flush_ir` when storage must be up to date.
+
+Snapshots are sharded by page: `{document_id}/ir/manifest.json` holds the
+document metadata, stats and a page index pointing at one blocks shard per
+page under `{document_id}/ir/pages/`. Documents stored before sharding are
+read from their monolithic `ir.json`, which `write_ir_json` still produces
+on demand.
+
+Block edits are stored as an append-only journal next to the snapshot:
+each flush writes `{document_id}/journal/{seq}.json` holding the change
+records produced by `ir_ops.BlockIndex`, and readers replay the entries
+newer than the snapshot's `journal_seq`. Once the journal passes
+`IR_JOURNAL_MAX_ENTRIES` entries or `IR_JOURNAL_MAX_BYTES` bytes it is
+compacted into a new snapshot that rewrites only the touched page shards.
 
-from mcp_server.utils import storage
+Shards, manifests and journal entries are encoded with `IR_CODEC` (see
+`ir_codec`); plain JSON objects written earlier are still read.
 
+Each snapshot also rewrites the document's columnar block store (see
+`block_store`) and its search index (see `search_index`); readers of those
+catch up on the journal entries written since with `journal_since`.
+"""
+
+import copy
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 
+from mcp_server.utils import block_store, ir_codec, metrics, search_index, storage, tracing
+from mcp_server.utils.config import get_settings
+from mcp_server.utils.ir_cache import CachedIR, IRCache, get_cache
+from mcp_server.utils.ir_model import compact_blocks
+from mcp_server.utils.ir_ops import BlockIndex, changed_pages, generate_block_id, replay, unique_orders
 
 
 def get_ir_storage_path(document_id: str) -> str:
@@ -18,42 +50,485 @@ def get_ir_storage_path(document_id: str) -> str:
     return f"{document_id}/ir.json"
 
 
-def load_ir(document_id: str) -> dict:
-    """Load IR JSON from Supabase Storage."""
-    path = get_ir_storage_path(document_id)
+def get_manifest_path(document_id: str) -> str:
+    """Return the Supabase Storage path for a document's sharded IR manifest."""
+    return f"{document_id}/ir/manifest.json"
+
+
+def get_journal_prefix(document_id: str) -> str:
+    """Return the Supabase Storage folder holding a document's edit journal."""
+    return f"{document_id}/journal"
+
+
+def _journal_path(document_id: str, seq: int) -> str:
+    return f"{get_journal_prefix(document_id)}/{seq:010d}.json"
+
+
+def _shard_path(document_id: str, page: int, seq: int) -> str:
+    # The sequence number makes every shard version a new object, so the
+    # manifest upload is the single commit point for a snapshot.
+    return f"{document_id}/ir/pages/{page:05d}-{seq:010d}.json"
+
+
+@dataclass
+class JournalState:
+    """Where a cached document's snapshot and journal stand in storage."""
+
+    seq: int = 0            # last journal entry written or replayed
+    snapshot_seq: int = 0   # last entry folded into the stored snapshot
+    bytes: int = 0          # journal bytes written since the snapshot
+    shards: dict | None = None              # manifest shard table (None: legacy ir.json)
+    dirty_pages: set | None = field(default_factory=set)  # None: every page
+
+
+def _list_journal(document_id: str) -> list[int]:
+    """Sequence numbers of the journal entries currently in storage."""
+    try:
+        names = storage.list_names(get_journal_prefix(document_id))
+    except Exception:
+        return []
+    return sorted(int(name.split(".")[0]) for name in names if name.split(".")[0].isdigit())
+
+
+def _mark_pages(state: JournalState, changes: list[dict]) -> None:
+    pages = changed_pages(changes)
+    if pages is None or state.dirty_pages is None:
+        state.dirty_pages = None
+    else:
+        state.dirty_pages |= pages
+
+
+def _parse(data: bytes | memoryview | str):
+    start = time.perf_counter()
+    value = ir_codec.decode(data)
+    metrics.observe("ir_parse_seconds", time.perf_counter() - start)
+    return value
+
+
+def _download_many(paths: list[str]) -> list:
+    if len(paths) <= 1:
+        return [storage.download_buffer(path) for path in paths]
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        return list(pool.map(storage.download_buffer, paths))
+
+
+def _read_journal(document_id: str, after: int) -> tuple[list[int], list[dict]]:
+    """Sequence numbers and decoded entries of the stored journal entries newer than `after`."""
+    pending = [seq for seq in _list_journal(document_id) if seq > after]
+    if not pending:
+        return [], []
+    return pending, [_parse(data) for data in _download_many([_journal_path(document_id, seq) for seq in pending])]
+
+
+# ── Load ────────────────────────────────────────────────────────────
+
+def _fetch_snapshot(document_id: str, pages: range | None = None) -> tuple[dict, int, JournalState]:
+    """Download the stored snapshot: the sharded layout, else a legacy ir.json."""
     try:
-        text = storage.download_text(path, cache_bust=True)
-    except Exception as exc:
-        raise FileNotFoundError(f"No IR found for document_id: {document_id}") from exc
-    return json.loads(text)
+        manifest_data = storage.download_bytes(get_manifest_path(document_id))
+    except Exception:
+        manifest_data = None
+
+    if manifest_data is None:
+        try:
+            text = storage.download_text(get_ir_storage_path(document_id), cache_bust=True)
+        except Exception as exc:
+            raise FileNotFoundError(f"No IR found for document_id: {document_id}") from exc
+        ir = _parse(text)
+        if pages is not None:
+            ir["blocks"] = [b for b in ir.get("blocks", []) if b.get("page_number") in pages]
+        compact_blocks(ir.setdefault("blocks", []))
+        seq = ir.get("journal_seq", 0)
+        return ir, len(text), JournalState(seq=seq, snapshot_seq=seq)
+
+    manifest = _parse(manifest_data)
+    shards = manifest.pop("shards")
+    wanted = [
+        shard for key, shard in shards.items()
+        if pages is None or (key.lstrip("-").isdigit() and int(key) in pages)
+    ]
+    blocks = []
+    size = len(manifest_data)
+    for data in _download_many([f"{document_id}/{shard['path']}" for shard in wanted]):
+        blocks.extend(compact_blocks(_parse(data)))
+        size += len(data)
+    blocks.sort(key=lambda b: b.get("order", 0))
+
+    ir = dict(manifest, blocks=blocks)
+    seq = manifest.get("journal_seq", 0)
+    return ir, size, JournalState(seq=seq, snapshot_seq=seq, shards=shards)
+
+
+def _fetch_ir(document_id: str, pages: range | None = None) -> tuple[dict, int, JournalState]:
+    """Download the IR snapshot (optionally only some pages) and replay its journal.
+
+    Returns (ir, size in bytes, journal state).
+    """
+    ir, size, state = _fetch_snapshot(document_id, pages)
+
+    pending, entries = _read_journal(document_id, state.snapshot_seq)
+    if pending:
+        changes = [change for entry in entries for change in entry["changes"]]
+        if pages is not None and changed_pages(changes) is None:
+            # A respace renumbers every page, so a partial replay is not possible.
+            return _fetch_ir(document_id)
+
+        start = time.perf_counter()
+        stats = copy.deepcopy(ir.get("stats"))
+        replay(ir, changes, pages)
+        if pages is not None and stats is not None:
+            # Replay recounts only the loaded pages; keep the whole-document stats.
+            ir["stats"] = stats
+        metrics.observe("ir_journal_replay_seconds", time.perf_counter() - start)
+        ir["ir_version"] = entries[-1].get("ir_version", ir.get("ir_version", 0))
+        _mark_pages(state, changes)
+        state.seq = pending[-1]
+        state.bytes = sum(len(json.dumps(entry)) for entry in entries)
+        size += state.bytes
+    return ir, size, state
+
 
+def journal_since(document_id: str, ir_version: int) -> tuple[list[dict], int] | None:
+    """Change records stored after IR version `ir_version`, for derived data written at that version.
 
-def save_ir(document_id: str, ir: dict) -> str:
-    """Save IR JSON to Supabase Storage. Returns the public URL."""
-    path = get_ir_storage_path(document_id)
-    text = json.dumps(ir, ensure_ascii=False)
+    Returns `(changes, current ir_version)`, or None when the stored snapshot
+    is newer than `ir_version`: the journal entries in between have been
+    folded away, so the derived data must be rebuilt from the IR.
+    """
+    manifest = _stored_manifest(document_id)
+    if manifest.get("ir_version", 0) > ir_version:
+        return None
+    _, entries = _read_journal(document_id, manifest.get("journal_seq", 0))
+    # An entry may hold several saves; replay is idempotent, so a partly
+    # applied entry is simply applied again.
+    entries = [entry for entry in entries if entry.get("ir_version", 0) > ir_version]
+    changes = [change for entry in entries for change in entry["changes"]]
+    return changes, entries[-1].get("ir_version", ir_version) if entries else ir_version
+
+
+# ── Persist ─────────────────────────────────────────────────────────
+
+def _serialize(value, codec: str | None = None) -> bytes:
+    """Encode a stored IR object with `IR_CODEC` (or `codec`)."""
+    start = time.perf_counter()
+    data = ir_codec.encode(value, codec or get_settings().ir_codec)
+    metrics.observe("ir_serialize_seconds", time.perf_counter() - start)
+    return data
+
+
+def _upload_json(path: str, data: bytes, codec: str | None = None) -> None:
+    """Upload an object encoded by `_serialize` with the same `codec`."""
+    content_type = ir_codec.content_type(codec or get_settings().ir_codec)
     # Use no-cache so edits propagate immediately
-    return storage.upload_text(path, text, content_type="application/json", cache_control="no-cache")
+    storage.upload_bytes(path, data, content_type=content_type, cache_control="no-cache")
+
+
+def _stored_manifest(document_id: str) -> dict:
+    """The stored manifest, or {} if the document has none yet."""
+    try:
+        return ir_codec.decode(storage.download_bytes(get_manifest_path(document_id)))
+    except Exception:
+        return {}
+
+
+def _write_snapshot(document_id: str, ir: dict, state: JournalState | None) -> tuple[int, JournalState]:
+    """Write a sharded snapshot that folds in every journal entry.
+
+    Only the page shards touched since the previous snapshot are uploaded;
+    untouched pages keep pointing at their existing shard objects. The
+    manifest is uploaded last, after which superseded shards and folded
+    journal entries are deleted and the block store and search index are
+    rewritten.
+    """
+    if state is None:
+        # Unknown journal (e.g. a fresh conversion): supersede whatever is stored.
+        # Bump the sequence so no stored shard object is overwritten in place.
+        stored = _list_journal(document_id)
+        manifest = _stored_manifest(document_id)
+        seq = max(stored[-1] if stored else 0, manifest.get("journal_seq", -1)) + 1
+        state = JournalState(seq=seq, shards=manifest.get("shards"), dirty_pages=None)
+        obsolete = [_journal_path(document_id, seq) for seq in stored]
+    else:
+        obsolete = [_journal_path(document_id, seq) for seq in range(state.snapshot_seq + 1, state.seq + 1)]
+
+    old_shards = state.shards or {}
+    rewrite_all = state.dirty_pages is None or state.shards is None
+
+    by_page: dict[int, list[dict]] = {}
+    for block in ir.get("blocks", []):
+        by_page.setdefault(block.get("page_number") or 0, []).append(block)
+
+    shards: dict[str, dict] = {}
+    uploads: list[tuple[str, bytes]] = []
+    for page, blocks in sorted(by_page.items()):
+        key = str(page)
+        if not rewrite_all and key in old_shards and page not in state.dirty_pages:
+            shards[key] = old_shards[key]
+            continue
+        data = _serialize(blocks)
+        path = _shard_path(document_id, page, state.seq)
+        shards[key] = {"path": path.split("/", 1)[1], "blocks": len(blocks), "bytes": len(data)}
+        uploads.append((path, data))
+
+    if len(uploads) > 1:
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            list(pool.map(lambda item: _upload_json(*item), uploads))
+    elif uploads:
+        _upload_json(*uploads[0])
+
+    manifest = {key: value for key, value in ir.items() if key != "blocks"}
+    manifest["journal_seq"] = state.seq
+    manifest["shards"] = shards
+    manifest_data = _serialize(manifest)
+    _upload_json(get_manifest_path(document_id), manifest_data)
+    ir["journal_seq"] = state.seq
+
+    written = len(manifest_data) + sum(len(data) for _, data in uploads)
+    metrics.inc("ir_bytes_written_total", written, kind="snapshot")
+    metrics.inc("ir_shards_written_total", len(uploads))
+
+    obsolete += [
+        f"{document_id}/{shard['path']}" for key, shard in old_shards.items()
+        if shards.get(key, {}).get("path") != shard["path"]
+    ]
+    if obsolete:
+        try:
+            storage.delete_paths(obsolete)
+        except Exception:
+            # Unreferenced shards and entries at or below journal_seq are ignored by readers.
+            pass
+
+    with tracing.span("write_block_store"):
+        block_store.write_blocks(document_id, ir)
+    with tracing.span("write_search_index"):
+        search_index.write_index(document_id, ir)
+
+    size = len(manifest_data) + sum(shard["bytes"] for shard in shards.values())
+    return size, JournalState(seq=state.seq, snapshot_seq=state.seq, shards=shards)
+
+
+def _append_journal(document_id: str, entry: CachedIR) -> int:
+    """Write pending change records as one journal entry; compact when it grows too large."""
+    settings = get_settings()
+    state: JournalState = entry.journal
+    seq = state.seq + 1
+    data = _serialize({"seq": seq, "ir_version": entry.version, "changes": entry.pending})
+    _upload_json(_journal_path(document_id, seq), data)
+    metrics.inc("ir_bytes_written_total", len(data), kind="journal")
+    state.seq = seq
+    state.bytes += len(data)
+    _mark_pages(state, entry.pending)
+
+    if state.seq - state.snapshot_seq >= settings.ir_journal_max_entries or state.bytes >= settings.ir_journal_max_bytes:
+        start = time.perf_counter()
+        size, entry.journal = _write_snapshot(document_id, entry.ir, state)
+        metrics.observe("ir_journal_compaction_seconds", time.perf_counter() - start)
+        return size
+    return entry.size + len(data)
+
+
+def _stored_journal_state(document_id: str) -> JournalState | None:
+    """Journal state of the stored document, for saves that bypass the cache.
+
+    None if the document has no sharded snapshot yet. Entries already in
+    storage count towards `IR_JOURNAL_MAX_ENTRIES` but not towards
+    `IR_JOURNAL_MAX_BYTES`, and mark every page dirty for the next snapshot.
+    """
+    manifest = _stored_manifest(document_id)
+    if "shards" not in manifest:
+        return None
+    snapshot_seq = manifest.get("journal_seq", 0)
+    pending = [seq for seq in _list_journal(document_id) if seq > snapshot_seq]
+    return JournalState(
+        seq=pending[-1] if pending else snapshot_seq,
+        snapshot_seq=snapshot_seq,
+        shards=manifest["shards"],
+        dirty_pages=None if pending else set(),
+    )
+
+
+def _persist_ir(document_id: str, entry: CachedIR) -> int:
+    """Persist a dirty cache entry. Returns its approximate stored size in bytes."""
+    with tracing.span("persist_ir"):
+        if entry.rewrite or entry.journal is None:
+            size, entry.journal = _write_snapshot(document_id, entry.ir, None if entry.rewrite else entry.journal)
+            return size
+        if not entry.pending:
+            return entry.size
+        return _append_journal(document_id, entry)
+
+
+def _cache() -> IRCache | None:
+    if get_settings().ir_cache_max_bytes <= 0:
+        return None
+    return get_cache(_persist_ir)
+
+
+# ── Public API ──────────────────────────────────────────────────────
+
+def load_ir(document_id: str) -> dict:
+    """Load IR JSON (snapshot plus journal), from the in-process cache when possible."""
+    cache = _cache()
+    if cache is None:
+        with tracing.span("fetch_ir"):
+            return _fetch_ir(document_id)[0]
+    entry = cache.get(document_id)
+    if entry is None:
+        with tracing.span("fetch_ir"):
+            ir, size, state = _fetch_ir(document_id)
+        entry = cache.put(document_id, ir, size)
+        entry.journal = state
+    tracing.add("blocks", len(entry.ir.get("blocks", ())))
+    return entry.ir
+
+
+def ir_exists(document_id: str) -> bool:
+    """True if storage holds an IR for the document, sharded or as a legacy `ir.json`."""
+    names = storage.list_names(document_id)
+    if "ir.json" in names:
+        return True
+    return "ir" in names and "manifest.json" in storage.list_names(f"{document_id}/ir")
+
+
+def load_ir_pages(document_id: str, page_start: int | None, page_end: int | None) -> dict:
+    """Load only the blocks on pages `page_start`..`page_end` (inclusive).
+
+    Uses the cached IR when present; otherwise fetches just the matching page
+    shards. The partial IR is read-only and is not cached; its `stats` still
+    describe the whole document as of the last snapshot.
+    """
+    entry = cache_entry(document_id)
+    if entry is not None:
+        return load_ir(document_id)
+    pages = range(page_start if page_start is not None else 0, (page_end if page_end is not None else 10**9) + 1)
+    return _fetch_ir(document_id, pages)[0]
+
+
+def save_ir(document_id: str, ir: dict, changes: list[dict] | None = None) -> str:
+    """Save IR JSON. Returns the public URL of the sharded IR manifest.
+
+    `changes` are the records from `BlockIndex.drain_changes()` describing
+    how `ir` differs from the last saved version; they are appended to the
+    journal. Without them the whole IR is written as a new snapshot, after
+    giving blocks that share an order distinct ones (`ir_ops.unique_orders`),
+    since snapshots are read back page by page and re-sorted by order.
+
+    With the cache enabled the write is deferred to the write-behind
+    flusher; use `flush_ir` to persist immediately. With it disabled the
+    journal entry (or snapshot) is written before returning.
+    """
+    with tracing.span("save_ir"):
+        if changes is None:
+            if unique_orders(compact_blocks(ir.setdefault("blocks", []))):
+                entry = cache_entry(document_id)
+                if entry is not None:
+                    # The cached index still holds the old orders.
+                    entry.index = None
+        search_index.update(document_id, ir, changes)
+        cache = _cache()
+        if cache is None:
+            ir["ir_version"] = ir.get("ir_version", 0) + 1
+            state = _stored_journal_state(document_id) if changes is not None else None
+            if state is None:
+                _write_snapshot(document_id, ir, None)
+            elif changes:
+                _append_journal(document_id, CachedIR(ir, ir["ir_version"], 0, pending=changes, journal=state))
+        else:
+            cache.mark_dirty(document_id, ir, changes)
+    return storage.get_public_url(get_manifest_path(document_id))
+
+
+def write_ir_json(document_id: str) -> str:
+    """Write the current IR as a single `ir.json` object. Returns its public URL.
+
+    The sharded layout is the source of truth; this monolithic copy is
+    produced on demand for consumers that fetch `ir.json` directly.
+    """
+    with tracing.span("write_ir_json"):
+        with document_lock(document_id):
+            ir = load_ir(document_id)
+            # Plain JSON: this copy is read directly by clients
+            data = _serialize({key: value for key, value in ir.items() if key != "journal_seq"}, codec="json")
+        path = get_ir_storage_path(document_id)
+        _upload_json(path, data, codec="json")
+    return storage.get_public_url(path)
+
+
+def get_block_index(document_id: str, ir: dict) -> BlockIndex:
+    """Return the block index kept alongside a cached IR, building it if needed."""
+    entry = cache_entry(document_id)
+    index = entry.index if entry is not None else None
+    if index is None or not index.is_current(ir):
+        index = BlockIndex(ir)
+        if entry is not None and entry.ir is ir:
+            entry.index = index
+    return index
+
+
+_document_locks: dict[str, threading.RLock] = {}
+_document_locks_lock = threading.Lock()
+
+
+def document_lock(document_id: str) -> threading.RLock:
+    """Lock to hold while reading or mutating a loaded IR from a worker thread.
+
+    It is the same lock the write-behind flusher takes, so a document is
+    never serialized while a tool is changing it.
+    """
+    cache = _cache()
+    if cache is not None:
+        return cache.lock_for(document_id)
+    with _document_locks_lock:
+        return _document_locks.setdefault(document_id, threading.RLock())
+
+
+def cache_entry(document_id: str) -> CachedIR | None:
+    """The in-process cache entry for a document, if it is cached."""
+    cache = _cache()
+    return cache.peek(document_id) if cache is not None else None
+
+
+def flush_ir(document_id: str | None = None) -> None:
+    """Persist pending IR changes for one document (or all documents) now."""
+    cache = _cache()
+    if cache is None:
+        return
+    if document_id is None:
+        cache.flush_all()
+    else:
+        cache.flush(document_id)
+
+
+def discard_ir(document_id: str) -> None:
+    """Forget the cached copy of a document so the next load reads storage."""
+    cache = _cache()
+    if cache is not None:
+        cache.discard(document_id)
 
 
-def generate_block_id(content: str, block_type: str, order: int) -> str:
-    """Generate a deterministic block ID."""
-    raw = f"{content}:{block_type}:{order}"
-    return f"blk_{hashlib.sha256(raw.encode()).hexdigest()[:16]}"
+def ir_cache_stats() -> dict:
+    """Size, hit rate and dirty count of the in-process IR cache."""
+    cache = _cache()
+    return cache.stats() if cache is not None else {"enabled": False}
 
 
-def rewrite_asset_paths(ir: dict, url_map: dict[str, str]) -> dict:
+def rewrite_asset_paths(ir: dict, url_map: dict[str, str], images: dict[str, dict] | None = None) -> dict:
     """
     Replace local relative asset paths in the IR with public Supabase URLs.
 
     `url_map` is a mapping from relative path (e.g. 'assets/images/img_xxx.png')
-    to the full public URL.
+    to the full public URL. `images` maps image paths to the fields from
+    `image_assets.publish_images` (shared URL, content hash and variants),
+    which are merged into the block's `image_data`.
     """
+    images = images or {}
     for block in ir.get("blocks", []):
         # Rewrite image paths
         if block.get("image_data") and block["image_data"].get("extracted_path"):
             local_path = block["image_data"]["extracted_path"]
-            if local_path in url_map:
+            if local_path in images:
+                block["image_data"].update(images[local_path])
+            elif local_path in url_map:
                 block["image_data"]["extracted_path"] = url_map[local_path]
 
         # Rewrite table metadata if it references CSV files
@@ -0,0 +1,222 @@
+"""
+Compact in-memory block representation for LayoutIR MCP Server.
+
+A block parsed from JSON is a dict of a dozen keys plus nested dicts for
+its bbox and metadata, roughly 1.5 KB of Python objects per block before
+counting its text. `Block` keeps the same data in `__slots__`: the bbox as
+a packed `array('d')`, a metadata dict holding only a label as the label
+string, and the type and label strings interned. That is about a third
+of the memory.
+
+`Block` is a mutable mapping with the keys of the original dict, so code
+written against dict blocks (`block["order"]`, `block.get("type")`,
+`dict(block)`, `block.update(...)`) keeps working; plain dicts are only
+built when a block is serialized out (`to_dict`, `dict(block)`).
+Nested values rebuilt on access (`bbox`, a label-only `metadata`) are
+fresh dicts: replace them with `block[key] = ...` rather than mutating
+them in place.
+"""
+
+import copy
+import math
+import sys
+from array import array
+from collections.abc import MutableMapping
+
+
+FIELDS = (
+    "block_id", "type", "parent_id", "page_number", "bbox", "content", "metadata",
+    "table_data", "image_data", "level", "list_level", "order",
+)
+_FIELD_BITS = {name: 1 << i for i, name in enumerate(FIELDS)}
+_BBOX_KEYS = ("x0", "y0", "x1", "y1", "page_width", "page_height")
+_ABSENT = object()
+
+
+def _pack_bbox(value):
+    """Pack a standard bbox dict into an array; leave anything else as it is."""
+    if not isinstance(value, dict):
+        return value
+    keys = tuple(value)
+    if keys != _BBOX_KEYS and keys != _BBOX_KEYS[:4]:
+        return value
+    try:
+        return array("d", (math.nan if value[key] is None else value[key] for key in keys))
+    except TypeError:
+        return value
+
+
+def _unpack_bbox(value):
+    if not isinstance(value, array):
+        return value
+    return {key: None if math.isnan(number) else number for key, number in zip(_BBOX_KEYS, value)}
+
+
+def _pack_metadata(value):
+    if isinstance(value, dict) and len(value) == 1 and isinstance(value.get("label"), str):
+        return sys.intern(value["label"])
+    return value
+
+
+def _unpack_metadata(value):
+    return {"label": value} if isinstance(value, str) else value
+
+
+class Block(MutableMapping):
+    """One IR block stored compactly. Behaves like the dict it was built from."""
+
+    __slots__ = (
+        "block_id", "type", "parent_id", "page_number", "_bbox", "content", "_metadata",
+        "table_data", "image_data", "level", "list_level", "order", "_present", "_extra",
+    )
+
+    def __init__(self, data: dict | None = None):
+        self.block_id = self.type = self.parent_id = self.page_number = self._bbox = None
+        self.content = self._metadata = self.table_data = self.image_data = None
+        self.level = self.list_level = self.order = self._extra = None
+        present = 0
+        extra = None
+        for key, value in (data.items() if data else ()):
+            bit = _FIELD_BITS.get(key)
+            if bit is None:
+                if extra is None:
+                    extra = {}
+                extra[key] = value
+                continue
+            present |= bit
+            if key == "bbox":
+                self._bbox = _pack_bbox(value)
+            elif key == "metadata":
+                self._metadata = _pack_metadata(value)
+            elif key == "type" and isinstance(value, str):
+                self.type = sys.intern(value)
+            else:
+                setattr(self, key, value)
+        self._present = present
+        self._extra = extra
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Block":
+        return cls(data)
+
+    def _set_field(self, name: str, value) -> None:
+        if name == "bbox":
+            self._bbox = None if value is _ABSENT else _pack_bbox(value)
+        elif name == "metadata":
+            self._metadata = None if value is _ABSENT else _pack_metadata(value)
+        elif name == "type":
+            self.type = sys.intern(value) if isinstance(value, str) else (None if value is _ABSENT else value)
+        else:
+            setattr(self, name, None if value is _ABSENT else value)
+        if value is _ABSENT:
+            self._present &= ~_FIELD_BITS[name]
+        else:
+            self._present |= _FIELD_BITS[name]
+
+    def _get_field(self, name: str):
+        if name == "bbox":
+            return _unpack_bbox(self._bbox)
+        if name == "metadata":
+            return _unpack_metadata(self._metadata)
+        return getattr(self, name)
+
+    # ── Mapping protocol ──
+
+    def __getitem__(self, key):
+        bit = _FIELD_BITS.get(key)
+        if bit is not None:
+            if self._present & bit:
+                return self._get_field(key)
+        elif self._extra is not None and key in self._extra:
+            return self._extra[key]
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        bit = _FIELD_BITS.get(key)
+        if bit is not None:
+            return self._get_field(key) if self._present & bit else default
+        if self._extra is not None:
+            return self._extra.get(key, default)
+        return default
+
+    def __setitem__(self, key, value) -> None:
+        if key in _FIELD_BITS:
+            self._set_field(key, value)
+        else:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = value
+
+    def __delitem__(self, key) -> None:
+        if key in _FIELD_BITS:
+            if not self._present & _FIELD_BITS[key]:
+                raise KeyError(key)
+            self._set_field(key, _ABSENT)
+        elif self._extra is not None and key in self._extra:
+            del self._extra[key]
+        else:
+            raise KeyError(key)
+
+    def __contains__(self, key) -> bool:
+        bit = _FIELD_BITS.get(key)
+        if bit is not None:
+            return bool(self._present & bit)
+        return self._extra is not None and key in self._extra
+
+    def __iter__(self):
+        for name in FIELDS:
+            if self._present & _FIELD_BITS[name]:
+                yield name
+        if self._extra:
+            yield from self._extra
+
+    def __len__(self) -> int:
+        return self._present.bit_count() + (len(self._extra) if self._extra else 0)
+
+    def __repr__(self) -> str:
+        return f"Block({self.to_dict()!r})"
+
+    def fragment_key(self) -> tuple:
+        """`(content, type, level, label)` as used by `markdown_export`, without unpacking."""
+        present = self._present
+        metadata = self._metadata
+        if isinstance(metadata, str):
+            label = metadata
+        elif metadata:
+            label = metadata.get("label", "text")
+        else:
+            label = "text"
+        return (
+            (self.content if present & _FIELD_BITS["content"] else None) or "",
+            self.type if present & _FIELD_BITS["type"] else "paragraph",
+            self.level,
+            label,
+        )
+
+    # ── Conversion ──
+
+    def to_dict(self) -> dict:
+        """The block as a plain dict (nested values are shared, not copied)."""
+        return {key: self[key] for key in self}
+
+    def __copy__(self) -> "Block":
+        return Block(self.to_dict())
+
+    def __deepcopy__(self, memo) -> "Block":
+        return Block(copy.deepcopy(self.to_dict(), memo))
+
+    def __reduce__(self):
+        return Block, (self.to_dict(),)
+
+
+def compact_blocks(blocks: list) -> list:
+    """Convert dict blocks to `Block`s in place. Returns the same list."""
+    for i, block in enumerate(blocks):
+        if not isinstance(block, Block):
+            blocks[i] = Block(block)
+    return blocks
+
+
+def plain(block) -> dict:
+    """A deep, plain-dict copy of a block (for change records)."""
+    return copy.deepcopy(block.to_dict() if isinstance(block, Block) else block)
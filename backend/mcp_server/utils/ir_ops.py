@@ -0,0 +1,450 @@
+"""
+Block-level IR operations for LayoutIR MCP Server.
+
+Pure in-memory operations on IR dictionaries; persistence lives in
+`ir_helpers`.
+
+`BlockIndex` maps block_id → block and keeps a sorted list of `order` keys
+next to `ir["blocks"]`, so the edit tools find blocks in O(1) and positions
+in O(log n). Orders are spaced `ORDER_GAP` apart when the document is
+respaced, which lets a new block take the midpoint between its neighbours
+and a deleted block simply leave a gap: no other block is renumbered.
+`ir["blocks"]` stays sorted by `order`, so consumers that sort by `order`
+see the same sequence as before. Blocks are held as compact `ir_model.Block`
+mappings.
+
+Blocks created or changed by the edit tools carry a `manual` field
+("added" or "edited"), so `reconvert` can keep them when the pages they sit
+on are converted again.
+"""
+
+import copy
+import hashlib
+import json
+from bisect import bisect_left, bisect_right
+
+from mcp_server.utils.ir_model import Block, compact_blocks, plain
+
+
+ORDER_GAP = 1024
+
+
+def generate_block_id(content: str, block_type: str, order: int) -> str:
+    """Generate a deterministic block ID."""
+    raw = f"{content}:{block_type}:{order}"
+    return f"blk_{hashlib.sha256(raw.encode()).hexdigest()[:16]}"
+
+
+class BlockIndex:
+    """Index over one IR's blocks. All block edits must go through it.
+
+    Every mutation is also appended to `changes` as a small, replayable
+    record (see `replay`), which `ir_helpers.save_ir` persists to the
+    document's edit journal.
+    """
+
+    def __init__(self, ir: dict):
+        self.ir = ir
+        blocks = compact_blocks(ir.setdefault("blocks", []))
+        if any(blocks[i].get("order", 0) > blocks[i + 1].get("order", 0) for i in range(len(blocks) - 1)):
+            blocks.sort(key=lambda b: b.get("order", 0))
+        self.blocks = blocks
+        self.by_id = {block["block_id"]: block for block in blocks}
+        self.orders = [block.get("order", 0) for block in blocks]
+        self.changes: list[dict] = []
+
+    def drain_changes(self) -> list[dict]:
+        """Return and clear the change records made since the last call."""
+        changes, self.changes = self.changes, []
+        return changes
+
+    def is_current(self, ir: dict) -> bool:
+        """True if this index still describes `ir`."""
+        return self.ir is ir and ir.get("blocks") is self.blocks and len(self.blocks) == len(self.orders)
+
+    def get(self, block_id: str) -> dict | None:
+        return self.by_id.get(block_id)
+
+    def position(self, block: dict) -> int:
+        """Current list position of an indexed block."""
+        pos = bisect_left(self.orders, block.get("order", 0))
+        # Legacy IRs may contain duplicate orders; step to the exact block.
+        while self.blocks[pos] is not block:
+            pos += 1
+        return pos
+
+    def respace(self) -> None:
+        """Renumber every block to multiples of ORDER_GAP (only when a gap runs out)."""
+        for i, block in enumerate(self.blocks):
+            block["order"] = i * ORDER_GAP
+        self.orders = [block["order"] for block in self.blocks]
+        self.changes.append({"op": "respace"})
+
+    def order_after(self, ref_block: dict) -> int:
+        """An unused order key between `ref_block` and the block that follows it."""
+        pos = self.position(ref_block)
+        low = self.orders[pos]
+        high = self.orders[pos + 1] if pos + 1 < len(self.orders) else low + 2 * ORDER_GAP
+        if high - low < 2:
+            self.respace()
+            return self.order_after(ref_block)
+        return low + (high - low) // 2
+
+    def insert(self, block: dict) -> Block:
+        """Insert a block at the position given by its `order`. Returns the stored block.
+
+        To place it after a specific block, take the order from `order_after`.
+        Dict blocks are stored as compact `Block`s.
+        """
+        if not isinstance(block, Block):
+            block = Block(block)
+        pos = bisect_right(self.orders, block["order"])
+        self.blocks.insert(pos, block)
+        self.orders.insert(pos, block["order"])
+        self.by_id[block["block_id"]] = block
+        self._update_stats()
+        self.changes.append({"op": "add", "block": plain(block)})
+        return block
+
+    def remove(self, block: dict) -> None:
+        pos = self.position(block)
+        del self.blocks[pos]
+        del self.orders[pos]
+        del self.by_id[block["block_id"]]
+        self._update_stats()
+        self.changes.append({"op": "delete", "block_id": block["block_id"], "page": block.get("page_number")})
+
+    def update(self, block: dict, fields: dict) -> None:
+        """Set fields other than `block_id` and `order` on a block."""
+        block.update(fields)
+        self.changes.append({
+            "op": "edit",
+            "block_id": block["block_id"],
+            "page": block.get("page_number"),
+            "fields": copy.deepcopy(fields),
+        })
+
+    def _update_stats(self) -> None:
+        if "stats" in self.ir:
+            self.ir["stats"]["block_count"] = len(self.blocks)
+
+
+def unique_orders(blocks: list) -> bool:
+    """Sort blocks by order and renumber them to multiples of ORDER_GAP if any share an order.
+
+    LayoutIR numbers text blocks, tables and images separately, so a fresh
+    conversion has several blocks at each order; its list order breaks the
+    ties. Returns True if the orders were changed.
+    """
+    orders = [block.get("order", 0) for block in blocks]
+    if all(a < b for a, b in zip(orders, orders[1:])):
+        return False
+    blocks.sort(key=lambda b: b.get("order", 0))
+    for i, block in enumerate(blocks):
+        block["order"] = i * ORDER_GAP
+    return True
+
+
+def changed_pages(changes: list[dict]) -> set | None:
+    """Page numbers touched by change records, or None if every page changed."""
+    pages = set()
+    for change in changes:
+        if change["op"] == "respace":
+            return None
+        pages.add(change["block"].get("page_number") if change["op"] == "add" else change.get("page"))
+    return pages
+
+
+def replay(ir: dict, changes: list[dict], pages: range | None = None) -> dict:
+    """Re-apply change records produced by a `BlockIndex` to an IR.
+
+    Replay is idempotent: re-adding a block that already exists replaces it.
+    With `pages`, the IR holds only those pages and additions elsewhere are
+    skipped (callers must not pass records containing a respace).
+    """
+    index = BlockIndex(ir)
+    for change in changes:
+        kind = change["op"]
+        if kind == "add":
+            block = Block(copy.deepcopy(change["block"]))
+            if pages is not None and block.get("page_number") not in pages:
+                continue
+            existing = index.get(block["block_id"])
+            if existing is not None:
+                index.remove(existing)
+            index.insert(block)
+        elif kind == "respace":
+            index.respace()
+        else:
+            block = index.get(change["block_id"])
+            if block is None:
+                continue
+            if kind == "edit":
+                index.update(block, change["fields"])
+            elif kind == "delete":
+                index.remove(block)
+    return ir
+
+
+# ── Operations ──────────────────────────────────────────────────────
+
+def edit_block(
+    index: BlockIndex,
+    block_id: str,
+    content: str | None = None,
+    block_type: str | None = None,
+    metadata: dict | None = None,
+) -> dict:
+    """Update fields of a block in place. Raises KeyError if it does not exist."""
+    block = index.get(block_id)
+    if block is None:
+        raise KeyError(f"Block {block_id} not found")
+    fields = {}
+    if content is not None:
+        fields["content"] = content
+    if block_type is not None:
+        fields["type"] = block_type
+    if metadata is not None:
+        fields["metadata"] = metadata
+    if fields:
+        if block.get("manual") != "added":
+            fields["manual"] = "edited"
+        index.update(block, fields)
+    return block
+
+
+def insert_block_after(
+    index: BlockIndex,
+    after_block_id: str,
+    content: str,
+    block_type: str = "paragraph",
+    label: str = "text",
+) -> dict:
+    """Create a block after `after_block_id`. Raises KeyError if that block does not exist."""
+    ref_block = index.get(after_block_id)
+    if ref_block is None:
+        raise KeyError(f"Block {after_block_id} not found")
+
+    bbox = ref_block.get("bbox", {"x0": 0, "y0": 0, "x1": 0, "y1": 0, "page_width": None, "page_height": None})
+    new_order = index.order_after(ref_block)
+    new_block = {
+        "block_id": generate_block_id(content, block_type, new_order),
+        "type": block_type,
+        "parent_id": None,
+        "page_number": ref_block.get("page_number", 1),
+        "bbox": dict(bbox) if bbox else bbox,
+        "content": content,
+        "metadata": {"label": label},
+        "table_data": None,
+        "image_data": None,
+        "level": None,
+        "list_level": None,
+        "order": new_order,
+        "manual": "added",
+    }
+    return index.insert(new_block)
+
+
+def delete_block(index: BlockIndex, block_id: str) -> dict:
+    """Remove a block. Raises KeyError if it does not exist."""
+    block = index.get(block_id)
+    if block is None:
+        raise KeyError(f"Block {block_id} not found")
+    index.remove(block)
+    return block
+
+
+def move_block(index: BlockIndex, block_id: str, after_block_id: str) -> dict:
+    """Move a block directly after another one. Raises KeyError if either does not exist."""
+    block = index.get(block_id)
+    ref_block = index.get(after_block_id)
+    if block is None or ref_block is None:
+        raise KeyError(f"Block {block_id if block is None else after_block_id} not found")
+    if block is ref_block:
+        raise ValueError("A block cannot be moved after itself")
+    index.remove(block)
+    block["manual"] = block.get("manual") or "edited"
+    block["order"] = index.order_after(ref_block)
+    index.insert(block)
+    return block
+
+
+# ── Batches ─────────────────────────────────────────────────────────
+
+OPERATIONS = {"edit", "add", "delete", "move"}
+
+
+class OperationError(ValueError):
+    """A batch operation failed validation. Nothing has been applied."""
+
+    def __init__(self, position: int, message: str):
+        super().__init__(f"Operation {position}: {message}")
+        self.position = position
+
+
+def _ref(value: str, created: dict[str, str | None]) -> str:
+    """Resolve "$N" (the block added by operation N) to a block_id."""
+    return created.get(value) or value
+
+
+def validate_operations(index: BlockIndex, operations: list[dict]) -> list[dict]:
+    """
+    Check a batch against the current IR without modifying it.
+
+    Later operations may refer to a block added earlier in the same batch as
+    "$N", where N is the position of the `add` operation. Returns normalized
+    copies of the operations (metadata strings parsed to dicts). Raises
+    `OperationError` for the first invalid operation.
+    """
+    existing = set(index.by_id)
+    normalized = []
+
+    def require_block(position: int, op: dict, field: str) -> None:
+        value = op.get(field)
+        if not isinstance(value, str) or value not in existing:
+            raise OperationError(position, f"Block {value} not found")
+
+    for position, op in enumerate(operations):
+        if not isinstance(op, dict) or op.get("op") not in OPERATIONS:
+            raise OperationError(position, f"'op' must be one of {sorted(OPERATIONS)}")
+        op = dict(op)
+        kind = op["op"]
+
+        if kind == "edit":
+            require_block(position, op, "block_id")
+            if isinstance(op.get("metadata"), str):
+                try:
+                    op["metadata"] = json.loads(op["metadata"])
+                except json.JSONDecodeError as exc:
+                    raise OperationError(position, f"metadata is not valid JSON: {exc}") from exc
+            if op.get("metadata") is not None and not isinstance(op["metadata"], dict):
+                raise OperationError(position, "metadata must be an object")
+        elif kind == "add":
+            require_block(position, op, "after_block_id")
+            if not isinstance(op.get("content"), str):
+                raise OperationError(position, "content is required")
+            existing.add(f"${position}")
+        elif kind == "delete":
+            require_block(position, op, "block_id")
+            existing.discard(op["block_id"])
+        elif kind == "move":
+            require_block(position, op, "block_id")
+            require_block(position, op, "after_block_id")
+            if op["block_id"] == op["after_block_id"]:
+                raise OperationError(position, "A block cannot be moved after itself")
+
+        normalized.append(op)
+    return normalized
+
+
+def apply_operations(index: BlockIndex, operations: list[dict]) -> list[dict]:
+    """Apply validated operations in order. Returns one result per operation."""
+    created: dict[str, str | None] = {}
+    results = []
+
+    for position, op in enumerate(operations):
+        kind = op["op"]
+        if kind == "edit":
+            block_id = _ref(op["block_id"], created)
+            edit_block(index, block_id, op.get("content"), op.get("type"), op.get("metadata"))
+            results.append({"op": kind, "block_id": block_id})
+        elif kind == "add":
+            new_block = insert_block_after(
+                index,
+                _ref(op["after_block_id"], created),
+                op["content"],
+                op.get("block_type", "paragraph"),
+                op.get("label", "text"),
+            )
+            created[f"${position}"] = new_block["block_id"]
+            results.append({"op": kind, "block_id": new_block["block_id"]})
+        elif kind == "delete":
+            block_id = _ref(op["block_id"], created)
+            delete_block(index, block_id)
+            results.append({"op": kind, "block_id": block_id})
+        elif kind == "move":
+            block_id = _ref(op["block_id"], created)
+            block = move_block(index, block_id, _ref(op["after_block_id"], created))
+            results.append({"op": kind, "block_id": block_id, "order": block["order"]})
+
+    return results
+
+
+# ── Reads ───────────────────────────────────────────────────────────
+
+def _cursor_start(index: BlockIndex, cursor: str) -> int:
+    """Position of the first block after the one a `read_slice` cursor points at."""
+    ir_version = index.ir.get("ir_version", 0)
+    try:
+        version, order, block_id = cursor.split(":", 2)
+        version, order = int(version), int(order)
+    except ValueError:
+        raise ValueError(f"Invalid cursor {cursor!r}") from None
+    if version != ir_version:
+        raise ValueError(
+            f"The cursor was issued for IR version {version} but the document is at version {ir_version}; "
+            "start reading again without a cursor"
+        )
+    block = index.get(block_id)
+    if block is not None:
+        return index.position(block) + 1
+    # The block is outside the loaded pages (e.g. a different page range).
+    return bisect_right(index.orders, order)
+
+
+def read_slice(
+    index: BlockIndex,
+    page_start: int | None = None,
+    page_end: int | None = None,
+    block_types: list[str] | None = None,
+    fields: list[str] | None = None,
+    cursor: str | None = None,
+    max_blocks: int | None = None,
+    max_bytes: int | None = None,
+) -> dict:
+    """
+    Select, project and paginate blocks in document order.
+
+    Blocks are filtered by page range and type, reduced to `fields` (plus
+    `block_id`), and returned until `max_blocks` or `max_bytes` of
+    serialized block JSON is reached. `next_cursor` resumes after the last
+    returned block and is None when the selection is exhausted.
+
+    A cursor names the last returned block (blocks may share an order) and
+    the IR version it was issued for; after an edit the blocks may have
+    moved, so a cursor from another version raises ValueError, as does a
+    `max_blocks` below 1.
+    """
+    if max_blocks is not None and max_blocks < 1:
+        raise ValueError(f"max_blocks must be at least 1, got {max_blocks}")
+    ir_version = index.ir.get("ir_version", 0)
+    start = _cursor_start(index, cursor) if cursor else 0
+    wanted_types = set(block_types) if block_types else None
+    keep = ["block_id", *(f for f in fields if f != "block_id")] if fields else None
+
+    selected: list[dict] = []
+    payload_bytes = 0
+    last = None
+    next_cursor = None
+    for block in index.blocks[start:]:
+        page = block.get("page_number")
+        if page_start is not None and (page is None or page < page_start):
+            continue
+        if page_end is not None and (page is None or page > page_end):
+            continue
+        if wanted_types is not None and block.get("type") not in wanted_types:
+            continue
+
+        if max_blocks is not None and len(selected) >= max_blocks:
+            next_cursor = f"{ir_version}:{last.get('order', 0)}:{last['block_id']}"
+            break
+        projected = {name: block.get(name) for name in keep} if keep else dict(block)
+        size = len(json.dumps(projected, ensure_ascii=False))
+        if max_bytes is not None and selected and payload_bytes + size > max_bytes:
+            next_cursor = f"{ir_version}:{last.get('order', 0)}:{last['block_id']}"
+            break
+        selected.append(projected)
+        payload_bytes += size
+        last = block
+
+    return {"blocks": selected, "next_cursor": next_cursor, "payload_bytes": payload_bytes}
@@ -0,0 +1,263 @@
+"""
+Background conversion jobs for LayoutIR MCP Server.
+
+`submit_conversion` queues a job and returns its id at once; runner threads
+take jobs from a bounded priority queue and report progress (stage, pages
+done out of total) that `get_conversion_status` reads back. Every state
+change is written to a small JSON file under `JOBS_DIR`, so jobs that were
+queued or running when the server stopped are picked up again on restart.
+"""
+
+import heapq
+import itertools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Callable
+
+from mcp_server.utils import metrics
+from mcp_server.utils.config import get_settings
+
+
+logger = logging.getLogger(__name__)
+
+
+# Stages a job moves through, in order.
+STAGES = ("queued", "downloading", "parsing", "chunking", "writing", "uploading", "done")
+
+
+class QueueFullError(RuntimeError):
+    """Raised when the job queue already holds `JOBS_MAX_QUEUED` jobs."""
+
+
+@dataclass
+class Job:
+    """One conversion request and its progress."""
+
+    job_id: str
+    file_url: str
+    priority: int = 0
+    status: str = "queued"          # queued, running, done, failed
+    stage: str = "queued"
+    pages_done: int = 0
+    pages_total: int | None = None
+    document_id: str | None = None
+    result: dict | None = None
+    error: str | None = None
+    attempts: int = 0
+    created_at: float = field(default_factory=time.time)
+    updated_at: float = field(default_factory=time.time)
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("done", "failed")
+
+
+class JobStore:
+    """Job records as JSON files in a local directory."""
+
+    def __init__(self, directory: Path):
+        self.directory = directory
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, job_id: str) -> Path:
+        return self.directory / f"{job_id}.json"
+
+    def save(self, job: Job) -> None:
+        # Write then rename, so a crash never leaves a half-written record.
+        path = self._path(job.job_id)
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(asdict(job)), encoding="utf-8")
+        os.replace(tmp, path)
+
+    def delete(self, job_id: str) -> None:
+        self._path(job_id).unlink(missing_ok=True)
+
+    def load_all(self) -> list[Job]:
+        jobs = []
+        for path in self.directory.glob("*.json"):
+            try:
+                jobs.append(Job(**json.loads(path.read_text(encoding="utf-8"))))
+            except Exception:
+                logger.warning("Ignoring unreadable job record %s", path)
+        return jobs
+
+
+class JobQueue:
+    """Bounded priority queue of conversion jobs served by runner threads.
+
+    `handler(job, progress)` performs a conversion and returns its result
+    dict; it calls `progress(stage, **fields)` to update the job. Higher
+    `priority` runs first; equal priorities run in submission order.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[Job, Callable], dict],
+        store: JobStore,
+        max_queued: int,
+        runners: int,
+        retention: float,
+        max_attempts: int = 3,
+    ):
+        self.handler = handler
+        self.store = store
+        self.max_queued = max_queued
+        self.runners = runners
+        self.retention = retention
+        self.max_attempts = max_attempts
+        self._jobs: dict[str, Job] = {}
+        self._heap: list[tuple[int, int, str]] = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._threads: list[threading.Thread] = []
+
+    # ── Lifecycle ──
+
+    def start(self) -> None:
+        """Restore persisted jobs and start the runner threads."""
+        with self._cond:
+            if self._threads:
+                return
+            for job in sorted(self.store.load_all(), key=lambda j: j.created_at):
+                if job.finished:
+                    self._jobs[job.job_id] = job
+                    continue
+                self._jobs[job.job_id] = job
+                if job.attempts >= self.max_attempts:
+                    # Do not keep retrying a job that was running during every restart.
+                    job.status, job.error = "failed", f"Interrupted {job.attempts} times"
+                else:
+                    # Interrupted by a restart: run it again from the start.
+                    job.status, job.stage, job.pages_done = "queued", "queued", 0
+                    self._push(job)
+                self.store.save(job)
+            self._prune()
+            for i in range(self.runners):
+                thread = threading.Thread(target=self._run, name=f"conversion-job-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+            self._update_gauges()
+
+    # ── Public API ──
+
+    def submit(self, file_url: str, priority: int = 0) -> Job:
+        """Queue a conversion. Raises `QueueFullError` when the queue is full."""
+        with self._cond:
+            if len(self._heap) >= self.max_queued:
+                metrics.inc("conversion_jobs_rejected_total")
+                raise QueueFullError(f"Conversion job queue is full ({self.max_queued} waiting); try again shortly.")
+            job = Job(job_id=uuid.uuid4().hex, file_url=file_url, priority=priority)
+            self._jobs[job.job_id] = job
+            self.store.save(job)
+            self._push(job)
+            self._prune()
+            self._update_gauges()
+            self._cond.notify()
+        metrics.inc("conversion_jobs_total", status="submitted")
+        return job
+
+    def status(self, job_id: str) -> dict | None:
+        """A consistent copy of a job's fields, or None if it is unknown."""
+        with self._cond:
+            job = self._jobs.get(job_id)
+            return asdict(job) if job is not None else None
+
+    def position(self, job_id: str) -> int | None:
+        """1-based place of a queued job in the run order."""
+        with self._cond:
+            ordered = sorted(self._heap)
+            for i, (_, _, queued_id) in enumerate(ordered, start=1):
+                if queued_id == job_id:
+                    return i
+        return None
+
+    # ── Internals ──
+
+    def _push(self, job: Job) -> None:
+        heapq.heappush(self._heap, (-job.priority, next(self._seq), job.job_id))
+
+    def _update(self, job: Job, **fields) -> None:
+        with self._cond:
+            for key, value in fields.items():
+                setattr(job, key, value)
+            job.updated_at = time.time()
+            self.store.save(job)
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._heap:
+                    self._cond.wait()
+                _, _, job_id = heapq.heappop(self._heap)
+                job = self._jobs[job_id]
+                self._update_gauges()
+            self._execute(job)
+
+    def _execute(self, job: Job) -> None:
+        self._update(job, status="running", attempts=job.attempts + 1)
+        metrics.observe("conversion_job_wait_seconds", time.time() - job.created_at)
+        start = time.perf_counter()
+
+        def progress(stage: str, **fields) -> None:
+            self._update(job, stage=stage, **fields)
+
+        try:
+            result = self.handler(job, progress)
+        except Exception as exc:
+            if sys.is_finalizing():
+                # The server is stopping; leave the job to be resumed on restart.
+                return
+            logger.exception("Conversion job %s failed", job.job_id)
+            self._update(job, status="failed", error=str(exc) or type(exc).__name__)
+            metrics.inc("conversion_jobs_total", status="failed")
+            return
+        finally:
+            metrics.observe("conversion_job_seconds", time.perf_counter() - start)
+
+        self._update(
+            job,
+            status="done",
+            stage="done",
+            result=result,
+            document_id=result.get("document_id"),
+            pages_done=job.pages_total or job.pages_done,
+        )
+        metrics.inc("conversion_jobs_total", status="done")
+
+    def _prune(self) -> None:
+        """Forget finished jobs older than the retention period (caller holds the lock)."""
+        cutoff = time.time() - self.retention
+        for job_id, job in list(self._jobs.items()):
+            if job.finished and job.updated_at < cutoff:
+                del self._jobs[job_id]
+                self.store.delete(job_id)
+
+    def _update_gauges(self) -> None:
+        metrics.set_gauge("conversion_jobs_queued", len(self._heap))
+
+
+_queue: JobQueue | None = None
+_queue_lock = threading.Lock()
+
+
+def get_jobs(handler: Callable[[Job, Callable], dict]) -> JobQueue:
+    """Singleton job queue. `handler` is only used when the queue is first created."""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            settings = get_settings()
+            _queue = JobQueue(
+                handler=handler,
+                store=JobStore(Path(settings.jobs_dir)),
+                max_queued=settings.jobs_max_queued,
+                runners=settings.jobs_runners,
+                retention=settings.jobs_retention,
+            )
+        return _queue
@@ -0,0 +1,245 @@
+"""
+LayoutIR calls made by the conversion workers, in one place.
+
+LayoutIR's public API converts whole documents (`Pipeline.process`).
+Page-range conversion (see `page_ranges`) also needs the pipeline's
+individual stages and the `page_range` option of the Docling converter
+inside `DoclingAdapter`, none of which are public. They are used only when
+present, as in the LayoutIR version pinned in pyproject.toml
+(`TESTED_VERSION`); with a LayoutIR that lacks them, documents are converted
+whole and `convert_pages` keeps the requested pages of a whole conversion.
+"""
+
+import inspect
+import logging
+import shutil
+import tempfile
+from pathlib import Path
+
+
+logger = logging.getLogger(__name__)
+
+
+TESTED_VERSION = "1.0.3"
+
+# Private Pipeline methods that page-range conversion runs one by one.
+_STAGES = (
+    "_stage_extract",
+    "_stage_normalize",
+    "_stage_chunk",
+    "_create_output_structure",
+    "_stage_write_assets",
+    "_stage_export",
+    "_stage_write_ir_and_manifest",
+)
+
+
+class RangesUnsupported(RuntimeError):
+    """Raised when the installed LayoutIR cannot convert a page range."""
+
+
+def build_pipeline(settings: dict):
+    """Create a Pipeline and, where LayoutIR allows it, load the Docling models now."""
+    from layoutir import Pipeline
+    from layoutir.adapters import DoclingAdapter
+    from layoutir.chunking import SemanticSectionChunker
+
+    adapter = DoclingAdapter(use_gpu=settings["use_gpu"])
+    pipeline = Pipeline(
+        adapter=adapter,
+        chunk_strategy=SemanticSectionChunker(max_heading_level=settings["max_heading_level"]),
+    )
+
+    # DoclingAdapter defers building its DocumentConverter until the first
+    # parse, and the converter defers loading the PDF models in turn.
+    if hasattr(adapter, "_init_docling"):
+        adapter._init_docling()
+    converter = getattr(adapter, "_pipeline", None)
+    if hasattr(converter, "initialize_pipeline"):
+        from docling.datamodel.base_models import InputFormat
+        converter.initialize_pipeline(InputFormat.PDF)
+
+    return pipeline
+
+
+def supports_ranges(pipeline=None) -> bool:
+    """True if LayoutIR (and `pipeline`'s converter, when given) can convert page ranges.
+
+    Without a pipeline only the LayoutIR classes are checked, which does not
+    import Docling.
+    """
+    try:
+        from layoutir import Pipeline
+    except ImportError:
+        return False
+    if not all(hasattr(Pipeline, name) for name in _STAGES):
+        return False
+    if pipeline is None:
+        return True
+    convert = getattr(getattr(pipeline.adapter, "_pipeline", None), "convert", None)
+    if convert is None:
+        return False
+    try:
+        return "page_range" in inspect.signature(convert).parameters
+    except (TypeError, ValueError):
+        return False
+
+
+# ── Conversion ──────────────────────────────────────────────────────
+
+def convert(pipeline, input_path: Path, output_dir: Path):
+    """Convert a whole document and write every output (public API)."""
+    return pipeline.process(input_path=Path(input_path), output_dir=Path(output_dir))
+
+
+def convert_range(pipeline, input_path: Path, first_page: int, last_page: int):
+    """Parse and normalize pages `first_page`..`last_page` into a partial `Document`.
+
+    Raises `RangesUnsupported` when the installed LayoutIR cannot do it.
+    """
+    if not supports_ranges(pipeline):
+        raise RangesUnsupported(f"LayoutIR {_version()} cannot convert page ranges (tested with {TESTED_VERSION})")
+    parsed = pipeline.adapter._pipeline.convert(str(input_path), page_range=(first_page, last_page))
+    raw_doc = pipeline._stage_extract(parsed)
+    return pipeline._stage_normalize(Path(input_path), raw_doc)
+
+
+def assemble(pipeline, input_path: Path, output_dir: Path, parts: list, page_count: int):
+    """Merge partial documents, then chunk and write every output like `Pipeline.process`."""
+    document = merge_documents(parts, Path(input_path), page_count)
+    chunks = pipeline._stage_chunk(document)
+    doc_dir = pipeline._create_output_structure(Path(output_dir), document)
+    pipeline._stage_write_assets(document, doc_dir)
+    pipeline._stage_export(document, chunks, doc_dir)
+    pipeline._stage_write_ir_and_manifest(document, chunks, doc_dir)
+    return document
+
+
+def merge_documents(parts: list, input_path: Path, page_count: int):
+    """Merge per-range `Document`s (in page order) into one document.
+
+    LayoutIR numbers text blocks, tables and images separately, from 0 in
+    each range. Each part's numbers are offset by the blocks of the same kind
+    in the parts before it, and block, table and image IDs are derived from
+    them with LayoutIR's ID functions, so the merged document gets the orders
+    and IDs of a single-process conversion. That holds as long as Docling
+    extracts the same items from a page range as from the whole document,
+    which it does not promise: an item split across a range boundary, or a
+    block type LayoutIR maps to "paragraph", gets a different ID than a
+    single-process conversion would give it.
+    """
+    from layoutir.schema import BlockType
+    from layoutir.utils.hashing import generate_block_id, generate_image_id, generate_table_id
+
+    first = parts[0]
+    kinds: dict[str, list] = {"text": [], "table": [], "image": []}
+    for part in parts:
+        offsets = {kind: len(blocks) for kind, blocks in kinds.items()}
+        for block in sorted(part.blocks, key=lambda b: b.order):
+            kind = "table" if block.type == BlockType.TABLE else "image" if block.type == BlockType.IMAGE else "text"
+            block.order += offsets[kind]
+            block.parent_id = None
+            if kind == "table" and block.table_data is not None:
+                table_id = generate_table_id(first.document_id, block.page_number, block.order, block.table_data.raw_text)
+                block.table_data.table_id = table_id
+                block.metadata["table_id"] = table_id
+            elif kind == "image" and block.image_data is not None and block.metadata.get("image_bytes") is not None:
+                image_id = generate_image_id(first.document_id, block.page_number, block.order, block.metadata["image_bytes"])
+                if not block.image_data.caption:
+                    block.content = f"[Image {image_id}]"
+                block.image_data.image_id = image_id
+                block.metadata["image_id"] = image_id
+            block.block_id = generate_block_id(
+                content=block.content,
+                page_number=block.page_number,
+                order=block.order,
+                block_type=kind if kind != "text" else block.type.value,
+            )
+            kinds[kind].append(block)
+
+    # Same order as LayoutIR's Normalizer: text, tables, images, then a stable sort.
+    blocks = sorted(kinds["text"] + kinds["table"] + kinds["image"], key=lambda b: b.order)
+
+    stats = dict(first.stats)
+    for key in ("table_count", "image_count"):
+        stats[key] = sum(part.stats.get(key, 0) for part in parts)
+    stats["block_count"] = len(blocks)
+    stats["page_count"] = page_count
+
+    return first.model_copy(update={
+        "metadata": first.metadata.model_copy(update={"page_count": page_count}),
+        "blocks": blocks,
+        "relationships": _heading_relationships(blocks),
+        "stats": stats,
+    })
+
+
+def _heading_relationships(blocks: list) -> list:
+    """Parent every block to the nearest preceding heading of a lower level, like LayoutIR's Normalizer.
+
+    The parent may sit in an earlier range, so this runs on the merged blocks.
+    """
+    from layoutir.schema import BlockType, Relationship
+
+    relationships = []
+    headings: list[tuple[str, int]] = []
+    for block in blocks:
+        if block.type == BlockType.HEADING and block.level:
+            while headings and headings[-1][1] >= block.level:
+                headings.pop()
+            if headings:
+                block.parent_id = headings[-1][0]
+            headings.append((block.block_id, block.level))
+        elif headings:
+            block.parent_id = headings[-1][0]
+        if block.parent_id is not None:
+            relationships.append(Relationship(
+                source_block_id=block.parent_id, target_block_id=block.block_id, relation_type="parent_child",
+            ))
+    return relationships
+
+
+def convert_pages(pipeline, input_path: Path, first_page: int, last_page: int, output_dir: Path) -> list[dict]:
+    """Blocks on pages `first_page`..`last_page` as JSON-ready dicts, with their assets in `output_dir`.
+
+    Asset paths are relative to `output_dir`.
+    """
+    output_dir = Path(output_dir)
+    if supports_ranges(pipeline):
+        document = convert_range(pipeline, input_path, first_page, last_page)
+        pipeline._stage_write_assets(document, output_dir)
+        return document.model_dump(mode="json")["blocks"]
+
+    logger.warning("LayoutIR %s cannot convert page ranges; converting the whole document", _version())
+    output_dir.mkdir(parents=True, exist_ok=True)
+    with tempfile.TemporaryDirectory(dir=output_dir) as tmp:
+        document = convert(pipeline, input_path, Path(tmp))
+        doc_dir = Path(tmp) / document.document_id
+        blocks = [
+            block for block in document.model_dump(mode="json")["blocks"]
+            if first_page <= (block.get("page_number") or 0) <= last_page
+        ]
+        for block in blocks:
+            for relative in _asset_paths(block):
+                source = doc_dir / relative
+                if source.is_file():
+                    (output_dir / relative).parent.mkdir(parents=True, exist_ok=True)
+                    shutil.move(source, output_dir / relative)
+    return blocks
+
+
+def _asset_paths(block: dict) -> list[str]:
+    paths = []
+    if (block.get("image_data") or {}).get("extracted_path"):
+        paths.append(block["image_data"]["extracted_path"])
+    if block.get("table_data") and (block.get("metadata") or {}).get("table_id"):
+        paths.append(f"assets/tables/{block['metadata']['table_id']}.csv")
+    return paths
+
+
+def _version() -> str:
+    try:
+        import layoutir
+    except ImportError:
+        return "(not installed)"
+    return getattr(layoutir, "__version__", "unknown")
@@ -0,0 +1,128 @@
+"""
+Markdown export for LayoutIR MCP Server.
+
+Each block renders to one Markdown fragment. Fragments are cached by the
+block fields that determine them (content, type, level and label), so an
+export after a few edits only renders the blocks that changed; unchanged
+blocks, including those of other documents with identical text, reuse the
+cached fragment. The SHA-256 of the last uploaded export is remembered per
+document and the upload is skipped when the output has not changed.
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from mcp_server.utils import metrics
+from mcp_server.utils.config import get_settings
+from mcp_server.utils.ir_model import Block
+
+
+EXPORT_PATH = "exports/markdown/full_document.md"
+
+# Documents whose last upload hash is remembered.
+MAX_TRACKED_DOCUMENTS = 4096
+
+
+@dataclass
+class MarkdownExport:
+    markdown: str
+    sha256: str
+    rendered_blocks: int = 0
+    cached_blocks: int = 0
+
+
+def _fragment_key(block: dict) -> tuple:
+    if isinstance(block, Block):
+        # Read the slots directly instead of rebuilding the metadata dict.
+        return block.fragment_key()
+    metadata = block.get("metadata") or {}
+    return (block.get("content") or "", block.get("type", "paragraph"), block.get("level"), metadata.get("label", "text"))
+
+
+def render_fragment(content: str, block_type: str, level: int | None, label: str) -> str | None:
+    """Markdown for one block, or None for blocks without text."""
+    content = content.strip()
+    if not content:
+        return None
+    if block_type == "heading" or label == "section_header":
+        return f"{'#' * min(level or 1, 6)} {content}\n"
+    if block_type == "list" or label == "list_item":
+        return f"- {content}"
+    return f"{content}\n"
+
+
+class FragmentCache:
+    """LRU of rendered fragments keyed by `(content, type, level, label)`."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._fragments: OrderedDict[tuple, str | None] = OrderedDict()
+        self._uploaded: OrderedDict[str, str] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def render(self, blocks: list[dict]) -> MarkdownExport:
+        """Render blocks (already in document order) to one Markdown string."""
+        parts = []
+        rendered = cached = 0
+        missing = object()
+        for block in blocks:
+            key = _fragment_key(block)
+            with self._lock:
+                fragment = self._fragments.get(key, missing)
+                if fragment is not missing:
+                    self._fragments.move_to_end(key)
+            if fragment is missing:
+                fragment = render_fragment(*key)
+                rendered += 1
+                self._remember(key, fragment)
+            else:
+                cached += 1
+            if fragment is not None:
+                parts.append(fragment)
+
+        markdown = "\n".join(parts)
+        metrics.inc("markdown_fragments_total", rendered, result="rendered")
+        metrics.inc("markdown_fragments_total", cached, result="cached")
+        return MarkdownExport(
+            markdown=markdown,
+            sha256=hashlib.sha256(markdown.encode("utf-8")).hexdigest(),
+            rendered_blocks=rendered,
+            cached_blocks=cached,
+        )
+
+    def _remember(self, key: tuple, fragment: str | None) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._fragments[key] = fragment
+            while len(self._fragments) > self.max_entries:
+                self._fragments.popitem(last=False)
+
+    # ── Upload tracking ──
+
+    def is_uploaded(self, document_id: str, sha256: str) -> bool:
+        """True if this exact export was the last one uploaded for the document."""
+        with self._lock:
+            return self._uploaded.get(document_id) == sha256
+
+    def mark_uploaded(self, document_id: str, sha256: str) -> None:
+        with self._lock:
+            self._uploaded[document_id] = sha256
+            self._uploaded.move_to_end(document_id)
+            while len(self._uploaded) > MAX_TRACKED_DOCUMENTS:
+                self._uploaded.popitem(last=False)
+
+
+_cache: FragmentCache | None = None
+_cache_lock = threading.Lock()
+
+
+def get_fragment_cache() -> FragmentCache:
+    """Singleton fragment cache sized from settings."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = FragmentCache(get_settings().markdown_fragment_cache_entries)
+        return _cache
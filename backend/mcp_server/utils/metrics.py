@@ -0,0 +1,168 @@
+"""
+In-process metrics for LayoutIR MCP Server.
+
+A small thread-safe registry of counters, gauges and histograms. Values
+are keyed by metric name plus an optional set of labels and can be read
+back in the Prometheus text format or as a JSON-friendly snapshot (both
+served on `/metrics`).
+
+Observations go into fixed histogram buckets: latency buckets for metrics
+named `*_seconds`, powers of four (sizes and counts) for everything else.
+"""
+
+import math
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+
+PREFIX = "layoutir_"
+
+LATENCY_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 900.0,
+)
+SIZE_BUCKETS = tuple(float(4 ** i) for i in range(16))
+
+_lock = threading.Lock()
+_counters: dict[tuple, float] = {}
+_gauges: dict[tuple, float] = {}
+_summaries: dict[tuple, dict] = {}
+
+
+def buckets_for(name: str) -> tuple[float, ...]:
+    return LATENCY_BUCKETS if name.endswith("_seconds") else SIZE_BUCKETS
+
+
+def _key(name: str, labels: dict[str, str]) -> tuple:
+    return (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+
+
+def inc(name: str, value: float = 1.0, **labels: str) -> None:
+    """Increment a counter."""
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0.0) + value
+
+
+def set_gauge(name: str, value: float, **labels: str) -> None:
+    """Set a gauge to an absolute value."""
+    with _lock:
+        _gauges[_key(name, labels)] = value
+
+
+def observe(name: str, value: float, **labels: str) -> None:
+    """Record one observation (a duration in seconds, a size, a count)."""
+    key = _key(name, labels)
+    buckets = buckets_for(name)
+    with _lock:
+        summary = _summaries.get(key)
+        if summary is None:
+            summary = _summaries[key] = {
+                "count": 0, "sum": 0.0, "min": value, "max": value, "buckets": [0] * len(buckets),
+            }
+        summary["count"] += 1
+        summary["sum"] += value
+        summary["min"] = min(summary["min"], value)
+        summary["max"] = max(summary["max"], value)
+        for i, bound in enumerate(buckets):
+            if value <= bound:
+                summary["buckets"][i] += 1
+                break
+
+
+@contextmanager
+def timed(name: str, **labels: str):
+    """Context manager that observes the wall time of its body."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start, **labels)
+
+
+def _render(store: dict[tuple, object]) -> dict[str, list[dict]]:
+    out: dict[str, list[dict]] = {}
+    for (name, labels), value in sorted(store.items()):
+        entry = {"labels": dict(labels)}
+        if isinstance(value, dict):
+            entry.update(value)
+            entry["avg"] = value["sum"] / value["count"]
+            entry["buckets"] = dict(zip(map(str, buckets_for(name)), value["buckets"]))
+        else:
+            entry["value"] = value
+        out.setdefault(name, []).append(entry)
+    return out
+
+
+def snapshot() -> dict:
+    """Return all metrics as plain dictionaries."""
+    with _lock:
+        return {
+            "counters": _render(_counters),
+            "gauges": _render(_gauges),
+            "summaries": _render({k: dict(v) for k, v in _summaries.items()}),
+        }
+
+
+# ── Prometheus exposition ───────────────────────────────────────────
+
+_INVALID_NAME = re.compile(r"[^a-zA-Z0-9_:]")
+
+
+def _metric_name(name: str) -> str:
+    return PREFIX + _INVALID_NAME.sub("_", name)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(labels: tuple, extra: tuple = ()) -> str:
+    pairs = [*labels, *extra]
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{_INVALID_NAME.sub("_", k)}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _number(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+def render_prometheus() -> str:
+    """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+    with _lock:
+        counters = sorted(_counters.items())
+        gauges = sorted(_gauges.items())
+        histograms = sorted((k, dict(v, buckets=list(v["buckets"]))) for k, v in _summaries.items())
+
+    lines: list[str] = []
+    typed: set[str] = set()
+
+    def header(name: str, kind: str) -> None:
+        if name not in typed:
+            typed.add(name)
+            lines.append(f"# TYPE {name} {kind}")
+
+    for (name, labels), value in counters:
+        metric = _metric_name(name)
+        header(metric, "counter")
+        lines.append(f"{metric}{_labels(labels)} {_number(value)}")
+    for (name, labels), value in gauges:
+        metric = _metric_name(name)
+        header(metric, "gauge")
+        lines.append(f"{metric}{_labels(labels)} {_number(value)}")
+    for (name, labels), value in histograms:
+        metric = _metric_name(name)
+        header(metric, "histogram")
+        cumulative = 0
+        for bound, count in zip(buckets_for(name), value["buckets"]):
+            cumulative += count
+            lines.append(f"{metric}_bucket{_labels(labels, (('le', _number(bound)),))} {cumulative}")
+        lines.append(f"{metric}_bucket{_labels(labels, (('le', '+Inf'),))} {value['count']}")
+        lines.append(f"{metric}_sum{_labels(labels)} {_number(value['sum'])}")
+        lines.append(f"{metric}_count{_labels(labels)} {value['count']}")
+    return "\n".join(lines) + "\n"
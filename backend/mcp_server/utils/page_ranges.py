@@ -0,0 +1,90 @@
+"""
+Page-range splitting for LayoutIR MCP Server.
+
+Large PDFs are converted as several page ranges in parallel worker
+processes (see `workers.ConversionPool`), then merged back into one
+document by `layoutir_adapter.merge_documents` and chunked and exported
+exactly as a single-process conversion would be.
+
+`page_fingerprints` hashes every page of a PDF so that a revised file can be
+compared page by page with the one converted before (see `reconvert`).
+"""
+
+import hashlib
+from pathlib import Path
+
+
+def count_pages(path: Path) -> int | None:
+    """Page count of a PDF, when pypdfium2 (installed with Docling) is available."""
+    try:
+        import pypdfium2
+    except ImportError:
+        return None
+    try:
+        pdf = pypdfium2.PdfDocument(str(path))
+        try:
+            return len(pdf)
+        finally:
+            pdf.close()
+    except Exception:
+        return None
+
+
+def page_fingerprints(path: Path) -> list[str] | None:
+    """SHA-256 of each page's text, size and objects (image data included).
+
+    Returns None when pypdfium2 is unavailable or the file cannot be read.
+    """
+    try:
+        import pypdfium2
+        import pypdfium2.raw as pdfium_c
+    except ImportError:
+        return None
+    try:
+        pdf = pypdfium2.PdfDocument(str(path))
+    except Exception:
+        return None
+    try:
+        fingerprints = []
+        for page in pdf:
+            digest = hashlib.sha256()
+            width, height = page.get_size()
+            digest.update(f"{width:.1f}x{height:.1f}\n".encode())
+            textpage = page.get_textpage()
+            digest.update(textpage.get_text_range().encode("utf-8", "surrogatepass"))
+            textpage.close()
+            for obj in page.get_objects():
+                bounds = ",".join(f"{value:.1f}" for value in obj.get_bounds())
+                digest.update(f"\n{obj.type}:{bounds}".encode())
+                if obj.type == pdfium_c.FPDF_PAGEOBJ_IMAGE:
+                    try:
+                        digest.update(hashlib.sha256(obj.get_data(decode_simple=False)).digest())
+                    except Exception:
+                        pass
+            page.close()
+            fingerprints.append(digest.hexdigest())
+        return fingerprints
+    except Exception:
+        return None
+    finally:
+        pdf.close()
+
+
+def group_pages(pages: list[int]) -> list[tuple[int, int]]:
+    """Collapse page numbers into inclusive runs of consecutive pages."""
+    runs: list[tuple[int, int]] = []
+    for page in sorted(set(pages)):
+        if runs and runs[-1][1] == page - 1:
+            runs[-1] = (runs[-1][0], page)
+        else:
+            runs.append((page, page))
+    return runs
+
+
+def plan_ranges(page_count: int, range_pages: int) -> list[tuple[int, int]]:
+    """Split pages 1..page_count into inclusive ranges of `range_pages` pages."""
+    range_pages = max(range_pages, 1)
+    return [
+        (first, min(first + range_pages - 1, page_count))
+        for first in range(1, page_count + 1, range_pages)
+    ]
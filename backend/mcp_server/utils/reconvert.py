@@ -0,0 +1,246 @@
+"""
+Incremental re-conversion for LayoutIR MCP Server.
+
+Every conversion stores one fingerprint per page next to the IR
+(`fingerprints.json`, see `page_ranges.page_fingerprints`). When a revised
+file is re-converted, its pages are matched against the stored ones with a
+sequence diff, so inserted or removed pages do not shift the comparison:
+matching pages keep their blocks as they are (block_ids and edits
+included) and only changed or new pages go through the pipeline.
+
+Fresh blocks are spliced in page order. A manually edited block on a
+changed page replaces the fresh block it overlaps most; a manually added
+block follows the block it was added after (or keeps its relative place
+on the page when that block is gone).
+"""
+
+import difflib
+import json
+import logging
+from dataclasses import dataclass, field
+
+from mcp_server.utils import storage
+from mcp_server.utils.ir_ops import ORDER_GAP, generate_block_id
+
+
+logger = logging.getLogger(__name__)
+
+
+FINGERPRINTS_FILE = "fingerprints.json"
+
+# Minimum bounding-box overlap (intersection over union) for an edited block
+# to take the place of a freshly converted one.
+MATCH_IOU = 0.5
+
+
+# ── Fingerprints ────────────────────────────────────────────────────
+
+def get_fingerprints_path(document_id: str) -> str:
+    return f"{document_id}/{FINGERPRINTS_FILE}"
+
+
+def save_fingerprints(document_id: str, source_sha256: str, pages: list[str]) -> None:
+    """Store the page fingerprints of the file a document was converted from."""
+    data = {"sha256": source_sha256, "pages": pages}
+    storage.upload_text(get_fingerprints_path(document_id), json.dumps(data), content_type="application/json")
+
+
+def load_fingerprints(document_id: str) -> dict | None:
+    """The stored `{"sha256", "pages"}` record, or None for documents converted without one."""
+    try:
+        return json.loads(storage.download_bytes(get_fingerprints_path(document_id)))
+    except Exception:
+        return None
+
+
+# ── Page plan ───────────────────────────────────────────────────────
+
+@dataclass
+class PagePlan:
+    """How the pages of the previous file map onto the revised one (1-based)."""
+
+    unchanged: dict[int, int] = field(default_factory=dict)   # old page → same page in the new file
+    replaced: dict[int, int] = field(default_factory=dict)    # old page → new page that supersedes it
+    removed: list[int] = field(default_factory=list)          # old pages with no counterpart
+    convert: list[int] = field(default_factory=list)          # new pages to run through the pipeline
+
+
+def plan_pages(old: list[str | None], new: list[str]) -> PagePlan:
+    """Diff two fingerprint lists. Unknown old fingerprints (None) never match."""
+    plan = PagePlan()
+    matcher = difflib.SequenceMatcher(a=old, b=new, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            for k in range(i2 - i1):
+                plan.unchanged[i1 + k + 1] = j1 + k + 1
+        elif tag == "delete":
+            plan.removed.extend(range(i1 + 1, i2 + 1))
+        else:
+            plan.convert.extend(range(j1 + 1, j2 + 1))
+            # Old pages of a replaced run hand their edits to the page at the
+            # same offset in the new run (the last one if the run shrank).
+            for k in range(i2 - i1):
+                plan.replaced[i1 + k + 1] = j1 + 1 + min(k, j2 - j1 - 1)
+    return plan
+
+
+# ── Splice ──────────────────────────────────────────────────────────
+
+@dataclass
+class SpliceResult:
+    kept_blocks: int = 0
+    fresh_blocks: int = 0
+    kept_edits: int = 0
+    dropped_edits: int = 0
+
+
+def _iou(a: dict | None, b: dict | None) -> float:
+    if not a or not b:
+        return 0.0
+    try:
+        ax0, ax1 = sorted((a["x0"], a["x1"]))
+        ay0, ay1 = sorted((a["y0"], a["y1"]))
+        bx0, bx1 = sorted((b["x0"], b["x1"]))
+        by0, by1 = sorted((b["y0"], b["y1"]))
+    except (KeyError, TypeError):
+        return 0.0
+    width = min(ax1, bx1) - max(ax0, bx0)
+    height = min(ay1, by1) - max(ay0, by0)
+    if width <= 0 or height <= 0:
+        return 0.0
+    inter = width * height
+    union = (ax1 - ax0) * (ay1 - ay0) + (bx1 - bx0) * (by1 - by0) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def _merge_page(fresh: list[dict], carried: list[tuple[dict, str | None, float]], result: SpliceResult) -> list[dict]:
+    """Lay edited and added blocks from superseded pages over a page's fresh blocks.
+
+    `carried` holds `(block, previous_block_id, relative_position)` in the
+    old document order.
+    """
+    page = list(fresh)
+    added = []
+    for block, previous_id, position in carried:
+        if block.get("manual") == "added":
+            added.append((block, previous_id, position))
+            continue
+        best, best_score = None, MATCH_IOU
+        for i, candidate in enumerate(page):
+            if candidate.get("manual"):
+                continue
+            score = _iou(block.get("bbox"), candidate.get("bbox"))
+            if score >= best_score:
+                best, best_score = i, score
+        if best is None:
+            page.append(block)
+        else:
+            page[best] = block
+        result.kept_edits += 1
+
+    for block, previous_id, position in added:
+        ids = [b["block_id"] for b in page]
+        if previous_id in ids:
+            page.insert(ids.index(previous_id) + 1, block)
+        else:
+            page.insert(round(position * len(page)), block)
+        result.kept_edits += 1
+    return page
+
+
+def _link_headings(blocks: list[dict]) -> list[dict]:
+    """Set each block's parent to the nearest preceding higher-level heading.
+
+    Same rules as LayoutIR's normalizer; returns the parent/child relationships.
+    """
+    relationships = []
+    stack: list[tuple[str, int]] = []
+    for block in blocks:
+        block["parent_id"] = None
+        level = block.get("level")
+        if block.get("type") == "heading" and level:
+            while stack and stack[-1][1] >= level:
+                stack.pop()
+            if stack:
+                block["parent_id"] = stack[-1][0]
+            stack.append((block["block_id"], level))
+        elif stack:
+            block["parent_id"] = stack[-1][0]
+        if block["parent_id"] is not None:
+            relationships.append({
+                "source_block_id": block["parent_id"],
+                "target_block_id": block["block_id"],
+                "relation_type": "parent_child",
+                "metadata": {},
+            })
+    return relationships
+
+
+def splice(ir: dict, plan: PagePlan, fresh: dict[int, list[dict]], page_count: int) -> SpliceResult:
+    """Rebuild `ir["blocks"]` for the revised file, in place.
+
+    `fresh` maps every page in `plan.convert` to its newly converted blocks.
+    """
+    result = SpliceResult()
+    old_blocks = sorted(ir.get("blocks", []), key=lambda b: b.get("order", 0))
+    by_page: dict[int | None, list[dict]] = {}
+    for block in old_blocks:
+        by_page.setdefault(block.get("page_number"), []).append(block)
+
+    # Manual blocks on superseded pages travel to the page that replaces them.
+    carried: dict[int, list[tuple[dict, str | None, float]]] = {}
+    for old_page, new_page in plan.replaced.items():
+        blocks = by_page.pop(old_page, [])
+        for i, block in enumerate(blocks):
+            if block.get("manual"):
+                previous_id = blocks[i - 1]["block_id"] if i else None
+                carried.setdefault(new_page, []).append((block, previous_id, i / len(blocks)))
+    for old_page in plan.removed:
+        result.dropped_edits += sum(1 for block in by_page.pop(old_page, []) if block.get("manual"))
+
+    source_page = {new: old for old, new in plan.unchanged.items()}
+    kept_ids = {block["block_id"] for blocks in by_page.values() for block in blocks}
+    kept_ids.update(block["block_id"] for blocks in carried.values() for block, _, _ in blocks)
+    fresh_ids = set()
+
+    blocks: list[dict] = []
+    for new_page in range(1, page_count + 1):
+        if new_page in fresh:
+            page_fresh = [dict(block, page_number=new_page) for block in fresh[new_page]]
+            fresh_ids.update(id(block) for block in page_fresh)
+            result.fresh_blocks += len(page_fresh)
+            page_blocks = _merge_page(page_fresh, carried.pop(new_page, []), result)
+        else:
+            page_blocks = by_page.pop(source_page.get(new_page), [])
+            result.kept_blocks += len(page_blocks)
+        for block in page_blocks:
+            block["page_number"] = new_page
+        blocks.extend(page_blocks)
+
+    # Blocks whose page no longer maps anywhere (e.g. without a page number) stay at the end.
+    for leftover in by_page.values():
+        result.kept_blocks += len(leftover)
+        blocks.extend(leftover)
+    for leftover in carried.values():
+        blocks.extend(block for block, _, _ in leftover)
+        result.kept_edits += len(leftover)
+
+    for i, block in enumerate(blocks):
+        block["order"] = i * ORDER_GAP
+        if id(block) in fresh_ids:
+            # Range-local IDs from the worker may collide with kept ones.
+            block_id = generate_block_id(f"{block['page_number']}:{block.get('content', '')}", block.get("type", ""), block["order"])
+            while block_id in kept_ids:
+                block_id = generate_block_id(block_id, block.get("type", ""), block["order"])
+            block["block_id"] = block_id
+            kept_ids.add(block_id)
+
+    ir["blocks"] = blocks
+    ir["relationships"] = _link_headings(blocks)
+    stats = ir.setdefault("stats", {})
+    stats["block_count"] = len(blocks)
+    stats["page_count"] = page_count
+    stats["table_count"] = sum(1 for block in blocks if block.get("type") == "table")
+    stats["image_count"] = sum(1 for block in blocks if block.get("type") == "image")
+    ir.setdefault("metadata", {})["page_count"] = page_count
+    return result
@@ -0,0 +1,378 @@
+"""
+Full-text block search for LayoutIR MCP Server.
+
+Each document has an inverted index over its block content (term → block
+→ term frequency, plus the page, type, bounding box and text of every
+block for results and snippets). The index is built when a document is
+converted, kept up to date by applying the edit tools' change records,
+and stored as `{document_id}/search/index.json` (encoded with `IR_CODEC`,
+see `ir_codec`) whenever the IR is written as a new snapshot. A stored index
+records the IR version it describes; loading it applies the journal entries
+written since, or rebuilds it from the IR when the journal no longer covers
+the gap. Searching never loads the IR otherwise: single-document searches
+use the in-process index, and cross-document searches load the stored
+indexes (kept in a small LRU) and rank all blocks together with BM25.
+"""
+
+import logging
+import math
+import re
+import threading
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+from mcp_server.utils import ir_codec, metrics, storage
+from mcp_server.utils.config import get_settings
+
+
+logger = logging.getLogger(__name__)
+
+
+INDEX_FORMAT = 1
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+SNIPPET_CHARS = 160
+
+_TOKEN = re.compile(r"\w+")
+
+
+def get_index_path(document_id: str) -> str:
+    return f"{document_id}/search/index.json"
+
+
+def tokenize(text: str) -> list[str]:
+    return _TOKEN.findall(text.lower())
+
+
+@dataclass
+class IndexedBlock:
+    page_number: int | None
+    type: str | None
+    bbox: dict | None
+    content: str
+    length: int
+
+
+class DocumentIndex:
+    """Inverted index over one document's blocks."""
+
+    def __init__(self):
+        self.blocks: dict[str, IndexedBlock] = {}
+        self.postings: dict[str, dict[str, int]] = {}
+        self.total_length = 0
+        self.ir_version = 0  # IR version of a stored index
+        self.lock = threading.RLock()
+
+    @classmethod
+    def build(cls, ir: dict) -> "DocumentIndex":
+        index = cls()
+        for block in ir.get("blocks", []):
+            index.add(block)
+        index.ir_version = ir.get("ir_version", 0)
+        return index
+
+    # ── Updates ──
+
+    def add(self, block: dict) -> None:
+        block_id = block["block_id"]
+        if block_id in self.blocks:
+            self.remove(block_id)
+        content = block.get("content") or ""
+        terms = Counter(tokenize(content))
+        for term, tf in terms.items():
+            self.postings.setdefault(term, {})[block_id] = tf
+        length = sum(terms.values())
+        self.blocks[block_id] = IndexedBlock(
+            page_number=block.get("page_number"),
+            type=block.get("type"),
+            bbox=block.get("bbox"),
+            content=content,
+            length=length,
+        )
+        self.total_length += length
+
+    def remove(self, block_id: str) -> None:
+        entry = self.blocks.pop(block_id, None)
+        if entry is None:
+            return
+        for term in set(tokenize(entry.content)):
+            postings = self.postings.get(term)
+            if postings is not None:
+                postings.pop(block_id, None)
+                if not postings:
+                    del self.postings[term]
+        self.total_length -= entry.length
+
+    def apply(self, changes: list[dict]) -> None:
+        """Apply change records from `ir_ops.BlockIndex` (see `ir_ops.replay`)."""
+        with self.lock:
+            for change in changes:
+                kind = change["op"]
+                if kind == "add":
+                    self.add(change["block"])
+                elif kind == "delete":
+                    self.remove(change["block_id"])
+                elif kind == "edit":
+                    entry = self.blocks.get(change["block_id"])
+                    if entry is None:
+                        continue
+                    fields = change["fields"]
+                    self.add({
+                        "block_id": change["block_id"],
+                        "page_number": fields.get("page_number", entry.page_number),
+                        "type": fields.get("type", entry.type),
+                        "bbox": fields.get("bbox", entry.bbox),
+                        "content": fields.get("content", entry.content),
+                    })
+
+    # ── Storage format ──
+
+    def encode(self, codec: str) -> bytes:
+        with self.lock:
+            ids = list(self.blocks)
+            position = {block_id: i for i, block_id in enumerate(ids)}
+            return ir_codec.encode({
+                "format": INDEX_FORMAT,
+                "ir_version": self.ir_version,
+                "blocks": [
+                    [block_id, entry.page_number, entry.type, entry.bbox, entry.content, entry.length]
+                    for block_id, entry in self.blocks.items()
+                ],
+                "postings": {
+                    term: [[position[block_id], tf] for block_id, tf in postings.items()]
+                    for term, postings in self.postings.items()
+                },
+            }, codec)
+
+    @classmethod
+    def decode(cls, data: bytes | memoryview) -> "DocumentIndex":
+        """Parse a stored index (encoded, or plain JSON from earlier versions)."""
+        raw = ir_codec.decode(data)
+        if raw.get("format") != INDEX_FORMAT:
+            raise ValueError(f"Unsupported search index format {raw.get('format')}")
+        index = cls()
+        index.ir_version = raw.get("ir_version", 0)
+        ids = []
+        for block_id, page_number, block_type, bbox, content, length in raw["blocks"]:
+            index.blocks[block_id] = IndexedBlock(page_number, block_type, bbox, content, length)
+            index.total_length += length
+            ids.append(block_id)
+        index.postings = {
+            term: {ids[i]: tf for i, tf in postings}
+            for term, postings in raw["postings"].items()
+        }
+        return index
+
+
+# ── Search ──────────────────────────────────────────────────────────
+
+def _matches(entry: IndexedBlock, filters: dict) -> bool:
+    block_types = filters.get("block_types")
+    if block_types and entry.type not in block_types:
+        return False
+    page = entry.page_number
+    if filters.get("page_start") is not None and (page is None or page < filters["page_start"]):
+        return False
+    if filters.get("page_end") is not None and (page is None or page > filters["page_end"]):
+        return False
+    return True
+
+
+def _snippet(content: str, terms: list[str]) -> str:
+    lowered = content.lower()
+    hits = [lowered.find(term) for term in terms]
+    hits = [hit for hit in hits if hit >= 0]
+    start = max(min(hits) - SNIPPET_CHARS // 4, 0) if hits else 0
+    snippet = content[start:start + SNIPPET_CHARS].strip()
+    if start > 0:
+        snippet = "…" + snippet
+    if start + SNIPPET_CHARS < len(content):
+        snippet += "…"
+    return snippet
+
+
+def search(indexes: dict[str, DocumentIndex], query: str, top_k: int = 10, filters: dict | None = None) -> list[dict]:
+    """Rank blocks of one or more documents for `query` with BM25."""
+    terms = list(dict.fromkeys(tokenize(query)))
+    if not terms:
+        return []
+    filters = filters or {}
+
+    # Collection statistics over every searched document.
+    block_count = sum(len(index.blocks) for index in indexes.values())
+    total_length = sum(index.total_length for index in indexes.values())
+    if not block_count:
+        return []
+    average_length = total_length / block_count or 1.0
+    idf = {}
+    for term in terms:
+        df = sum(len(index.postings.get(term, ())) for index in indexes.values())
+        idf[term] = math.log(1 + (block_count - df + 0.5) / (df + 0.5))
+
+    scored = []
+    for document_id, index in indexes.items():
+        with index.lock:
+            scores: dict[str, float] = {}
+            for term in terms:
+                for block_id, tf in index.postings.get(term, {}).items():
+                    length = index.blocks[block_id].length
+                    norm = tf * (K1 + 1) / (tf + K1 * (1 - B + B * length / average_length))
+                    scores[block_id] = scores.get(block_id, 0.0) + idf[term] * norm
+            for block_id, score in scores.items():
+                entry = index.blocks[block_id]
+                if _matches(entry, filters):
+                    scored.append((score, document_id, block_id, entry))
+
+    scored.sort(key=lambda item: item[0], reverse=True)
+    return [
+        {
+            "document_id": document_id,
+            "block_id": block_id,
+            "score": round(score, 4),
+            "page_number": entry.page_number,
+            "type": entry.type,
+            "bbox": entry.bbox,
+            "snippet": _snippet(entry.content, terms),
+        }
+        for score, document_id, block_id, entry in scored[:max(top_k, 0)]
+    ]
+
+
+# ── Live indexes ────────────────────────────────────────────────────
+
+class IndexRegistry:
+    """LRU of document indexes held in memory."""
+
+    def __init__(self, max_documents: int):
+        self.max_documents = max_documents
+        self._indexes: OrderedDict[str, DocumentIndex] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, document_id: str) -> DocumentIndex | None:
+        with self._lock:
+            index = self._indexes.get(document_id)
+            if index is not None:
+                self._indexes.move_to_end(document_id)
+            return index
+
+    def put(self, document_id: str, index: DocumentIndex) -> DocumentIndex:
+        if self.max_documents <= 0:
+            return index
+        with self._lock:
+            self._indexes[document_id] = index
+            self._indexes.move_to_end(document_id)
+            while len(self._indexes) > self.max_documents:
+                self._indexes.popitem(last=False)
+        return index
+
+    def drop(self, document_id: str) -> None:
+        with self._lock:
+            self._indexes.pop(document_id, None)
+
+
+_registry: IndexRegistry | None = None
+_registry_lock = threading.Lock()
+
+
+def get_registry() -> IndexRegistry:
+    """Singleton index registry sized from settings."""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = IndexRegistry(get_settings().search_index_cache_documents)
+        return _registry
+
+
+def update(document_id: str, ir: dict, changes: list[dict] | None) -> None:
+    """Bring a live index up to date with a saved IR (called by `ir_helpers.save_ir`)."""
+    registry = get_registry()
+    index = registry.get(document_id)
+    if index is None:
+        return
+    if changes is None:
+        registry.put(document_id, DocumentIndex.build(ir))
+    else:
+        index.apply(changes)
+
+
+def write_index(document_id: str, ir: dict) -> None:
+    """Store a document's index as of `ir`. Failures are logged, not raised.
+
+    Called by `ir_helpers` when it writes a snapshot; the live index already
+    holds every change saved so far.
+    """
+    try:
+        registry = get_registry()
+        index = registry.get(document_id)
+        if index is None:
+            index = registry.put(document_id, DocumentIndex.build(ir))
+        index.ir_version = ir.get("ir_version", 0)
+        codec = get_settings().ir_codec
+        storage.upload_bytes(
+            get_index_path(document_id), index.encode(codec),
+            content_type=ir_codec.content_type(codec),
+        )
+        metrics.inc("search_index_writes_total")
+    except Exception:
+        logger.warning("Could not store the search index of %s", document_id, exc_info=True)
+
+
+def _rebuild(document_id: str) -> DocumentIndex:
+    # ir_helpers imports this module.
+    from mcp_server.utils import ir_helpers
+
+    with ir_helpers.document_lock(document_id):
+        ir = ir_helpers.load_ir(document_id)
+        index = get_registry().put(document_id, DocumentIndex.build(ir))
+        write_index(document_id, ir)
+    metrics.inc("search_index_rebuilds_total")
+    return index
+
+
+def load_index(document_id: str) -> DocumentIndex | None:
+    """The live index of a document, else its stored index brought up to date, else None.
+
+    A stored index older than the IR's journal is rebuilt from the IR.
+    """
+    # ir_helpers imports this module.
+    from mcp_server.utils import ir_helpers
+
+    registry = get_registry()
+    index = registry.get(document_id)
+    if index is not None:
+        return index
+    entry = ir_helpers.cache_entry(document_id)
+    if entry is not None:
+        # The cached IR may hold changes not yet in storage.
+        with entry.lock:
+            return registry.put(document_id, DocumentIndex.build(entry.ir))
+    try:
+        index = DocumentIndex.decode(storage.download_bytes(get_index_path(document_id)))
+    except Exception:
+        return None
+
+    missed = ir_helpers.journal_since(document_id, index.ir_version)
+    if missed is None:
+        return _rebuild(document_id)
+    changes, ir_version = missed
+    if changes:
+        index.apply(changes)
+        index.ir_version = ir_version
+    return registry.put(document_id, index)
+
+
+def load_indexes(document_ids: list[str]) -> tuple[dict[str, DocumentIndex], list[str]]:
+    """Load many indexes in parallel. Returns `(indexes, missing_ids)`."""
+    indexes, missing = {}, []
+    concurrency = max(get_settings().block_store_scan_concurrency, 1)
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for document_id, index in zip(document_ids, pool.map(load_index, document_ids)):
+            if index is None:
+                missing.append(document_id)
+            else:
+                indexes[document_id] = index
+    return indexes, missing
@@ -1,52 +1,70 @@
 """
-Supabase Storage abstraction for LayoutIR.
+Storage abstraction for LayoutIR.
 
 Handles uploading, downloading, and URL generation for all document
-artifacts stored in a public Supabase Storage bucket.
+artifacts. Objects go to the backend selected by `STORAGE_BACKEND` (a
+public Supabase Storage bucket by default, or a local directory or memory;
+see `storage_backends`).
 """
 
+import hashlib
+import json
+import logging
 import mimetypes
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
 from pathlib import Path
 
-from supabase import create_client, Client
-
-
-BUCKET = "layoutir"
+from mcp_server.utils import metrics, tracing
+from mcp_server.utils.config import get_settings
+from mcp_server.utils.storage_backends import BUCKET, StorageBackend, create_backend
 
 
-def _get_client() -> Client:
-    """Create a Supabase client from environment variables."""
-    import os
-    from dotenv import load_dotenv
+logger = logging.getLogger(__name__)
 
-    load_dotenv()
 
-    url = os.environ["SUPABASE_URL"]
-    key = os.environ["SUPABASE_SERVICE_KEY"]
-    return create_client(url, key)
+_backend: StorageBackend | None = None
+_backend_lock = threading.Lock()
 
 
-_supabase: Client | None = None
+def get_backend() -> StorageBackend:
+    """Singleton storage backend selected by settings."""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = create_backend(get_settings())
+            logger.info("Using the %s storage backend", _backend.name)
+        return _backend
 
 
-def _client() -> Client:
-    """Singleton Supabase client."""
-    global _supabase
-    if _supabase is None:
-        _supabase = _get_client()
-        _ensure_bucket()
-    return _supabase
+def set_backend(backend: StorageBackend | None) -> None:
+    """Replace the storage backend (e.g. a `MemoryBackend` in tests); None re-reads settings."""
+    global _backend
+    with _backend_lock:
+        _backend = backend
 
 
-def _ensure_bucket() -> None:
-    """Create the storage bucket if it doesn't exist."""
+@contextmanager
+def _request(op: str):
+    """Time one backend request (`storage_request_seconds{op,backend}`)."""
+    backend = get_backend()
+    start = time.perf_counter()
     try:
-        _supabase.storage.get_bucket(BUCKET)
+        yield backend
     except Exception:
-        _supabase.storage.create_bucket(
-            BUCKET,
-            options={"public": True},
-        )
+        metrics.inc("storage_request_errors_total", op=op, backend=backend.name)
+        raise
+    finally:
+        metrics.observe("storage_request_seconds", time.perf_counter() - start, op=op, backend=backend.name)
+
+
+def _transferred(direction: str, size: int) -> None:
+    metrics.inc("storage_bytes_total", size, direction=direction)
+    tracing.add(f"storage_bytes_{direction}", size)
 
 
 def _guess_content_type(path: str) -> str:
@@ -60,22 +78,17 @@ def _guess_content_type(path: str) -> str:
 def upload_file(storage_path: str, local_path: Path, cache_control: str = "3600") -> str:
     """Upload a local file and return its public URL."""
     content_type = _guess_content_type(str(local_path))
-    with open(local_path, "rb") as f:
-        _client().storage.from_(BUCKET).upload(
-            path=storage_path,
-            file=f,
-            file_options={"content-type": content_type, "upsert": "true", "cache-control": cache_control},
-        )
+    with _request("upload") as backend:
+        backend.upload_file(storage_path, local_path, content_type, cache_control)
+    _transferred("up", Path(local_path).stat().st_size)
     return get_public_url(storage_path)
 
 
 def upload_bytes(storage_path: str, data: bytes, content_type: str = "application/octet-stream", cache_control: str = "3600") -> str:
     """Upload raw bytes and return the public URL."""
-    _client().storage.from_(BUCKET).upload(
-        path=storage_path,
-        file=data,
-        file_options={"content-type": content_type, "upsert": "true", "cache-control": cache_control},
-    )
+    with _request("upload") as backend:
+        backend.upload(storage_path, data, content_type, cache_control)
+    _transferred("up", len(data))
     return get_public_url(storage_path)
 
 
@@ -84,54 +97,164 @@ def upload_text(storage_path: str, text: str, content_type: str = "text/plain",
     return upload_bytes(storage_path, text.encode("utf-8"), content_type, cache_control)
 
 
-import time
-import httpx
-
 # ── Download helpers ────────────────────────────────────────────────
 
 def download_text(storage_path: str, cache_bust: bool = False) -> str:
     """Download a file as text. If cache_bust is True, bypasses edge cache."""
-    if cache_bust:
-        url = get_public_url(storage_path)
-        url = f"{url}?t={int(time.time() * 1000)}"
-        with httpx.Client(follow_redirects=True) as client:
-            resp = client.get(url)
-            resp.raise_for_status()
-            return resp.text
-            
-    data = _client().storage.from_(BUCKET).download(storage_path)
+    with _request("download") as backend:
+        data = backend.download(storage_path, cache_bust=cache_bust)
+    _transferred("down", len(data))
     return data.decode("utf-8")
 
 
 def download_bytes(storage_path: str) -> bytes:
     """Download a file as raw bytes."""
-    return _client().storage.from_(BUCKET).download(storage_path)
+    with _request("download") as backend:
+        data = backend.download(storage_path)
+    _transferred("down", len(data))
+    return data
+
+
+def download_buffer(storage_path: str):
+    """Download a file as a bytes-like object.
+
+    The local backend returns a read-only view of a memory-mapped file for
+    large objects; use this for readers that accept any buffer (IR shards,
+    Parquet) and `download_bytes` when real `bytes` are needed.
+    """
+    with _request("download") as backend:
+        data = backend.download_buffer(storage_path)
+    _transferred("down", len(data))
+    return data
+
+
+def list_names(prefix: str) -> list[str]:
+    """List the names of objects directly under a storage folder."""
+    with _request("list") as backend:
+        return backend.list_names(prefix)
+
+
+def list_documents() -> list[str]:
+    """IDs of every converted document in the bucket."""
+    return [name for name in list_names("") if name.startswith("doc_")]
+
+
+# ── Delete helpers ──────────────────────────────────────────────────
+
+def delete_paths(storage_paths: list[str]) -> None:
+    """Delete stored objects. Missing paths are ignored."""
+    if storage_paths:
+        with _request("delete") as backend:
+            backend.delete(storage_paths)
 
 
 # ── URL helpers ─────────────────────────────────────────────────────
 
 def get_public_url(storage_path: str) -> str:
     """Return the public URL for a stored object."""
-    return _client().storage.from_(BUCKET).get_public_url(storage_path)
+    return get_backend().public_url(storage_path)
 
 
 # ── Bulk upload ─────────────────────────────────────────────────────
 
-def upload_directory(document_id: str, local_dir: Path) -> dict[str, str]:
+UPLOAD_INDEX = ".upload_index.json"
+
+
+@dataclass
+class UploadStats:
+    """Summary of one `upload_directory` call."""
+
+    files: int = 0
+    uploaded: int = 0
+    skipped: int = 0
+    bytes: int = 0
+    seconds: float = 0.0
+
+
+def with_retries(fn, *args, **kwargs):
+    """Call `fn`, retrying with exponential backoff and jitter on failure."""
+    settings = get_settings()
+    for attempt in range(settings.upload_max_attempts):
+        try:
+            return fn(*args, **kwargs)
+        except Exception:
+            if attempt == settings.upload_max_attempts - 1:
+                raise
+            metrics.inc("storage_upload_retries_total")
+            delay = settings.upload_backoff_base * (2 ** attempt)
+            time.sleep(delay + random.uniform(0, delay))
+
+
+def _file_sha256(local_path: Path) -> str:
+    with open(local_path, "rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+
+def upload_directory_with_stats(document_id: str, local_dir: Path) -> tuple[dict[str, str], UploadStats]:
     """
-    Upload an entire output directory to Supabase Storage.
+    Upload an output directory concurrently, skipping unchanged files.
 
-    Returns a mapping of relative_path → public_url for every file uploaded.
+    A `.upload_index.json` object next to the uploaded files records the
+    SHA-256 of every file; files whose hash matches the index are not sent
+    again. Returns `(url_map, stats)`.
     """
-    url_map: dict[str, str] = {}
+    start = time.perf_counter()
+    stats = UploadStats()
+    index_path = f"{document_id}/{UPLOAD_INDEX}"
+    try:
+        previous = json.loads(download_bytes(index_path))
+    except Exception:
+        previous = {}
 
-    for local_file in local_dir.rglob("*"):
-        if not local_file.is_file():
-            continue
+    files = [
+        (local_file.relative_to(local_dir).as_posix(), local_file)
+        for local_file in local_dir.rglob("*")
+        if local_file.is_file()
+    ]
 
-        relative = local_file.relative_to(local_dir).as_posix()
+    def upload_one(relative: str, local_file: Path) -> tuple[str, str, str, int]:
+        digest = _file_sha256(local_file)
         storage_path = f"{document_id}/{relative}"
-        public_url = upload_file(storage_path, local_file)
-        url_map[relative] = public_url
+        if previous.get(relative) == digest:
+            return relative, get_public_url(storage_path), digest, -1
+        public_url = with_retries(upload_file, storage_path, local_file)
+        return relative, public_url, digest, local_file.stat().st_size
+
+    url_map: dict[str, str] = {}
+    index: dict[str, str] = {}
+    with ThreadPoolExecutor(max_workers=get_settings().upload_concurrency) as pool:
+        for relative, public_url, digest, size in pool.map(lambda item: upload_one(*item), files):
+            url_map[relative] = public_url
+            index[relative] = digest
+            stats.files += 1
+            if size < 0:
+                stats.skipped += 1
+            else:
+                stats.uploaded += 1
+                stats.bytes += size
+
+    # Keep entries for files not in this upload (e.g. a partial re-conversion).
+    index = {**previous, **index}
+    if index != previous:
+        with_retries(upload_text, index_path, json.dumps(index), content_type="application/json")
+
+    stats.seconds = time.perf_counter() - start
+    metrics.inc("storage_upload_files_total", stats.uploaded, result="uploaded")
+    metrics.inc("storage_upload_files_total", stats.skipped, result="skipped")
+    metrics.inc("storage_upload_bytes_total", stats.bytes)
+    metrics.observe("storage_upload_directory_seconds", stats.seconds)
+    logger.info(
+        "Uploaded %s: %d files (%d skipped), %d bytes in %.2fs",
+        document_id, stats.files, stats.skipped, stats.bytes, stats.seconds,
+    )
+    return url_map, stats
+
 
+def upload_directory(document_id: str, local_dir: Path) -> dict[str, str]:
+    """
+    Upload an entire output directory to storage.
+
+    Returns a mapping of relative_path → public_url for every file uploaded.
+    """
+    url_map, _ = upload_directory_with_stats(document_id, local_dir)
     return url_map
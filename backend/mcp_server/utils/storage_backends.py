@@ -0,0 +1,268 @@
+"""
+Storage backends for LayoutIR.
+
+`storage` delegates every object operation to one backend, chosen with
+`STORAGE_BACKEND`:
+
+- `supabase` (default): a public Supabase Storage bucket.
+- `local`: files under `LOCAL_STORAGE_ROOT`. Objects of at least
+  `STORAGE_MMAP_MIN_BYTES` are read through memory-mapped files, so large
+  IR shards and block stores are parsed straight from the page cache.
+  Public URLs point at `LOCAL_STORAGE_PUBLIC_URL` (the server's `/files`
+  route by default). Meant for single-node deployments.
+- `memory`: a dictionary in the process, for tests and benchmarks.
+
+Paths are bucket-relative (`{document_id}/...`) for every backend.
+"""
+
+import mmap
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+from urllib.parse import quote
+
+from mcp_server.utils.config import Settings
+
+
+BUCKET = "layoutir"
+
+
+class StorageBackend:
+    """Object operations used by `storage`. Paths are bucket-relative."""
+
+    name = "base"
+
+    def upload(self, path: str, data: bytes, content_type: str, cache_control: str) -> None:
+        raise NotImplementedError
+
+    def upload_file(self, path: str, local_path: Path, content_type: str, cache_control: str) -> None:
+        self.upload(path, Path(local_path).read_bytes(), content_type, cache_control)
+
+    def download(self, path: str, cache_bust: bool = False) -> bytes:
+        raise NotImplementedError
+
+    def download_buffer(self, path: str):
+        """The object as a bytes-like object; backends may return a zero-copy view."""
+        return self.download(path)
+
+    def list_names(self, prefix: str) -> list[str]:
+        """Names of the objects and folders directly under `prefix`, sorted."""
+        raise NotImplementedError
+
+    def delete(self, paths: list[str]) -> None:
+        raise NotImplementedError
+
+    def public_url(self, path: str) -> str:
+        raise NotImplementedError
+
+
+# ── Supabase ────────────────────────────────────────────────────────
+
+class SupabaseBackend(StorageBackend):
+    """A public Supabase Storage bucket.
+
+    The client is created on first use and the bucket is only checked (and
+    created if missing) before the first upload. Public URLs are built
+    locally without touching the client. Cache-busting reads go through one
+    shared, connection-pooled HTTP client.
+    """
+
+    name = "supabase"
+
+    def __init__(self, url: str, key: str, bucket: str = BUCKET):
+        self.url = url.rstrip("/")
+        self.key = key
+        self.bucket = bucket
+        self._client = None
+        self._http = None
+        self._bucket_checked = False
+        self._lock = threading.Lock()
+
+    def _get_client(self):
+        with self._lock:
+            if self._client is None:
+                from supabase import create_client
+
+                self._client = create_client(self.url, self.key)
+            return self._client
+
+    def _get_http(self):
+        with self._lock:
+            if self._http is None:
+                import httpx
+
+                self._http = httpx.Client(follow_redirects=True)
+            return self._http
+
+    def _ensure_bucket(self) -> None:
+        """Create the storage bucket if it doesn't exist."""
+        if self._bucket_checked:
+            return
+        client = self._get_client()
+        try:
+            client.storage.get_bucket(self.bucket)
+        except Exception:
+            client.storage.create_bucket(self.bucket, options={"public": True})
+        self._bucket_checked = True
+
+    def _objects(self):
+        return self._get_client().storage.from_(self.bucket)
+
+    def upload(self, path: str, data: bytes, content_type: str, cache_control: str) -> None:
+        self._ensure_bucket()
+        self._objects().upload(
+            path=path,
+            file=data,
+            file_options={"content-type": content_type, "upsert": "true", "cache-control": cache_control},
+        )
+
+    def upload_file(self, path: str, local_path: Path, content_type: str, cache_control: str) -> None:
+        self._ensure_bucket()
+        with open(local_path, "rb") as f:
+            self._objects().upload(
+                path=path,
+                file=f,
+                file_options={"content-type": content_type, "upsert": "true", "cache-control": cache_control},
+            )
+
+    def download(self, path: str, cache_bust: bool = False) -> bytes:
+        if cache_bust:
+            # Read through the public URL with a unique query to bypass the edge cache.
+            url = f"{self.public_url(path)}?t={int(time.time() * 1000)}"
+            resp = self._get_http().get(url)
+            resp.raise_for_status()
+            return resp.content
+        return self._objects().download(path)
+
+    def list_names(self, prefix: str) -> list[str]:
+        items = self._objects().list(
+            prefix, {"limit": 10000, "offset": 0, "sortBy": {"column": "name", "order": "asc"}}
+        )
+        return [item["name"] for item in items]
+
+    def delete(self, paths: list[str]) -> None:
+        self._objects().remove(paths)
+
+    def public_url(self, path: str) -> str:
+        return f"{self.url}/storage/v1/object/public/{self.bucket}/{quote(path)}"
+
+
+# ── Local filesystem ────────────────────────────────────────────────
+
+class LocalBackend(StorageBackend):
+    """Objects stored as files under a root directory."""
+
+    name = "local"
+
+    def __init__(self, root: str | Path, public_base_url: str = "", mmap_min_bytes: int = 1024 * 1024):
+        self.root = Path(root).resolve()
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.public_base_url = public_base_url.rstrip("/")
+        self.mmap_min_bytes = mmap_min_bytes
+
+    def file_path(self, path: str) -> Path:
+        """The file holding an object. Rejects paths that escape the root."""
+        target = (self.root / path.lstrip("/")).resolve()
+        if target != self.root and self.root not in target.parents:
+            raise ValueError(f"Storage path escapes the storage root: {path!r}")
+        return target
+
+    def upload(self, path: str, data: bytes, content_type: str, cache_control: str) -> None:
+        target = self.file_path(path)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        # Write to a temporary file and rename it so readers never see a partial object.
+        fd, tmp = tempfile.mkstemp(dir=target.parent, prefix=".upload-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, target)
+        except BaseException:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+
+    def download(self, path: str, cache_bust: bool = False) -> bytes:
+        return self.file_path(path).read_bytes()
+
+    def download_buffer(self, path: str):
+        target = self.file_path(path)
+        with open(target, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size < max(self.mmap_min_bytes, 1):
+                return f.read()
+            # The mapping stays valid after the file is closed and is
+            # released with the last reference to the view.
+            return memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+    def list_names(self, prefix: str) -> list[str]:
+        folder = self.file_path(prefix) if prefix else self.root
+        if not folder.is_dir():
+            return []
+        return sorted(entry.name for entry in folder.iterdir() if not entry.name.startswith(".upload-"))
+
+    def delete(self, paths: list[str]) -> None:
+        for path in paths:
+            self.file_path(path).unlink(missing_ok=True)
+
+    def public_url(self, path: str) -> str:
+        if self.public_base_url:
+            return f"{self.public_base_url}/{quote(path)}"
+        return self.file_path(path).as_uri()
+
+
+# ── Memory ──────────────────────────────────────────────────────────
+
+class MemoryBackend(StorageBackend):
+    """Objects kept in a dictionary. Nothing is persisted."""
+
+    name = "memory"
+
+    def __init__(self, public_base_url: str = "memory://layoutir"):
+        self.objects: dict[str, bytes] = {}
+        self.content_types: dict[str, str] = {}
+        self.public_base_url = public_base_url.rstrip("/")
+        self._lock = threading.Lock()
+
+    def upload(self, path: str, data: bytes, content_type: str, cache_control: str) -> None:
+        with self._lock:
+            self.objects[path] = bytes(data)
+            self.content_types[path] = content_type
+
+    def download(self, path: str, cache_bust: bool = False) -> bytes:
+        with self._lock:
+            try:
+                return self.objects[path]
+            except KeyError:
+                raise FileNotFoundError(path) from None
+
+    def list_names(self, prefix: str) -> list[str]:
+        prefix = prefix.strip("/")
+        start = f"{prefix}/" if prefix else ""
+        with self._lock:
+            names = {path[len(start):].split("/", 1)[0] for path in self.objects if path.startswith(start)}
+        return sorted(names)
+
+    def delete(self, paths: list[str]) -> None:
+        with self._lock:
+            for path in paths:
+                self.objects.pop(path, None)
+                self.content_types.pop(path, None)
+
+    def public_url(self, path: str) -> str:
+        return f"{self.public_base_url}/{quote(path)}"
+
+
+def create_backend(settings: Settings) -> StorageBackend:
+    """The backend selected by `STORAGE_BACKEND`."""
+    name = settings.storage_backend
+    if name == "supabase":
+        from dotenv import load_dotenv
+
+        load_dotenv()
+        return SupabaseBackend(os.environ["SUPABASE_URL"], os.environ["SUPABASE_SERVICE_KEY"])
+    if name == "local":
+        return LocalBackend(settings.local_storage_root, settings.local_storage_public_url, settings.storage_mmap_min_bytes)
+    if name == "memory":
+        return MemoryBackend()
+    raise ValueError(f"Unknown STORAGE_BACKEND {name!r}; use supabase, local or memory")
@@ -0,0 +1,107 @@
+"""
+Per-request stage timing for LayoutIR MCP Server.
+
+Every tool call runs inside a trace (started by `concurrency.run_sync`),
+and the code it calls marks its stages with `span(...)`:
+
+    with tracing.span("upload_directory"):
+        url_map = storage.upload_directory(doc_id, doc_dir)
+
+Each span is recorded in the `stage_seconds{stage=...}` histogram whether
+or not a trace is active. Within a trace the spans are also collected
+together with counters added via `add(...)` (bytes transferred, block
+counts), and with `TIMING_LOG=true` every finished trace is logged as one
+JSON line on the `mcp_server.timing` logger, e.g.
+
+    {"tool": "convert_document", "seconds": 41.2, "queue_seconds": 0.0,
+     "stages": [{"stage": "download", "start": 0.0, "seconds": 1.8}, ...],
+     "storage_bytes_down": 1024, "storage_bytes_up": 8812345, ...}
+
+Spans opened in other threads (upload pools, the write-behind flusher)
+only feed the histograms.
+"""
+
+import json
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+
+from mcp_server.utils import metrics
+from mcp_server.utils.config import get_settings
+
+
+logger = logging.getLogger("mcp_server.timing")
+
+
+@dataclass
+class Trace:
+    tool: str
+    start: float = field(default_factory=time.perf_counter)
+    stages: list[dict] = field(default_factory=list)
+    fields: dict[str, float] = field(default_factory=dict)
+    depth: int = 0
+
+
+_current: ContextVar[Trace | None] = ContextVar("layoutir_trace", default=None)
+
+
+def current() -> Trace | None:
+    return _current.get()
+
+
+@contextmanager
+def trace(tool: str, **fields: float):
+    """Collect the spans of one tool call and log them when it ends."""
+    active = Trace(tool=tool, fields=dict(fields))
+    token = _current.set(active)
+    error = None
+    try:
+        yield active
+    except BaseException as exc:
+        error = type(exc).__name__
+        raise
+    finally:
+        _current.reset(token)
+        _log(active, time.perf_counter() - active.start, error)
+
+
+@contextmanager
+def span(stage: str):
+    """Time one stage of the current request."""
+    active = _current.get()
+    start = time.perf_counter()
+    if active is not None:
+        active.depth += 1
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        metrics.observe("stage_seconds", seconds, stage=stage)
+        if active is not None:
+            active.depth -= 1
+            active.stages.append({
+                "stage": stage,
+                "start": round(start - active.start, 6),
+                "seconds": round(seconds, 6),
+                "depth": active.depth,
+            })
+
+
+def add(name: str, value: float) -> None:
+    """Add to a numeric field of the current trace (no-op outside a trace)."""
+    active = _current.get()
+    if active is not None:
+        active.fields[name] = active.fields.get(name, 0) + value
+
+
+def _log(active: Trace, seconds: float, error: str | None) -> None:
+    settings = get_settings()
+    if not settings.timing_log or seconds < settings.timing_log_min_seconds:
+        return
+    record = {"tool": active.tool, "seconds": round(seconds, 6), **active.fields}
+    if error is not None:
+        record["error"] = error
+    record["stages"] = sorted(active.stages, key=lambda stage: stage["start"])
+    logger.info(json.dumps(record))
@@ -0,0 +1,764 @@
+"""
+Warm conversion worker pool for LayoutIR MCP Server.
+
+Each worker process builds its LayoutIR `Pipeline` once, loading the Docling
+layout and OCR models at startup, and then serves conversion jobs from a
+bounded queue. Requests therefore only pay for model loading when a worker
+process starts, not on every `convert_document` call.
+
+With `CONVERSION_WORKERS=0` conversions run inside the server process
+(still reusing one warm pipeline), which is handy for local development.
+
+Documents with at least `SPLIT_MIN_PAGES` pages are converted as ranges of
+`SPLIT_RANGE_PAGES` pages on several workers at once and merged by one of
+them (see `page_ranges`). `convert_pages` converts only selected page
+ranges of a document, for `reconvert_document`. Every LayoutIR call goes
+through `layoutir_adapter`, which falls back to whole-document conversion
+when the installed LayoutIR cannot convert page ranges.
+
+Each worker process is supervised by a thread in the server that hands it
+one job at a time and samples its resident memory while the job runs. A
+job that goes over `CONVERSION_JOB_MAX_RSS_BYTES` or its timeout has its
+worker killed and fails with `ConversionLimitError`; a worker that dies
+(e.g. killed by the OOM killer) fails its job with `WorkerCrashedError`.
+Either way only that job is lost: a fresh worker takes its place. Workers
+are also recycled after `CONVERSION_WORKER_MAX_JOBS` jobs or once they hold
+more than `CONVERSION_WORKER_MAX_RSS_BYTES` between jobs, since memory a
+conversion allocated is not always returned to the OS. Memory is read from
+`/proc` (Linux) or `psutil` when it is installed; without either the
+memory limits are not enforced.
+"""
+
+import atexit
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, TimeoutError as FutureTimeoutError, wait
+from pathlib import Path
+from typing import Callable
+
+from mcp_server.utils import layoutir_adapter, metrics, tracing
+from mcp_server.utils.layoutir_adapter import RangesUnsupported
+from mcp_server.utils.config import get_settings
+
+
+logger = logging.getLogger(__name__)
+
+
+# Settings every worker builds its pipeline with.
+PIPELINE_SETTINGS = {
+    "adapter": "docling",
+    "use_gpu": False,
+    "chunker": "semantic_section",
+    "max_heading_level": 2,
+}
+
+
+class PoolBusyError(RuntimeError):
+    """Raised when the conversion queue is full."""
+
+
+class ConversionLimitError(RuntimeError):
+    """Raised when a conversion goes over its memory or time limit and is stopped."""
+
+
+class ConversionTimeoutError(ConversionLimitError, TimeoutError):
+    """Raised when a conversion does not finish within `CONVERSION_JOB_TIMEOUT`."""
+
+
+class WorkerCrashedError(RuntimeError):
+    """Raised when a worker process dies in the middle of a conversion."""
+
+
+# ── Memory ──────────────────────────────────────────────────────────
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def _rss_bytes(pid: int | None = None) -> int:
+    """Current resident set size of a process (this one by default), 0 if unknown."""
+    try:
+        with open(f"/proc/{pid or 'self'}/statm", "rb") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import psutil
+
+        return psutil.Process(pid or os.getpid()).memory_info().rss
+    except Exception:
+        return 0
+
+
+def _reset_peak_rss() -> None:
+    """Start a new peak RSS measurement for this process (Linux only)."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def _peak_rss_bytes() -> int:
+    """Peak RSS since `_reset_peak_rss`, or over the process lifetime where it cannot be reset."""
+    try:
+        with open("/proc/self/status", "rb") as f:
+            for line in f:
+                if line.startswith(b"VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    import resource
+
+    # ru_maxrss is in KiB on Linux and bytes on macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _mb(size: int) -> str:
+    return f"{size / 2**20:.0f} MB"
+
+
+# ── Worker side ─────────────────────────────────────────────────────
+
+_pipeline = None
+_pipeline_lock = threading.Lock()
+_jobs_served = 0
+
+
+def _ensure_pipeline() -> float:
+    """Build the process-wide pipeline if needed. Returns the seconds spent loading."""
+    global _pipeline
+    if _pipeline is not None:
+        return 0.0
+    start = time.perf_counter()
+    _pipeline = layoutir_adapter.build_pipeline(PIPELINE_SETTINGS)
+    elapsed = time.perf_counter() - start
+    logger.info("Conversion worker %s loaded models in %.1fs", os.getpid(), elapsed)
+    return elapsed
+
+
+def _init_worker() -> None:
+    """Load models before the first job arrives."""
+    try:
+        _ensure_pipeline()
+    except Exception:
+        # Leave the pipeline unset; the first job retries and reports the error.
+        logger.exception("Conversion worker %s failed to preload models", os.getpid())
+
+
+def _call_measured(fn: Callable[..., dict], args: tuple) -> dict:
+    """Run one job function and add the peak RSS of this process while it ran."""
+    _reset_peak_rss()
+    result = fn(*args)
+    result["peak_rss_bytes"] = _peak_rss_bytes()
+    return result
+
+
+def _worker_main(conn) -> None:
+    """Worker process entry point: run `(fn, args)` jobs from the pipe until told to stop."""
+    # Ctrl-C in the server's terminal reaches the whole process group; the
+    # server stops its workers itself.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    _init_worker()
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            return
+        if job is None:
+            return
+        try:
+            reply = ("ok", _call_measured(*job))
+        except Exception as exc:
+            reply = ("error", exc)
+        try:
+            conn.send(reply)
+        except Exception as exc:
+            # The result or exception could not be pickled.
+            conn.send(("error", RuntimeError(f"{type(exc).__name__}: {exc}")))
+
+
+# LayoutIR logs "Stage N/8: ..." as it goes; map those to job stages.
+_STAGE_NAMES = {1: "parsing", 2: "parsing", 3: "parsing", 4: "chunking", 5: "chunking", 6: "writing", 7: "writing", 8: "writing"}
+
+
+class _StageReporter(logging.Handler):
+    """Report the pipeline's current stage to a callback or a progress file.
+
+    Worker processes cannot call back into the server, so there the stage is
+    written to a file that `ConversionPool.convert` polls.
+    """
+
+    def __init__(self, target: Callable[..., None] | str):
+        super().__init__(level=logging.INFO)
+        self.target = target
+
+    def emit(self, record: logging.LogRecord) -> None:
+        message = record.getMessage()
+        if not message.startswith("Stage "):
+            return
+        try:
+            stage = _STAGE_NAMES[int(message[len("Stage "):].split("/", 1)[0])]
+            if callable(self.target):
+                self.target(stage)
+            else:
+                path = Path(self.target)
+                tmp = path.with_suffix(".tmp")
+                tmp.write_text(stage, encoding="utf-8")
+                os.replace(tmp, path)
+        except Exception:
+            pass
+
+
+def _run_job(input_path: str, output_dir: str, progress: Callable[..., None] | str | None = None) -> dict:
+    """Convert one document with this process's warm pipeline."""
+    global _jobs_served
+    with _pipeline_lock:
+        load_seconds = _ensure_pipeline()
+        cold = _jobs_served == 0
+        start = time.perf_counter()
+        pipeline_logger = logging.getLogger("layoutir.pipeline")
+        reporter = _StageReporter(progress) if progress is not None else None
+        if reporter is not None:
+            pipeline_logger.addHandler(reporter)
+            pipeline_logger.setLevel(logging.INFO)
+        try:
+            document = layoutir_adapter.convert(_pipeline, Path(input_path), Path(output_dir))
+        finally:
+            if reporter is not None:
+                pipeline_logger.removeHandler(reporter)
+        _jobs_served += 1
+        return {
+            "document_id": document.document_id,
+            "seconds": time.perf_counter() - start,
+            "load_seconds": load_seconds,
+            "cold": cold,
+            "pid": os.getpid(),
+        }
+
+
+def _run_range(input_path: str, first_page: int, last_page: int) -> dict:
+    """Parse and normalize pages `first_page`..`last_page` of a document.
+
+    Returns the partial LayoutIR `Document` (image bytes included) for
+    `_assemble_ranges` to merge. Raises `RangesUnsupported` when the
+    installed LayoutIR cannot convert page ranges.
+    """
+    global _jobs_served
+    with _pipeline_lock:
+        load_seconds = _ensure_pipeline()
+        cold = _jobs_served == 0
+        start = time.perf_counter()
+        document = layoutir_adapter.convert_range(_pipeline, Path(input_path), first_page, last_page)
+        _jobs_served += 1
+        return {
+            "document": document,
+            "seconds": time.perf_counter() - start,
+            "load_seconds": load_seconds,
+            "cold": cold,
+            "pid": os.getpid(),
+        }
+
+
+def _assemble_ranges(input_path: str, output_dir: str, parts: list, page_count: int) -> dict:
+    """Merge partial documents, then chunk and write every output like `Pipeline.process`."""
+    with _pipeline_lock:
+        _ensure_pipeline()
+        start = time.perf_counter()
+        document = layoutir_adapter.assemble(_pipeline, Path(input_path), Path(output_dir), parts, page_count)
+        return {"document_id": document.document_id, "seconds": time.perf_counter() - start}
+
+
+def _convert_pages(input_path: str, first_page: int, last_page: int, output_dir: str) -> dict:
+    """Convert pages `first_page`..`last_page` and write their image assets to `output_dir`.
+
+    Returns the normalized blocks as JSON-ready dicts, with asset paths
+    relative to `output_dir`.
+    """
+    global _jobs_served
+    with _pipeline_lock:
+        load_seconds = _ensure_pipeline()
+        cold = _jobs_served == 0
+        start = time.perf_counter()
+        blocks = layoutir_adapter.convert_pages(_pipeline, Path(input_path), first_page, last_page, Path(output_dir))
+        _jobs_served += 1
+        return {
+            "blocks": blocks,
+            "seconds": time.perf_counter() - start,
+            "load_seconds": load_seconds,
+            "cold": cold,
+            "pid": os.getpid(),
+        }
+
+
+# ── Pool side ───────────────────────────────────────────────────────
+
+# How often a running job's memory is sampled.
+_RSS_SAMPLE_SECONDS = 0.2
+
+
+class _Worker:
+    """One worker process and the pipe its jobs are sent through."""
+
+    def __init__(self, context):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child_conn,), name="layoutir-conversion-worker")
+        self.process.start()
+        child_conn.close()
+        self.jobs = 0
+        # Set when the worker was killed or broke and must be replaced.
+        self.retire_reason: str | None = None
+
+    @property
+    def pid(self) -> int:
+        return self.process.pid
+
+    def rss(self) -> int:
+        return _rss_bytes(self.process.pid)
+
+    def kill(self) -> None:
+        self.process.kill()
+        self.process.join()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Ask the worker to exit once idle, killing it if it does not."""
+        try:
+            self.conn.send(None)
+        except (OSError, ValueError):
+            pass
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.kill()
+        self.conn.close()
+
+
+class ConversionPool:
+    """A bounded queue of conversion jobs served by long-lived worker processes."""
+
+    def __init__(
+        self,
+        workers: int,
+        max_queue: int,
+        job_timeout: float,
+        split_min_pages: int = 0,
+        split_range_pages: int = 16,
+        split_max_parallel: int = 0,
+        job_max_rss_bytes: int = 0,
+        worker_max_jobs: int = 0,
+        worker_max_rss_bytes: int = 0,
+    ):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.job_timeout = job_timeout
+        self.split_min_pages = split_min_pages
+        self.split_range_pages = split_range_pages
+        self.split_max_parallel = split_max_parallel
+        self.job_max_rss_bytes = job_max_rss_bytes
+        self.worker_max_jobs = worker_max_jobs
+        self.worker_max_rss_bytes = worker_max_rss_bytes
+        # One slot per running job plus one per queued job.
+        self._slots = threading.BoundedSemaphore(max(workers, 1) + max_queue)
+        self._context = multiprocessing.get_context("spawn")
+        self._queue: queue.SimpleQueue | None = None
+        self._supervisors: list[threading.Thread] = []
+        self._live: set[_Worker] = set()
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        """Start the worker processes and begin loading models in each of them."""
+        if self.workers <= 0:
+            _ensure_pipeline()
+            return
+        with self._lock:
+            if self._queue is not None:
+                return
+            self._queue = queue.SimpleQueue()
+            for i in range(self.workers):
+                supervisor = threading.Thread(
+                    target=self._supervise, args=(self._queue,), name=f"conversion-worker-{i}", daemon=True,
+                )
+                supervisor.start()
+                self._supervisors.append(supervisor)
+        atexit.register(self.shutdown)
+        metrics.set_gauge("conversion_workers", self.workers)
+
+    def shutdown(self) -> None:
+        """Cancel queued jobs and stop every worker, including busy ones."""
+        with self._lock:
+            jobs, self._queue = self._queue, None
+            supervisors, self._supervisors = self._supervisors, []
+            live = list(self._live)
+        if jobs is None:
+            return
+        while True:
+            try:
+                item = jobs.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None:
+                item[0].cancel()
+        for _ in supervisors:
+            jobs.put(None)
+        for worker in live:
+            if worker.process.is_alive():
+                worker.retire_reason = "shutdown"
+                worker.kill()
+
+    # ── Supervision ──
+
+    def _submit(self, fn: Callable[..., dict], args: tuple, deadline: float) -> Future:
+        """Queue `fn(*args)` for the next free worker; it is stopped if still running at `deadline`."""
+        jobs = self._queue
+        if jobs is None:
+            raise RuntimeError("Conversion pool is shut down")
+        future = Future()
+        jobs.put((future, fn, args, deadline))
+        return future
+
+    def _spawn(self) -> _Worker:
+        worker = _Worker(self._context)
+        with self._lock:
+            self._live.add(worker)
+        metrics.inc("conversion_workers_started_total")
+        return worker
+
+    def _retire(self, worker: _Worker, reason: str) -> None:
+        with self._lock:
+            self._live.discard(worker)
+        worker.stop()
+        if reason != "shutdown":
+            metrics.inc("conversion_workers_recycled_total", reason=reason)
+            logger.info("Recycling conversion worker %s after %d jobs (%s)", worker.pid, worker.jobs, reason)
+
+    def _recycle_reason(self, worker: _Worker) -> str | None:
+        if worker.retire_reason is not None:
+            return worker.retire_reason
+        if not worker.process.is_alive():
+            return "crash"
+        if self.worker_max_jobs and worker.jobs >= self.worker_max_jobs:
+            return "jobs"
+        if self.worker_max_rss_bytes and worker.rss() >= self.worker_max_rss_bytes:
+            return "rss"
+        return None
+
+    def _supervise(self, jobs: queue.SimpleQueue) -> None:
+        """Feed jobs to one worker process at a time, replacing it whenever it must be recycled."""
+        worker = self._spawn()
+        try:
+            while True:
+                item = jobs.get()
+                if item is None:
+                    return
+                future, fn, args, deadline = item
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    future.set_result(self._run(worker, fn, args, deadline))
+                except BaseException as exc:
+                    future.set_exception(exc)
+                reason = self._recycle_reason(worker)
+                if reason == "shutdown":
+                    return
+                if reason is not None:
+                    self._retire(worker, reason)
+                    worker = self._spawn()
+        finally:
+            self._retire(worker, "shutdown")
+
+    def _run(self, worker: _Worker, fn: Callable[..., dict], args: tuple, deadline: float) -> dict:
+        """Run one job on `worker`, killing it when the job goes over its memory or time limit."""
+        if not worker.process.is_alive():
+            raise WorkerCrashedError(
+                f"Conversion worker {worker.pid} exited while idle (exit code {worker.process.exitcode})"
+            )
+        if time.monotonic() >= deadline:
+            raise ConversionTimeoutError(f"Conversion did not start within {self.job_timeout:.0f}s")
+        worker.jobs += 1
+        worker.conn.send((fn, args))
+        peak = 0
+        while True:
+            rss = worker.rss()
+            peak = max(peak, rss)
+            if self.job_max_rss_bytes and rss > self.job_max_rss_bytes:
+                worker.retire_reason = "memory_limit"
+                worker.kill()
+                metrics.inc("conversion_limit_exceeded_total", limit="memory")
+                raise ConversionLimitError(
+                    f"Conversion stopped: its worker process reached {_mb(rss)}, over the "
+                    f"{_mb(self.job_max_rss_bytes)} limit per conversion (CONVERSION_JOB_MAX_RSS_BYTES)"
+                )
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                worker.retire_reason = "timeout"
+                worker.kill()
+                metrics.inc("conversion_limit_exceeded_total", limit="time")
+                raise ConversionTimeoutError(
+                    f"Conversion did not finish within {self.job_timeout:.0f}s and was stopped"
+                )
+            try:
+                if not worker.conn.poll(min(remaining, _RSS_SAMPLE_SECONDS)):
+                    continue
+                status, value = worker.conn.recv()
+            except (EOFError, OSError):
+                worker.process.join(5)
+                if worker.retire_reason == "shutdown":
+                    raise RuntimeError("Conversion pool was shut down during the conversion") from None
+                worker.retire_reason = "crash"
+                metrics.inc("conversion_worker_crashes_total")
+                raise WorkerCrashedError(
+                    f"Conversion worker {worker.pid} exited unexpectedly (exit code {worker.process.exitcode}) "
+                    f"after reaching {_mb(peak)}; it was most likely killed for running out of memory"
+                ) from None
+            if status == "error":
+                raise value
+            value["peak_rss_bytes"] = max(value.get("peak_rss_bytes", 0), peak)
+            return value
+
+    # ── Conversions ──
+
+    def convert(
+        self,
+        input_path: Path,
+        output_dir: Path,
+        on_stage: Callable[..., None] | None = None,
+        page_count: int | None = None,
+    ) -> dict:
+        """Run one conversion, blocking until it finishes or times out.
+
+        `on_stage(stage, pages_done=None)` is called with "parsing",
+        "chunking" and "writing" as the conversion reaches each stage.
+        Documents of at least `split_min_pages` pages (`page_count`) are
+        converted as page ranges in parallel workers.
+        """
+        if not self._slots.acquire(blocking=False):
+            metrics.inc("conversion_rejected_total")
+            raise PoolBusyError(
+                f"Conversion queue is full ({self.max_queue} waiting); try again shortly."
+            )
+        submitted = time.perf_counter()
+        try:
+            result = None
+            if self._should_split(page_count):
+                try:
+                    result = self._convert_ranges(input_path, output_dir, page_count, on_stage)
+                except RangesUnsupported as exc:
+                    logger.warning("%s; converting documents whole from now on", exc)
+                    self.split_min_pages = 0
+            if result is None:
+                result = self._convert_whole(input_path, output_dir, on_stage)
+        finally:
+            self._slots.release()
+
+        elapsed = time.perf_counter() - submitted
+        state = "cold" if result["cold"] else "warm"
+        metrics.inc("conversions_total", state=state)
+        metrics.observe("conversion_seconds", result["seconds"], state=state)
+        metrics.observe("conversion_queue_wait_seconds", max(elapsed - result["seconds"], 0.0))
+        if result["load_seconds"]:
+            metrics.observe("conversion_model_load_seconds", result["load_seconds"])
+        self._record_peak_rss(result["peak_rss_bytes"])
+        return result
+
+    def _convert_whole(self, input_path: Path, output_dir: Path, on_stage: Callable[..., None] | None) -> dict:
+        if self.workers <= 0:
+            return _call_measured(_run_job, (str(input_path), str(output_dir), on_stage))
+        self.start()
+        progress_file = Path(output_dir) / ".progress" if on_stage is not None else None
+        deadline = time.monotonic() + self.job_timeout
+        future = self._submit(
+            _run_job, (str(input_path), str(output_dir), str(progress_file) if progress_file else None), deadline,
+        )
+        return self._wait(future, deadline, progress_file, on_stage)
+
+    def _record_peak_rss(self, peak: int) -> None:
+        metrics.observe("conversion_peak_rss_bytes", peak)
+        tracing.add("peak_rss_bytes", peak)
+
+    # ── Page-parallel conversion ──
+
+    def _should_split(self, page_count: int | None) -> bool:
+        return (
+            self.workers > 1
+            and self.split_min_pages > 0
+            and page_count is not None
+            and page_count >= self.split_min_pages
+            and layoutir_adapter.supports_ranges()
+        )
+
+    def _convert_ranges(
+        self,
+        input_path: Path,
+        output_dir: Path,
+        page_count: int,
+        on_stage: Callable[..., None] | None,
+    ) -> dict:
+        """Convert page ranges in parallel, then merge and write them in one worker."""
+        from mcp_server.utils.page_ranges import plan_ranges
+
+        self.start()
+        deadline = time.monotonic() + self.job_timeout
+        start = time.perf_counter()
+        ranges = plan_ranges(page_count, self.split_range_pages)
+        parallel = min(self.split_max_parallel or self.workers, self.workers)
+        if on_stage is not None:
+            on_stage("parsing", pages_done=0)
+
+        results = self._map_ranges(
+            _run_range, [(str(input_path), first, last) for first, last in ranges],
+            ranges, parallel, deadline, on_stage,
+        )
+
+        if on_stage is not None:
+            on_stage("chunking", pages_done=page_count)
+        parts = [result["document"] for result in results]
+        future = self._submit(_assemble_ranges, (str(input_path), str(output_dir), parts, page_count), deadline)
+        assembled = self._wait(future, deadline, None, None)
+
+        metrics.inc("conversion_split_total")
+        metrics.observe("conversion_split_ranges", len(ranges))
+        return {
+            "document_id": assembled["document_id"],
+            "seconds": time.perf_counter() - start,
+            "load_seconds": max(result["load_seconds"] for result in results),
+            "cold": any(result["cold"] for result in results),
+            "pid": sorted({result["pid"] for result in results}),
+            "ranges": len(ranges),
+            "peak_rss_bytes": max(result["peak_rss_bytes"] for result in results + [assembled]),
+        }
+
+    def convert_pages(
+        self,
+        input_path: Path,
+        output_dir: Path,
+        ranges: list[tuple[int, int]],
+        on_stage: Callable[..., None] | None = None,
+    ) -> list[dict]:
+        """Convert only the given inclusive page ranges of a document.
+
+        Returns one result per range (see `_convert_pages`), in the order
+        given. Ranges run in parallel on the worker processes.
+        """
+        if not self._slots.acquire(blocking=False):
+            metrics.inc("conversion_rejected_total")
+            raise PoolBusyError(
+                f"Conversion queue is full ({self.max_queue} waiting); try again shortly."
+            )
+        try:
+            args = [(str(input_path), first, last, str(output_dir)) for first, last in ranges]
+            if self.workers <= 0:
+                results, pages_done = [], 0
+                for item, (first, last) in zip(args, ranges):
+                    results.append(_call_measured(_convert_pages, item))
+                    pages_done += last - first + 1
+                    if on_stage is not None:
+                        on_stage("parsing", pages_done=pages_done)
+            else:
+                self.start()
+                parallel = min(self.split_max_parallel or self.workers, self.workers)
+                results = self._map_ranges(
+                    _convert_pages, args, ranges, parallel, time.monotonic() + self.job_timeout, on_stage,
+                )
+        finally:
+            self._slots.release()
+        if results:
+            self._record_peak_rss(max(result["peak_rss_bytes"] for result in results))
+        return results
+
+    def _map_ranges(
+        self,
+        fn: Callable[..., dict],
+        args: list[tuple],
+        ranges: list[tuple[int, int]],
+        parallel: int,
+        deadline: float,
+        on_stage: Callable[..., None] | None,
+    ) -> list[dict]:
+        """Run `fn(*args[i])` for every range on the workers and return the results in order."""
+        # Keep at most `parallel` ranges in flight so one document cannot
+        # occupy every worker while other conversions wait.
+        results: list[dict | None] = [None] * len(ranges)
+        pending: dict = {}
+        next_range = 0
+        pages_done = 0
+        try:
+            while next_range < len(ranges) or pending:
+                while next_range < len(ranges) and len(pending) < parallel:
+                    future = self._submit(fn, args[next_range], deadline)
+                    pending[future] = next_range
+                    next_range += 1
+                done, _ = wait(pending, timeout=max(deadline - time.monotonic(), 0), return_when=FIRST_COMPLETED)
+                if not done:
+                    metrics.inc("conversion_timeouts_total")
+                    raise ConversionTimeoutError(f"Conversion did not finish within {self.job_timeout:.0f}s")
+                for future in done:
+                    index = pending.pop(future)
+                    results[index] = future.result()
+                    first, last = ranges[index]
+                    pages_done += last - first + 1
+                    metrics.observe("conversion_range_seconds", results[index]["seconds"])
+                    if on_stage is not None:
+                        on_stage("parsing", pages_done=pages_done)
+        finally:
+            # Queued ranges are dropped; running ones are stopped at the deadline.
+            for future in pending:
+                future.cancel()
+        return results
+
+    def _wait(self, future, deadline: float, progress_file: Path | None, on_stage: Callable[..., None] | None) -> dict:
+        """Wait for a worker job until `deadline`, relaying stages from its progress file."""
+        reported = None
+        while True:
+            remaining = deadline - time.monotonic()
+            try:
+                return future.result(timeout=min(remaining, 0.5) if progress_file else remaining)
+            except FutureTimeoutError:
+                if time.monotonic() >= deadline:
+                    future.cancel()
+                    metrics.inc("conversion_timeouts_total")
+                    raise ConversionTimeoutError(f"Conversion did not finish within {self.job_timeout:.0f}s")
+            if progress_file is None:
+                continue
+            try:
+                stage = progress_file.read_text(encoding="utf-8")
+            except OSError:
+                continue
+            if stage and stage != reported:
+                reported = stage
+                on_stage(stage)
+
+
+_pool: ConversionPool | None = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConversionPool:
+    """Singleton conversion pool configured from settings."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            settings = get_settings()
+            _pool = ConversionPool(
+                workers=settings.conversion_workers,
+                max_queue=settings.conversion_max_queue,
+                job_timeout=settings.conversion_job_timeout,
+                split_min_pages=settings.split_min_pages,
+                split_range_pages=settings.split_range_pages,
+                split_max_parallel=settings.split_max_parallel,
+                job_max_rss_bytes=settings.conversion_job_max_rss_bytes,
+                worker_max_jobs=settings.conversion_worker_max_jobs,
+                worker_max_rss_bytes=settings.conversion_worker_max_rss_bytes,
+            )
+        return _pool
+
+
+def start_pool() -> ConversionPool:
+    """Create and warm up the pool (call once at server startup)."""
+    pool = get_pool()
+    pool.start()
+    return pool
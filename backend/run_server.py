@@ -5,6 +5,14 @@ from pathlib import Path
 sys.path.append(str(Path(__file__).parent))
 
 if __name__ == "__main__":
-    from mcp_server.main import mcp
-    # Defaulting to 0.0.0.0:8000 for development
-    mcp.run(transport="http", host="0.0.0.0", port=8000)
+    from mcp_server.main import mcp, start_jobs
+    from mcp_server.utils.config import get_settings
+    from mcp_server.utils.workers import start_pool
+
+    # Load the conversion models once, before the first request arrives
+    start_pool()
+    # Resume conversion jobs that were queued or running at the last shutdown
+    start_jobs()
+    # SERVER_HOST/SERVER_PORT, 0.0.0.0:8000 by default
+    settings = get_settings()
+    mcp.run(transport="http", host=settings.server_host, port=settings.server_port)